@@ -0,0 +1,117 @@
+"""启动性能基准
+
+在独立进程中导入 src/main.py (不启动服务器), 测量冷启动耗时和常驻内存,
+超过阈值时以非零状态码退出, 可用于部署前检查启动是否退化。
+
+用法:
+    python bench/startup_bench.py
+    python bench/startup_bench.py --runs 10 --max-time 1.5 --max-rss 120
+    python bench/startup_bench.py --importtime  # 额外列出最慢的导入模块
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+# 子进程: 导入main后输出导入耗时和峰值常驻内存
+CHILD_CODE = """
+import resource, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# Linux单位为KB, macOS为字节
+rss_mb = rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+print(f"BENCH {elapsed:.6f} {rss_mb:.2f}", file=sys.__stdout__)
+"""
+
+
+def run_once(extra_args=()):
+    """运行一次冷启动, 返回(总耗时, 导入耗时, 常驻内存MB, stderr)"""
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR), PYTHONIOENCODING='utf-8')
+    # 在临时目录运行, 避免日志文件写入仓库
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, *extra_args, '-c', CHILD_CODE],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            encoding='utf-8'
+        )
+        total = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"子进程启动失败:\n{proc.stderr}")
+
+    for line in proc.stdout.splitlines():
+        if line.startswith('BENCH '):
+            _, import_time, rss = line.split()
+            return total, float(import_time), float(rss), proc.stderr
+    raise RuntimeError(f"未获取到基准结果:\n{proc.stdout}\n{proc.stderr}")
+
+
+def print_slowest_imports(stderr: str, top: int):
+    """解析 -X importtime 输出, 打印累计耗时最高的模块"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+
+    print(f"\n最慢的 {top} 个导入 (累计耗时):")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  (自身 {self_us / 1000:6.1f}ms)  {name}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="测量机器人冷启动耗时和常驻内存")
+    parser.add_argument('--runs', type=int, default=5, help="运行次数, 取中位数")
+    parser.add_argument('--max-time', type=float, default=2.0, help="冷启动耗时阈值(秒)")
+    parser.add_argument('--max-rss', type=float, default=150.0, help="常驻内存阈值(MB)")
+    parser.add_argument('--importtime', action='store_true', help="列出最慢的导入模块")
+    parser.add_argument('--top', type=int, default=15, help="列出的导入模块数量")
+    args = parser.parse_args()
+
+    try:
+        results = [run_once() for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    total = statistics.median(r[0] for r in results)
+    import_time = statistics.median(r[1] for r in results)
+    rss = statistics.median(r[2] for r in results)
+
+    print(f"运行次数: {args.runs}")
+    print(f"冷启动耗时: {total:.3f}s (阈值 {args.max_time:.3f}s)")
+    print(f"导入main耗时: {import_time:.3f}s")
+    print(f"常驻内存峰值: {rss:.1f}MB (阈值 {args.max_rss:.1f}MB)")
+
+    if args.importtime:
+        _, _, _, stderr = run_once(('-X', 'importtime'))
+        print_slowest_imports(stderr, args.top)
+
+    failed = False
+    if total > args.max_time:
+        print(f"失败: 冷启动耗时超过阈值 {args.max_time:.3f}s", file=sys.stderr)
+        failed = True
+    if rss > args.max_rss:
+        print(f"失败: 常驻内存超过阈值 {args.max_rss:.1f}MB", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from typing import Dict, Any, Optional
 import re
 import yaml
+import asyncio
 from services.bilibili_service import BilibiliService
 from services.qq_service import QQService
 from services.chat_service import ChatService
@@ -12,26 +13,42 @@ from services.stable_diffusion_service import StableDiffusionService
 from services.electricity_service import ElectricityService
 from services.personality_service import PersonalityService
 from services.verification_service import VerificationService
+from services.endpoint_router import EndpointRouter
+from services.conversation_service import ConversationService
+from services.llm_scheduler import LLMScheduler
+from services.model_router import ModelRouter
+from services.member_index_service import MemberIndexService
+from services.baidu_translate_service import TranslateService
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container, lazy_service
 
 class CommandHandler:
+    # 功能服务在首次使用时才创建, 避免启动时初始化所有客户端
+    chat_service = lazy_service(ChatService)
+    image_service = lazy_service(ImageService)
+    feature_service = lazy_service(FeatureService)
+    music_service = lazy_service(MusicService)
+    stable_diffusion_service = lazy_service(StableDiffusionService)
+    electricity_service = lazy_service(ElectricityService)
+    personality_service = lazy_service(PersonalityService)
+    like_service = lazy_service(LikeService)
+    bilibili_service = lazy_service(BilibiliService)
+    endpoint_router = lazy_service(EndpointRouter)
+    conversation_service = lazy_service(ConversationService)
+    llm_scheduler = lazy_service(LLMScheduler)
+    model_router = lazy_service(ModelRouter)
+    member_index = lazy_service(MemberIndexService)
+    translate_service = lazy_service(TranslateService)
+
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
-        self.chat_service = ChatService()
-        self.image_service = ImageService()
-        self.feature_service = FeatureService()
-        self.music_service = MusicService()
-        self.stable_diffusion_service = StableDiffusionService()
-        self.electricity_service = ElectricityService()
-        self.personality_service = PersonalityService()
-        self.like_service = LikeService()
-        self.bilibili_service = BilibiliService()
-        self.verification_service = VerificationService()
+        container = Container()
+        self.qq_service = container.get(QQService)
+        self.verification_service = container.get(VerificationService)
 
-    def handle_command(self, command: str, data: Dict[str, Any]) -> bool:
+    async def handle_command(self, command: str, data: Dict[str, Any]) -> bool:
         """处理命令"""
         try:
             gid = data.get("group_id")
@@ -39,95 +56,145 @@ class CommandHandler:
             
             # 图片生成命令
             if command.startswith(("生成图像", "直接生成图像")):
-                return self._handle_image_generation(command, gid, uid)
+                return await self._handle_image_generation(command, gid, uid)
                 
             # 今日老婆命令
             elif "今日老婆" in command or "每日老婆" in command:
-                return self._handle_daily_wife(gid, uid)
+                return await self._handle_daily_wife(gid, uid)
                 
             # 翻译命令
             elif command.startswith("翻译"):
-                return self._handle_translation(command, gid, uid)
+                return await self._handle_translation(command, gid, uid)
                     
             # 点歌命令
             elif command.startswith("点歌"):
-                return self._handle_music_request(command, gid, uid)
+                return await self._handle_music_request(command, gid, uid)
                 
             # 图片识别命令
             elif command == "图片识别" and "image" in data['message']:
-                return self._handle_image_recognition(data, gid, uid)
+                return await self._handle_image_recognition(data, gid, uid)
                 
             # Stable Diffusion命令
             elif command.startswith("/sd"):
-                return self._handle_stable_diffusion(command, gid, uid)
+                return await self._handle_stable_diffusion(command, gid, uid)
                 
             # 电费查询命令
             elif command.startswith("电费查询"):
-                return self._handle_electricity_query(command, gid, uid)
+                return await self._handle_electricity_query(command, gid, uid)
             
             # 切换模型命令
             elif command.startswith("切换模型"):
-                return self._handle_model_switch(command, gid, uid)
+                return await self._handle_model_switch(command, gid, uid)
                 
             # 查看当前模型命令
             elif command.strip() == "当前模型":
-                return self._show_current_model(gid, uid)
+                return await self._show_current_model(gid, uid)
 
             # 查看支持模型命令
             elif command.strip() == "支持模型":
-                return self._handle_list_models(gid, uid)
+                return await self._handle_list_models(gid, uid)
+                
+            # 查看API端点状态命令
+            elif command.strip() == "接口状态":
+                return await self._handle_endpoint_health(gid, uid)
+
+            # 查看各模型耗时和用量命令
+            elif command.strip() == "模型统计":
+                return await self._handle_model_stats(gid, uid)
+
+            # 查看对话调度状态命令
+            elif command.strip() == "调度状态":
+                return await self._handle_scheduler_stats(gid, uid)
+                
+            # 批量撤回机器人消息命令
+            elif command.startswith(("撤回最近", "撤回匹配")):
+                return await self._handle_bulk_recall(command, gid, uid)
                 
             # 点赞命令
             elif command.startswith("赞我"):
-                return self._handle_like_command(command, gid, uid)
+                return await self._handle_like_command(command, gid, uid)
             
             # 批量点赞命令
             elif command.startswith("批量赞我"):
-                return self._handle_batch_like_command(command, gid, uid)
+                return await self._handle_batch_like_command(command, gid, uid)
 
             elif command.startswith("设置人格"):
-                return self._handle_set_personality(command, gid, uid) 
+                return await self._handle_set_personality(command, gid, uid) 
+
+            # 清除对话记忆命令
+            elif command.strip() in ("重置对话", "清除记忆"):
+                return await self._handle_reset_conversation(gid, uid)
                 
             elif "b23.tv" in command or "bilibili.com" in command:
-                return self._handle_bilibili_link(command, gid, uid)
+                return await self._handle_bilibili_link(command, gid, uid)
             
             # 验证相关命令
             elif command == "开启入群验证":
-                return self._handle_enable_verification(gid, uid)
+                return await self._handle_enable_verification(gid, uid)
             elif command == "关闭入群验证":
-                return self._handle_disable_verification(gid, uid)
+                return await self._handle_disable_verification(gid, uid)
             elif command.startswith("开启") and command.endswith("入群验证"):
-                return self._handle_enable_verification(gid, uid)
+                return await self._handle_enable_verification(gid, uid)
                 
         except Exception as e:
             self.logger.error(f"Error handling command: {e}")
             return False
             
-    def _handle_image_generation(self, command: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_image_generation(self, command: str, gid: Optional[int], uid: int) -> bool:
         """处理图片生成命令"""
         try:
             prompt = command.replace("生成图像", "").replace("直接生成图像", "").strip()
-            image_url = self.image_service.generate_openai_image(prompt)
+            image_url = await self.image_service.generate_openai_image(prompt)
             if image_url:
                 message = [self.qq_service.image(image_url)]
-                self.qq_service.send_message(gid, message, uid)
+                await self.qq_service.send_message(gid, message, uid)
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Error generating image: {e}")
             return False
         
-    def _handle_model_switch(self, command: str, gid: Optional[int], uid: int) -> bool:
+    def _session_id(self, gid: Optional[int], uid: int) -> str:
+        """与消息处理器一致的会话ID"""
+        return f"group_{gid}_{uid}" if gid else f"private_{uid}"
+
+    async def _handle_set_personality(self, command: str, gid: Optional[int], uid: int) -> bool:
+        """处理设置人格命令, 不带内容时恢复预设"""
+        try:
+            session_id = self._session_id(gid, uid)
+            personality = command.replace("设置人格", "", 1).strip()
+            if personality:
+                self.personality_service.set_personality(session_id, personality)
+                message = "人格已设置, 对话记忆已清除"
+            else:
+                self.personality_service.reset_personality(session_id)
+                message = "已恢复默认人格, 对话记忆已清除"
+            # 旧的对话内容基于之前的人格, 一并清除
+            self.conversation_service.clear(session_id)
+            await self.qq_service.send_message(gid, message, uid)
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error setting personality: {e}")
+            return False
+
+    async def _handle_reset_conversation(self, gid: Optional[int], uid: int) -> bool:
+        """处理清除对话记忆命令"""
+        self.conversation_service.clear(self._session_id(gid, uid))
+        await self.qq_service.send_message(gid, "对话记忆已清除", uid)
+        return True
+        
+    async def _handle_model_switch(self, command: str, gid: Optional[int], uid: int) -> bool:
         """处理模型切换命令"""
         try:
             # 检查是否是管理员
             if str(uid) != self.config.qq_bot['admin_qq']:
-                self.qq_service.send_message(gid, "只有管理员才能切换模型", uid)
+                await self.qq_service.send_message(gid, "只有管理员才能切换模型", uid)
                 return True
                 
             model = command.replace("切换模型", "").strip()
             if not model:
-                self.qq_service.send_message(gid, "请指定要切换的模型", uid)
+                await self.qq_service.send_message(gid, "请指定要切换的模型", uid)
                 return True
                 
             # 更新配置
@@ -136,44 +203,151 @@ class CommandHandler:
             with open('config/config.yaml', 'w', encoding='utf-8') as f:
                 yaml.dump(self.config.config_data, f, allow_unicode=True)
                 
-            self.qq_service.send_message(gid, f"已切换到模型: {model}", uid)
+            await self.qq_service.send_message(gid, f"已切换到模型: {model}", uid)
             return True
             
         except Exception as e:
             self.logger.error(f"Error switching model: {e}")
             return False
         
-    def _handle_list_models(self, gid: Optional[int], uid: int) -> bool:
+    async def _handle_list_models(self, gid: Optional[int], uid: int) -> bool:
         """处理查询支持模型命令"""
         try:
             # 检查是否是管理员
             if str(uid) != self.config.qq_bot['admin_qq']:
-                self.qq_service.send_message(gid, "只有管理员才能查询支持的模型", uid)
+                await self.qq_service.send_message(gid, "只有管理员才能查询支持的模型", uid)
                 return True
                 
-            models = self.chat_service.list_available_models()
+            models = await self.chat_service.list_available_models()
             if models:
                 message = "支持的模型列表:\n" + "\n".join(models)
-                self.qq_service.send_message(gid, message, uid)
+                await self.qq_service.send_message(gid, message, uid)
             else:
-                self.qq_service.send_message(gid, "获取模型列表失败", uid)
+                await self.qq_service.send_message(gid, "获取模型列表失败", uid)
             return True
             
         except Exception as e:
             self.logger.error(f"Error listing models: {e}")
             return False   
         
-    def _show_current_model(self, gid: Optional[int], uid: int) -> bool:
+    async def _handle_endpoint_health(self, gid: Optional[int], uid: int) -> bool:
+        """显示各API端点的健康状况"""
+        try:
+            if str(uid) != self.config.qq_bot['admin_qq']:
+                await self.qq_service.send_message(gid, "只有管理员才能查看接口状态", uid)
+                return True
+                
+            lines = ["接口状态:"]
+            for health in self.endpoint_router.get_health():
+                status = f"已摘除({health['probe_in']:.0f}秒后探测)" if health['ejected'] else "正常"
+                lines.append(
+                    f"[{health['priority']}] {health['url']}\n"
+                    f"状态: {status}\n"
+                    f"平均耗时: {health['avg_latency_ms']}ms | 错误率: {health['error_rate']:.1%}\n"
+                    f"请求: {health['requests']} | 失败: {health['failures']} | 限流: {health['rate_limited']}"
+                )
+            await self.qq_service.send_message(gid, "\n".join(lines), uid)
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error showing endpoint health: {e}")
+            return False
+        
+    async def _handle_model_stats(self, gid: Optional[int], uid: int) -> bool:
+        """显示各模型的路由次数、耗时和token用量"""
+        try:
+            if str(uid) != self.config.qq_bot['admin_qq']:
+                await self.qq_service.send_message(gid, "只有管理员才能查看模型统计", uid)
+                return True
+                
+            stats = self.model_router.get_stats()
+            if not stats:
+                await self.qq_service.send_message(gid, "暂无模型调用记录", uid)
+                return True
+            lines = [f"模型统计(路由规则{'已启用' if self.model_router.enabled else '未启用'}):"]
+            for model, item in sorted(stats.items(), key=lambda x: -x[1]['requests']):
+                lines.append(
+                    f"{model}\n"
+                    f"路由: {item['routed']} | 调用: {item['requests']} | 失败: {item['failures']}\n"
+                    f"平均耗时: {item['avg_latency_ms']}ms | P95: {item['p95_latency_ms']}ms | 首字: {item['avg_first_token_ms']}ms\n"
+                    f"平均token: 输入 {item['avg_prompt_tokens']} | 输出 {item['avg_completion_tokens']}"
+                )
+            await self.qq_service.send_message(gid, "\n".join(lines), uid)
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error showing model stats: {e}")
+            return False
+        
+    async def _handle_scheduler_stats(self, gid: Optional[int], uid: int) -> bool:
+        """显示对话调度和降级统计"""
+        try:
+            if str(uid) != self.config.qq_bot['admin_qq']:
+                await self.qq_service.send_message(gid, "只有管理员才能查看调度状态", uid)
+                return True
+                
+            stats = self.llm_scheduler.get_stats()
+            waiting = stats['waiting']
+            shed = stats['shed']
+            message = (
+                f"调度状态:\n"
+                f"进行中: {stats['running']}/{stats['concurrency']} | 排队: {stats['pending']}/{stats['max_queue']}\n"
+                f"排队明细: 管理员 {waiting['admin']} | 私聊 {waiting['private']} | 群聊 {waiting['group']}\n"
+                f"已接受: {stats['admitted']} | 曾排队: {stats['queued']} | 已拒绝: {stats['rejected']}\n"
+                f"限流: {shed['rate_limited']} | 繁忙: {shed['overloaded']} | 排队超时: {shed['stale']}\n"
+                f"被取代: {shed['superseded']} | 回复超时: {shed['deadline']} | 备用模型: {shed['fallback']}"
+            )
+            await self.qq_service.send_message(gid, message, uid)
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error showing scheduler stats: {e}")
+            return False
+        
+    async def _handle_bulk_recall(self, command: str, gid: Optional[int], uid: int) -> bool:
+        """批量撤回机器人在当前群/私聊发出的消息: 撤回最近 N / 撤回匹配 正则(只匹配每条消息开头的preview_chars个字)"""
+        try:
+            if str(uid) != self.config.qq_bot['admin_qq']:
+                await self.qq_service.send_message(gid, "只有管理员才能批量撤回消息", uid)
+                return True
+                
+            if command.startswith("撤回最近"):
+                count = command.replace("撤回最近", "").replace("条", "").strip()
+                if not count.isdigit() or int(count) <= 0:
+                    await self.qq_service.send_message(gid, "用法: 撤回最近 条数", uid)
+                    return True
+                recalled, failed = await self.qq_service.recall_sent(gid, uid, count=int(count))
+            else:
+                pattern = command.replace("撤回匹配", "", 1).strip()
+                if not pattern:
+                    await self.qq_service.send_message(gid, "用法: 撤回匹配 关键词或正则(只匹配每条消息开头的文字)", uid)
+                    return True
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    await self.qq_service.send_message(gid, f"正则表达式有误: {e}", uid)
+                    return True
+                recalled, failed = await self.qq_service.recall_sent(gid, uid, pattern=pattern)
+                
+            message = f"已撤回 {recalled} 条消息" + (f", {failed} 条撤回失败" if failed else "")
+            await self.qq_service.send_message(gid, message, uid)
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error handling bulk recall: {e}")
+            return False
+        
+    async def _show_current_model(self, gid: Optional[int], uid: int) -> bool:
         """显示当前使用的模型"""
         try:
             current_model = self.config.chatgpt['model']
-            self.qq_service.send_message(gid, f"当前使用的模型是: {current_model}", uid)
+            await self.qq_service.send_message(gid, f"当前使用的模型是: {current_model}", uid)
             return True
         except Exception as e:
             self.logger.error(f"Error showing current model: {e}")
             return False    
         
-    def _handle_daily_wife(self, gid: Optional[int], uid: int) -> bool:
+    async def _handle_daily_wife(self, gid: Optional[int], uid: int) -> bool:
         """处理今日老婆命令"""
         try:
             if not gid:
@@ -183,8 +357,10 @@ class CommandHandler:
             if not attributes:
                 return False
                 
-            wife_id = self.qq_service.get_random_member(gid)
-            wife_name = self.qq_service.get_user_info(wife_id)["nickname"]
+            wife_id = await self.member_index.random_member(gid, exclude=(self.config.qq_bot['bot_uid'],))
+            if not wife_id:
+                return False
+            wife_name = await self.member_index.display_name(gid, wife_id)
             
             # 构造文本消息
             text_message = [
@@ -197,12 +373,13 @@ class CommandHandler:
                     f"{attributes['style']}"
                 )
             ]
-            self.qq_service.send_message(gid, text_message, uid)
-            
-            # 发送头像
+            # 头像紧随文字加入发送队列, 会合并为一条消息发送
             avatar_url = self.image_service.get_qq_avatar(wife_id)
             avatar_message = [self.qq_service.image(avatar_url)]
-            self.qq_service.send_message(gid, avatar_message, uid)
+            await asyncio.gather(
+                self.qq_service.send_message(gid, text_message, uid),
+                self.qq_service.send_message(gid, avatar_message, uid)
+            )
             
             return True
             
@@ -210,28 +387,43 @@ class CommandHandler:
             self.logger.error(f"Error handling daily wife: {e}")
             return False
         
-    def _handle_music_request(self, command: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_translation(self, command: str, gid: Optional[int], uid: int) -> bool:
+        """处理翻译命令: 中文译为英文, 其他语言译为中文"""
+        try:
+            text = command.replace("翻译", "", 1).strip()
+            if not text:
+                await self.qq_service.send_message(gid, "用法: 翻译 要翻译的内容", uid)
+                return True
+            to_lang = 'en' if re.search(r'[\u4e00-\u9fff]', text) else 'zh'
+            result = await asyncio.to_thread(self.translate_service.translate, text, 'auto', to_lang)
+            await self.qq_service.send_message(gid, result or "翻译失败", uid)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error handling translation: {e}")
+            return False
+            
+    async def _handle_music_request(self, command: str, gid: Optional[int], uid: int) -> bool:
         """处理点歌命令"""
         try:
             keyword = command.replace("点歌", "").strip()
-            song_info = self.music_service.search_song(keyword)
+            song_info = await asyncio.to_thread(self.music_service.search_song, keyword)
             if song_info:
                 message = [self.qq_service.music("163", song_info['music_id'])]
-                self.qq_service.send_message(gid, message, uid)
+                await self.qq_service.send_message(gid, message, uid)
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Error handling music request: {e}")
             return False
         
-    def _handle_image_recognition(self, data: Dict[str, Any], gid: Optional[int], uid: int) -> bool:
+    async def _handle_image_recognition(self, data: Dict[str, Any], gid: Optional[int], uid: int) -> bool:
         """处理图片识别命令"""
         try:
             # 从消息中提取图片URL
             for msg in data['message']:
                 if msg['type'] == 'image':
                     image_url = msg['data']['url']
-                    result = self.image_recognition_service.recognize_image(image_url)
+                    result = await asyncio.to_thread(self.image_recognition_service.recognize_image, image_url)
                     if result:
                         message = [
                             self.qq_service.text(
@@ -240,44 +432,44 @@ class CommandHandler:
                                          for item in result[:5]])
                             )
                         ]
-                        self.qq_service.send_message(gid, message, uid)
+                        await self.qq_service.send_message(gid, message, uid)
                         return True
             return False
         except Exception as e:
             self.logger.error(f"Error handling image recognition: {e}")
             return False
         
-    def _handle_stable_diffusion(self, command: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_stable_diffusion(self, command: str, gid: Optional[int], uid: int) -> bool:
         """处理SD图片生成命令"""
         try:
             prompt = command.replace("/sd", "").strip()
-            images = self.stable_diffusion_service.generate_image(prompt)
+            images = await asyncio.to_thread(self.stable_diffusion_service.generate_image, prompt)
             if images:
                 for image_url in images:
                     message = [self.qq_service.image(image_url)]
-                    self.qq_service.send_message(gid, message, uid)
+                    await self.qq_service.send_message(gid, message, uid)
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Error handling stable diffusion: {e}")
             return False
         
-    def _handle_electricity_query(self, command: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_electricity_query(self, command: str, gid: Optional[int], uid: int) -> bool:
         room_id = command.replace("电费查询", "").strip()
-        result = self.electricity_service.query_electricity(room_id)
+        result = await asyncio.to_thread(self.electricity_service.query_electricity, room_id)
         if result:
             message = f"电费查询结果:\n余额: {result['balance']}元\n今日用电: {result['usage_today']}度\n最后更新: {result['last_update']}"
-            self.qq_service.send_message(gid, message, uid)
+            await self.qq_service.send_message(gid, message, uid)
             return True
         return False
     
-    def _handle_like_command(self, command: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_like_command(self, command: str, gid: Optional[int], uid: int) -> bool:
         """处理点赞命令"""
         try:
             # 解析目标用户ID
             parts = command.split()
             if len(parts) < 2:
-                self.qq_service.send_message(gid, "请指定要点赞的用户QQ号", uid)
+                await self.qq_service.send_message(gid, "请指定要点赞的用户QQ号", uid)
                 return True
                 
             target_uid = int(parts[1])
@@ -286,16 +478,16 @@ class CommandHandler:
             if len(parts) > 2:
                 times = min(int(parts[2]), 20)  # 限制最大点赞次数
                 
-            success = self.like_service.send_like(target_uid, times)
+            success = await self.like_service.send_like(target_uid, times)
             
             if success:
-                self.qq_service.send_message(
+                await self.qq_service.send_message(
                     gid,
                     f"已成功给{target_uid}点赞{times}次",
                     uid
                 )
             else:
-                self.qq_service.send_message(
+                await self.qq_service.send_message(
                     gid,
                     f"给{target_uid}点赞失败",
                     uid
@@ -303,18 +495,18 @@ class CommandHandler:
             return True
             
         except ValueError:
-            self.qq_service.send_message(gid, "QQ号格式错误", uid)
+            await self.qq_service.send_message(gid, "QQ号格式错误", uid)
             return True
         except Exception as e:
             self.logger.error(f"Error handling like command: {e}")
             return False
             
-    def _handle_batch_like_command(self, command: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_batch_like_command(self, command: str, gid: Optional[int], uid: int) -> bool:
         """处理批量点赞命令"""
         try:
             parts = command.split()
             if len(parts) < 2:
-                self.qq_service.send_message(gid, "请指定要点赞的用户QQ号列表", uid)
+                await self.qq_service.send_message(gid, "请指定要点赞的用户QQ号列表", uid)
                 return True
                 
             # 解析QQ号列表
@@ -324,38 +516,38 @@ class CommandHandler:
             if len(parts) > 2:
                 times = min(int(parts[2]), 20)
                 
-            results = self.like_service.batch_send_likes(uids, times)
+            results = await self.like_service.batch_send_likes(uids, times)
             
             # 生成结果报告
             success_count = sum(1 for success in results.values() if success)
             message = f"批量点赞完成\n成功: {success_count}\n失败: {len(results) - success_count}"
             
-            self.qq_service.send_message(gid, message, uid)
+            await self.qq_service.send_message(gid, message, uid)
             return True
             
         except ValueError:
-            self.qq_service.send_message(gid, "QQ号格式错误", uid)
+            await self.qq_service.send_message(gid, "QQ号格式错误", uid)
             return True
         except Exception as e:
             self.logger.error(f"Error handling batch like command: {e}")
             return False
         
-    def _handle_bilibili_link(self, message: str, gid: Optional[int], uid: int) -> bool:
+    async def _handle_bilibili_link(self, message: str, gid: Optional[int], uid: int) -> bool:
         """处理B站链接"""
         try:
             urls = re.findall(r'https?://[^\s<>"]+|www\.[^\s<>"]+', message)
             
             for url in urls:
                 if "b23.tv" in url or "bilibili.com" in url:
-                    video_details = self.bilibili_service.fetch_video_details(url)
+                    video_details = await asyncio.to_thread(self.bilibili_service.fetch_video_details, url)
                     if video_details:
-                        card_path = self.bilibili_service.create_video_card(video_details)
+                        card_path = await asyncio.to_thread(self.bilibili_service.create_video_card, video_details)
                         if card_path:
                             # 使用本地文件路径发送图片
                             message = [
                                 self.qq_service.image(f"file:///{card_path}")
                             ]
-                            self.qq_service.send_message(gid, message, uid)
+                            await self.qq_service.send_message(gid, message, uid)
                             return True
                             
             return False
@@ -364,7 +556,7 @@ class CommandHandler:
             self.logger.error(f"Error handling bilibili link: {e}")
             return False
         
-    def _handle_enable_verification(self, gid: Optional[int], uid: int) -> bool:
+    async def _handle_enable_verification(self, gid: Optional[int], uid: int) -> bool:
         """处理开启验证命令"""
         try:
             if not gid or str(uid) != self.config.qq_bot['admin_qq']:
@@ -372,14 +564,14 @@ class CommandHandler:
                 
             if self.verification_service.enable_verification(gid):
                 message = [self.qq_service.text("已开启入群验证")]
-                self.qq_service.send_message(gid, message, uid)
+                await self.qq_service.send_message(gid, message, uid)
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Error enabling verification: {e}")
             return False
             
-    def _handle_disable_verification(self, gid: Optional[int], uid: int) -> bool:
+    async def _handle_disable_verification(self, gid: Optional[int], uid: int) -> bool:
         """处理关闭验证命令"""
         try:
             if not gid or str(uid) != self.config.qq_bot['admin_qq']:
@@ -387,7 +579,7 @@ class CommandHandler:
                 
             if self.verification_service.disable_verification(gid):
                 message = [self.qq_service.text("已关闭入群验证")]
-                self.qq_service.send_message(gid, message, uid)
+                await self.qq_service.send_message(gid, message, uid)
                 return True
             return False
         except Exception as e:
@@ -1,31 +1,83 @@
+import asyncio
+import math
 import random
 from typing import Dict, Any, List, Optional
 import re
 from services.qq_service import QQService
 from services.chat_service import ChatService
 from services.image_service import ImageService
+from services.model_router import ModelRouter
+from services.conversation_service import ConversationService
+from services.session_dispatcher import SessionDispatcher
+from services.message_store_service import MessageStoreService
+from services.db_service import DBService
+from services.llm_scheduler import LLMScheduler, SHED_RATE_LIMITED, SHED_STALE, SHED_DEADLINE, SHED_SUPERSEDED
 from utils.config import Config
 from utils.logger import Logger
+from utils.text_utils import SentenceBuffer
+from utils.container import Container, lazy_service
 from handlers.command_handler import CommandHandler
 from services.verification_service import VerificationService
 
+# 对话请求被同一会话的新消息取代时的回复
+SUPERSEDED_REPLY = "收到新消息了, 之前的问题就不单独回复啦"
+
 class MessageHandler:
+    chat_service = lazy_service(ChatService)
+    command_handler = lazy_service(CommandHandler)
+    db_service = lazy_service(DBService)
+
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
-        self.chat_service = ChatService()
-        self.command_handler = CommandHandler()
-        self.verification_service = VerificationService()
+        container = Container()
+        self.qq_service = container.get(QQService)
+        self.verification_service = container.get(VerificationService)
+        self.llm_scheduler = container.get(LLMScheduler)
+        self.model_router = container.get(ModelRouter)
+        self.conversation_service = container.get(ConversationService)
+        self.session_dispatcher = container.get(SessionDispatcher)
+        self.message_store = container.get(MessageStoreService)
         
     async def handle(self, data: Dict[str, Any]):
-        """处理消息"""
+        """处理消息: 按会话排队, 同一会话的消息按顺序处理, 不同会话并行处理"""
         message_type = data.get('message_type')
+        uid = data.get('user_id')
+        if uid and data.get('sender'):
+            self.qq_service.remember_user(uid, data['sender'])
         
         if message_type == 'group':
-            await self._handle_group_message(data)
+            gid = data.get('group_id')
+            session_id = f"group_{gid}_{uid}"
+            job = lambda: self._handle_group_message(data)
+            message = data.get('message')
+            addressed = isinstance(message, list) and self._is_at_bot(message)
+            # 只有@机器人的消息、管理员的回复命令和入群验证的回答需要处理, 其余群消息不进入会话队列
+            if not (
+                addressed
+                or self._is_admin_reply(data)
+                or self.verification_service.is_pending_verification(gid, uid)
+            ):
+                return
         elif message_type == 'private':
-            await self._handle_private_message(data)
+            gid = None
+            session_id = f"private_{uid}"
+            job = lambda: self._handle_private_message(data)
+            addressed = True
+        else:
+            return
+            
+        # 发给机器人的新消息取代同一会话中还在排队的旧对话请求
+        if addressed and self.session_dispatcher.busy(session_id):
+            self.llm_scheduler.supersede(session_id)
+        done = self.session_dispatcher.submit(session_id, job, supersedes=addressed)
+        if done is None:
+            # 会话队列或同时处理的会话数已满, 告知用户稍后重发
+            await self.qq_service.send_message(gid, "当前消息太多了, 请稍后再试", uid)
+            return
+        # 同步模式下处理完成后才返回
+        if self.config.ingress.get('mode', 'queue') == 'sync':
+            await done
             
     async def _handle_group_message(self, data: Dict[str, Any]):
         """处理群消息"""
@@ -33,8 +85,20 @@ class MessageHandler:
         uid = data.get('user_id')
         message = data.get('message')
         
-        # 处理@消息
+        # 入群验证中的用户发送的是验证答案
+        if self.verification_service.is_pending_verification(gid, uid):
+            if await self._check_verification_answer(gid, uid, message):
+                return
+        
+        # 管理员回复消息的命令(如撤回)
+        if self._is_admin_reply(data) and await self._handle_reply_message(message, gid, uid):
+            return
+        
+        # 处理@消息, 优先匹配命令
         if self._is_at_bot(message):
+            text = self._extract_text(message)
+            if text and await self.command_handler.handle_command(text, data):
+                return
             await self._handle_chat_message(gid, uid, message)
             
     async def _handle_chat_message(self, gid: int, uid: int, message: List[Dict[str, Any]]):
@@ -45,15 +109,81 @@ class MessageHandler:
             if not text:
                 return
                 
-            # 调用ChatGPT API
-            response = await self.chat_service.chat(f"group_{gid}_{uid}", text)
-            
-            # 发送回复
-            self.qq_service.send_message(gid, response, uid)
+            await self._reply_chat(gid, uid, f"group_{gid}_{uid}", text)
             
         except Exception as e:
             self.logger.error(f"Error handling chat message: {e}")
         
+    async def _reply_chat(self, gid: Optional[int], uid: int, session_id: str, text: str):
+        """经调度器准入后调用ChatGPT, 被限流、排队或积压时立即告知用户"""
+        # 同一会话已有更新的消息在排队, 旧消息不再单独回复
+        if self.session_dispatcher.superseded(session_id):
+            self.llm_scheduler.record_shed(SHED_SUPERSEDED)
+            await self.qq_service.send_message(gid, SUPERSEDED_REPLY, uid)
+            return
+        ticket = self.llm_scheduler.admit(gid, uid, session_id)
+        if not ticket.accepted:
+            if ticket.reason == SHED_RATE_LIMITED:
+                message = f"请求太频繁了, 请{math.ceil(ticket.retry_after)}秒后再试"
+            else:
+                message = "当前请求太多了, 请稍后再试"
+            await self.qq_service.send_message(gid, message, uid)
+            return
+        if not ticket.granted:
+            await self.qq_service.send_message(
+                gid, f"当前请求较多, 已进入排队, 前面还有{ticket.position}个请求", uid
+            )
+        if not await ticket.wait():
+            if ticket.reason == SHED_STALE:
+                await self.qq_service.send_message(gid, "排队超时了, 请稍后再试", uid)
+            elif ticket.reason == SHED_SUPERSEDED:
+                await self.qq_service.send_message(gid, SUPERSEDED_REPLY, uid)
+            return
+        # 积压时调度器指定的备用模型优先, 否则按路由规则选择
+        model = ticket.model or self.model_router.choose(
+            text, gid, uid, self.conversation_service.context_tokens(session_id)
+        )
+        try:
+            await asyncio.wait_for(
+                self._send_chat_reply(gid, uid, session_id, text, model),
+                self.llm_scheduler.request_timeout
+            )
+        except asyncio.TimeoutError:
+            self.llm_scheduler.record_shed(SHED_DEADLINE)
+            await self.qq_service.send_message(gid, "回复超时了, 请稍后再试", uid)
+        finally:
+            ticket.release()
+
+    async def _send_chat_reply(self, gid: Optional[int], uid: int, session_id: str, text: str,
+                               model: Optional[str] = None):
+        """调用ChatGPT并发送回复, 流式模式下按句子/段落分段发送"""
+        if not self.config.chatgpt.get('stream', False):
+            response = await self.chat_service.chat(session_id, text, model)
+            await self.qq_service.send_message(gid, response, uid)
+            self._log_chat(gid, uid, text, response)
+            return
+            
+        buffer = SentenceBuffer(
+            self.config.qq_bot.get('max_length', 4500),
+            self.config.chatgpt.get('stream_min_chars', 200)
+        )
+        # 各段加入发送队列后继续生成, 不等待发送完成; 只在第一段回复中@用户
+        sends = []
+        deltas = []
+        async for delta in self.chat_service.chat_stream(session_id, text, model):
+            deltas.append(delta)
+            for piece in buffer.feed(delta):
+                sends.append(self.qq_service.queue_message(gid, piece, uid, at=not sends))
+        for piece in buffer.flush():
+            sends.append(self.qq_service.queue_message(gid, piece, uid, at=not sends))
+        await asyncio.gather(*sends)
+        self._log_chat(gid, uid, text, "".join(deltas))
+        
+    def _log_chat(self, gid: Optional[int], uid: int, text: str, response: str):
+        """记录聊天历史, 写入由数据库后台线程批量完成"""
+        if self.config.database.get('chat_history', True) and response:
+            self.db_service.add_chat_history(uid, gid, text, response)
+        
     def _extract_text(self, message: List[Dict[str, Any]]) -> str:
         """从消息中提取纯文本内容"""
         text_parts = []
@@ -89,6 +219,15 @@ class MessageHandler:
         except Exception as e:
             self.logger.error(f"Error handling guild message: {e}")
 
+    def _is_admin_reply(self, data: Dict[str, Any]) -> bool:
+        """是否为管理员回复某条消息"""
+        message = data.get('message')
+        return (
+            isinstance(message, list)
+            and str(data.get('user_id')) == str(self.config.qq_bot['admin_qq'])
+            and self._is_reply_message(message)
+        )
+
     def _is_reply_message(self, message: List[Dict[str, Any]]) -> bool:
         """检查是否是回复消息"""
         for msg in message:
@@ -96,7 +235,7 @@ class MessageHandler:
                 return True
         return False
 
-    def _handle_reply_message(self, message: List[Dict[str, Any]], gid: Optional[int], uid: int) -> bool:
+    async def _handle_reply_message(self, message: List[Dict[str, Any]], gid: Optional[int], uid: int) -> bool:
         """处理回复消息"""
         try:
             # 检查是否是管理员
@@ -118,12 +257,15 @@ class MessageHandler:
 
             # 检查命令是否是"撤回"
             if command == "撤回":
-                if self.qq_service.delete_msg(reply_id):
-                    success_msg = [self.qq_service.text("已撤回该消息")]
-                    self.qq_service.send_message(gid, success_msg, uid)
+                # 被回复的消息在最近消息存储中时直接取出发送者, 无需调用get_msg
+                stored = self.message_store.get(reply_id)
+                if await self.qq_service.delete_msg(reply_id):
+                    target = f"{stored.nickname or stored.user_id}的" if stored is not None else "该"
+                    success_msg = [self.qq_service.text(f"已撤回{target}消息")]
+                    await self.qq_service.send_message(gid, success_msg, uid)
                 else:
                     error_msg = [self.qq_service.text("撤回消息失败")]
-                    self.qq_service.send_message(gid, error_msg, uid)
+                    await self.qq_service.send_message(gid, error_msg, uid)
                 return True
 
             return False
@@ -132,7 +274,7 @@ class MessageHandler:
             self.logger.error(f"Error handling reply message: {e}")
             return False
 
-    def _check_verification_answer(self, gid: int, uid: int, message: List[Dict[str, Any]]) -> bool:
+    async def _check_verification_answer(self, gid: int, uid: int, message: List[Dict[str, Any]]) -> bool:
         """检查是否是验证答案"""
         try:
             text = self._extract_text(message)
@@ -142,11 +284,11 @@ class MessageHandler:
             answer = int(text)
             if self.verification_service.check_answer(gid, uid, answer):
                 success_msg = [self.qq_service.text("验证通过,欢迎加入!")]
-                self.qq_service.send_message(gid, success_msg)
+                await self.qq_service.send_message(gid, success_msg)
                 return True
                 
             # 验证失败,踢出群聊
-            self.qq_service.set_group_kick(gid, uid, "验证失败")
+            await self.qq_service.set_group_kick(gid, uid, "验证失败")
             return True
             
         except Exception as e:
@@ -164,11 +306,13 @@ class MessageHandler:
             return
         
         try:
-            # 调用ChatGPT API
-            response = await self.chat_service.chat(f"private_{uid}", text)
-            
-            # 发送回复
-            self.qq_service.send_message(None, response, uid)
+            if self._is_admin_reply(data) and await self._handle_reply_message(message, None, uid):
+                return
+                
+            if await self.command_handler.handle_command(text, data):
+                return
+                
+            await self._reply_chat(None, uid, f"private_{uid}", text)
             
         except Exception as e:
             self.logger.error(f"Error handling private message: {e}")
\ No newline at end of file
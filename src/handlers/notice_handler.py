@@ -1,17 +1,25 @@
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional
 from services.qq_service import QQService
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 import json
 import random
 from services.verification_service import VerificationService
+from services.member_index_service import MemberIndexService
+from services.message_store_service import MessageStoreService, StoredMessage
+from services.outbound_dispatcher import PRIORITY_NOTICE
 
 class NoticeHandler:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
-        self.verification_service = VerificationService()
+        container = Container()
+        self.qq_service = container.get(QQService)
+        self.verification_service = container.get(VerificationService)
+        self.member_index = container.get(MemberIndexService)
+        self.message_store = container.get(MessageStoreService)
         
     async def handle(self, data: Dict[str, Any]):
         """处理通知消息"""
@@ -21,65 +29,66 @@ class NoticeHandler:
             
             # 好友相关通知
             if notice_type == "friend_add":
-                self._handle_friend_add(data)
+                await self._handle_friend_add(data)
             elif notice_type == "friend_recall":
-                self._handle_friend_recall(data)
+                await self._handle_friend_recall(data)
                 
             # 群组相关通知
             elif notice_type == "group_admin":
-                self._handle_group_admin(data)
+                await self._handle_group_admin(data)
             elif notice_type == "group_ban":
-                self._handle_group_ban(data)
+                await self._handle_group_ban(data)
             elif notice_type == "group_card":
-                self._handle_group_card(data)
+                await self._handle_group_card(data)
             elif notice_type == "group_decrease":
-                self._handle_group_decrease(data)
+                await self._handle_group_decrease(data)
             elif notice_type == "group_increase":
-                self._handle_group_increase(data)
+                await self._handle_group_increase(data)
             elif notice_type == "group_recall":
-                self._handle_group_recall(data)
+                await self._handle_group_recall(data)
             elif notice_type == "group_upload":
-                self._handle_group_upload(data)
+                await self._handle_group_upload(data)
             elif notice_type == "essence":
-                self._handle_essence(data)
+                await self._handle_essence(data)
                 
             # 其他通知
             elif notice_type == "notify":
                 if sub_type == "poke":
-                    self._handle_poke(data)
+                    await self._handle_poke(data)
                 elif sub_type == "input_status":
-                    self._handle_input_status(data)
+                    await self._handle_input_status(data)
                 elif sub_type == "profile_like":
-                    self._handle_profile_like(data)
+                    await self._handle_profile_like(data)
                     
         except Exception as e:
             self.logger.error(f"Error handling notice: {e}")
 
-    def _handle_friend_add(self, data: Dict[str, Any]):
+    async def _handle_friend_add(self, data: Dict[str, Any]):
         """处理好友添加通知"""
         user_id = data.get("user_id")
         self.logger.info(f"New friend added: {user_id}")
         
-    def _handle_friend_recall(self, data: Dict[str, Any]):
+    async def _handle_friend_recall(self, data: Dict[str, Any]):
         """处理私聊消息撤回"""
         user_id = data.get("user_id")
         message_id = data.get("message_id")
-        recalled_message = self.qq_service.get_msg(message_id)
+        recalled_message = self._recalled_content(self.message_store.get(message_id))
         self.logger.info(f"Friend {user_id} recalled message: {recalled_message}")
         
-    def _handle_group_admin(self, data: Dict[str, Any]):
+    async def _handle_group_admin(self, data: Dict[str, Any]):
         """处理群管理员变动"""
         sub_type = data.get("sub_type")
         group_id = data.get("group_id")
         user_id = data.get("user_id")
         
+        self.member_index.on_admin(group_id, user_id, sub_type == "set")
         action = "设置" if sub_type == "set" else "取消"
         message = [
             self.qq_service.text(f"{user_id} 被{action}为管理员")
         ]
-        self.qq_service.send_message(group_id, message)
+        await self.qq_service.send_message(group_id, message, priority=PRIORITY_NOTICE)
         
-    def _handle_group_ban(self, data: Dict[str, Any]):
+    async def _handle_group_ban(self, data: Dict[str, Any]):
         """处理群禁言"""
         sub_type = data.get("sub_type")
         group_id = data.get("group_id")
@@ -100,9 +109,26 @@ class NoticeHandler:
                     f"{operator_id} 解除了 {user_id} 的禁言"
                 )
             ]
-        self.qq_service.send_message(group_id, message)
+        await self.qq_service.send_message(group_id, message, priority=PRIORITY_NOTICE)
 
-    def _handle_poke(self, data: Dict[str, Any]):
+    async def _handle_group_card(self, data: Dict[str, Any]):
+        """处理群名片变更"""
+        user_id = data.get("user_id")
+        self.logger.info(
+            f"群{data.get('group_id')} 成员 {user_id} 名片变更: "
+            f"{data.get('card_old', '')} -> {data.get('card_new', '')}"
+        )
+        self.qq_service.invalidate_user(user_id)
+        self.member_index.on_card(data.get("group_id"), user_id, data.get("card_new", ""))
+
+    async def _handle_group_decrease(self, data: Dict[str, Any]):
+        """处理群成员减少"""
+        group_id = data.get("group_id")
+        user_id = data.get("user_id")
+        self.logger.info(f"群{group_id} 成员 {user_id} 离开({data.get('sub_type')})")
+        self.member_index.on_decrease(group_id, user_id)
+
+    async def _handle_poke(self, data: Dict[str, Any]):
         """处理戳一戳"""
         target_id = data.get("target_id")
         user_id = data.get("user_id")
@@ -113,30 +139,47 @@ class NoticeHandler:
                 self.qq_service.text("戳我干嘛喵~"),
                 self.qq_service.face(random.randint(1, 200))  # 随机表情
             ]
-            self.qq_service.send_message(group_id, message, user_id, at=False)
+            await self.qq_service.send_message(group_id, message, user_id, at=False, priority=PRIORITY_NOTICE)
             
-    def _handle_group_recall(self, data: Dict[str, Any]):
+    async def _handle_group_recall(self, data: Dict[str, Any]):
         """处理群消息撤回"""
         operator_id = data.get("operator_id")
         group_id = data.get("group_id")
         user_id = data.get("user_id")
         message_id = data.get("message_id")
         
-        operator_name = self.qq_service.get_user_info(operator_id)['nickname']
-        user_name = self.qq_service.get_user_info(user_id)['nickname']
-        recalled_message = self.qq_service.get_msg(message_id)
+        # 机器人撤回的或被撤回的是机器人自己的消息(如批量撤回)时不播报
+        bot_uid = str(self.config.qq_bot['bot_uid'])
+        if str(user_id) == bot_uid or str(operator_id) == bot_uid:
+            return
+        
+        stored = self.message_store.get(message_id)
+        if stored is not None and stored.nickname:
+            operator_name = stored.nickname if operator_id == user_id else await self.qq_service.get_nickname(operator_id)
+            user_name = stored.nickname
+        else:
+            operator_name, user_name = await asyncio.gather(
+                self.qq_service.get_nickname(operator_id),
+                self.qq_service.get_nickname(user_id)
+            )
+        recalled_message = self._recalled_content(stored)
         
         message = [
             self.qq_service.text(
                 f"{operator_name}撤回了{user_name}的消息:\n{recalled_message}"
             )
         ]
-        self.qq_service.send_message(group_id, message, user_id, at=False)
+        await self.qq_service.send_message(group_id, message, user_id, at=False, priority=PRIORITY_NOTICE)
+
+    def _recalled_content(self, stored: Optional[StoredMessage]) -> str:
+        """被撤回消息的内容, 已不在最近消息存储中时给出提示"""
+        return stored.content if stored is not None else "(消息已过期, 无法查看)"
 
-    def _handle_group_increase(self, data: Dict[str, Any]):
+    async def _handle_group_increase(self, data: Dict[str, Any]):
         """处理群成员增加"""
         group_id = data.get("group_id")
         user_id = data.get("user_id")
+        self.member_index.on_increase(group_id, user_id)
         
         # 检查是否开启验证
         if self.verification_service.is_verification_enabled(group_id):
@@ -148,4 +191,4 @@ class NoticeHandler:
                     f"{question}"
                 )
             ]
-            self.qq_service.send_message(group_id, message)
\ No newline at end of file
+            await self.qq_service.send_message(group_id, message, priority=PRIORITY_NOTICE)
\ No newline at end of file
@@ -1,13 +1,15 @@
 from typing import Optional, Dict, Any
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 from services.qq_service import QQService
 
 class RequestHandler:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
+        container = Container()
+        self.qq_service = container.get(QQService)
         
     async def handle(self, data: Dict[str, Any]) -> bool:
         """处理请求"""
@@ -38,17 +40,14 @@ class RequestHandler:
             # 如果开启自动同意
             if self.config.qq_bot.get("auto_confirm", False):
                 # 调用API同意好友请求
-                url = f"{self.config.qq_bot['cqhttp_url']}/set_friend_add_request"
                 data = {
                     "flag": flag,
                     "approve": True,
                     "remark": ""  # 可以根据需要设置备注
                 }
-                response = self.qq_service.session.post(url, json=data)
-                response.raise_for_status()
-                result = response.json()
+                result = await self.qq_service.call_api("set_friend_add_request", data)
                 
-                if result.get("status") == "ok":
+                if result and result.get("status") == "ok":
                     self.logger.info(f"已自动同意好友请求: {user_id}")
                     return True
                 else:
@@ -61,7 +60,7 @@ class RequestHandler:
                 f"QQ: {user_id}\n"
                 f"验证信息: {comment}"
             )
-            self.qq_service.send_message(
+            await self.qq_service.send_message(
                 None, 
                 admin_msg, 
                 self.config.qq_bot["admin_qq"]
@@ -100,14 +99,12 @@ class RequestHandler:
     async def _approve_friend_request(self, flag: str, approve: bool = True) -> bool:
         """处理好友请求"""
         try:
-            url = f"{self.config.qq_bot['cqhttp_url']}/set_friend_add_request"
             data = {
                 "flag": flag,
                 "approve": approve
             }
-            response = self.qq_service.session.post(url, json=data)
-            response.raise_for_status()
-            return response.json()["status"] == "ok"
+            result = await self.qq_service.call_api("set_friend_add_request", data)
+            return bool(result) and result["status"] == "ok"
             
         except Exception as e:
             self.logger.error(f"Error approving friend request: {e}")
@@ -133,7 +130,7 @@ class RequestHandler:
                 f"QQ: {user_id}\n"
                 f"验证信息: {comment}"
             )
-            self.qq_service.send_message(
+            await self.qq_service.send_message(
                 None, 
                 admin_msg, 
                 self.config.qq_bot["admin_qq"]
@@ -162,7 +159,7 @@ class RequestHandler:
                 f"群号: {group_id}\n"
                 f"邀请人: {user_id}"
             )
-            self.qq_service.send_message(
+            await self.qq_service.send_message(
                 None, 
                 admin_msg, 
                 self.config.qq_bot["admin_qq"]
@@ -176,14 +173,12 @@ class RequestHandler:
     async def _approve_group_request(self, flag: str, approve: bool = True) -> bool:
         """处理群请求"""
         try:
-            url = f"{self.config.qq_bot['cqhttp_url']}/set_group_add_request"
             data = {
                 "flag": flag,
                 "approve": approve
             }
-            response = self.qq_service.session.post(url, json=data)
-            response.raise_for_status()
-            return response.json()["status"] == "ok"
+            result = await self.qq_service.call_api("set_group_add_request", data)
+            return bool(result) and result["status"] == "ok"
             
         except Exception as e:
             self.logger.error(f"Error approving group request: {e}")
@@ -1,9 +1,12 @@
+import time
+_start_time = time.perf_counter()
+
 import sys
 import os
 import locale
-from quart import Quart, request, jsonify
+from quart import Quart, request, jsonify, websocket
 import asyncio
-import time
+import json
 
 # 设置环境编码
 os.environ['PYTHONIOENCODING'] = 'utf-8'
@@ -15,29 +18,45 @@ from handlers.request_handler import RequestHandler
 from services.scheduler_service import SchedulerService
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 from services.qq_service import QQService
+from services.event_queue_service import EventQueueService
+from services.onebot_transport import WebSocketTransport
+from services.chat_service import ChatService
+from services.llm_scheduler import LLMScheduler
+from services.session_dispatcher import SessionDispatcher
+from services.member_index_service import MemberIndexService
+from services.message_store_service import MessageStoreService
+from services.db_service import DBService
+from services.stable_diffusion_service import StableDiffusionService
+
+# 可处理的上报类型
+POST_TYPES = ('message', 'notice', 'request', 'meta_event')
 
 # 初始化
 config = Config()
 logger = Logger()
 app = Quart(__name__)
-message_handler = MessageHandler()
-notice_handler = NoticeHandler()
-request_handler = RequestHandler()
-scheduler = SchedulerService()
+container = Container()
+container.record("导入模块", time.perf_counter() - _start_time)
+message_handler = container.get(MessageHandler)
+notice_handler = container.get(NoticeHandler)
+request_handler = container.get(RequestHandler)
+scheduler = container.get(SchedulerService)
+message_store = container.get(MessageStoreService)
 
 async def init_bot():
     """初始化机器人信息"""
     try:
-        qq_service = QQService()
+        qq_service = container.get(QQService)
         # 获取登录信息
-        login_info = qq_service.get_login_info()
+        login_info = await qq_service.get_login_info()
         if not login_info:
             logger.error("获取登录信息失败")
             return False
             
         # 获取用户信息
-        user_info = qq_service.get_user_info(int(login_info['user_id']))
+        user_info = await qq_service.get_user_info(int(login_info['user_id']))
         if not user_info:
             logger.error("获取用户信息失败")
             return False
@@ -56,57 +75,155 @@ async def init_bot():
         logger.error(f"初始化机器人信息失败: {e}")
         return False
 
+async def dispatch_event(data):
+    """分发上报事件到对应处理器"""
+    start_time = time.time()
+    post_type = data.get('post_type')
+    
+    # 详细的日志记录
+    if post_type == 'message':
+        message_type = data.get('message_type')
+        sender = data.get('sender', {})
+        message = data.get('message', [])
+        
+        logger.info(
+            f"\n收到{message_type}消息:"
+            f"\n- 发送者: {sender.get('nickname')}({sender.get('user_id')})"
+            f"\n- 内容: {message}"
+        )
+        
+    elif post_type == 'notice':
+        notice_type = data.get('notice_type')
+        logger.info(f"\n收到通知: {notice_type}\n- 详情: {data}")
+        
+    elif post_type == 'request':
+        request_type = data.get('request_type')
+        logger.info(f"\n收到请求: {request_type}\n- 详情: {data}")
+
+    if post_type == 'message':
+        await message_handler.handle(data)
+    elif post_type == 'notice':
+        await notice_handler.handle(data)
+    elif post_type == 'request':
+        await request_handler.handle(data)
+        
+    process_time = (time.time() - start_time) * 1000
+    logger.info(f"事件处理完成，耗时: {process_time:.2f}ms\n{'-'*50}")
+
+event_queue = EventQueueService(dispatch_event)
+
+@app.before_serving
+async def startup():
+    # 初始化机器人信息, WebSocket模式下在连接建立后进行
+    phase_start = time.perf_counter()
+    if config.qq_bot.get('transport', 'http') != 'ws' and not await init_bot():
+        raise RuntimeError("机器人初始化失败,服务启动失败")
+    container.record("初始化机器人信息", time.perf_counter() - phase_start)
+        
+    # 启动调度器等服务
+    phase_start = time.perf_counter()
+    await container.start()
+    await event_queue.start()
+    container.record("启动服务", time.perf_counter() - phase_start)
+    container.record("总计", time.perf_counter() - _start_time)
+    logger.info(container.report())
+    
+    # 功能服务的客户端和远程握手在后台完成
+    container.warm_up(ChatService, StableDiffusionService)
+
+@app.after_serving
+async def shutdown():
+    await event_queue.stop()
+    await container.stop()
+
+def is_valid_event(data) -> bool:
+    """检查是否为可处理的上报事件"""
+    return isinstance(data, dict) and data.get('post_type') in POST_TYPES
+
+def accept_event(data):
+    """事件入队前先保存消息内容, 撤回通知即使先于消息被处理也能查到原消息"""
+    if data['post_type'] == 'message':
+        message_store.add(data)
+
 @app.route('/', methods=['POST'])
 async def handle_post():
     try:
-        start_time = time.time()
         data = await request.get_json()
-        post_type = data.get('post_type')
-        
-        # 详细的日志记录
-        if post_type == 'message':
-            message_type = data.get('message_type')
-            sender = data.get('sender', {})
-            message = data.get('message', [])
+        if not is_valid_event(data):
+            return jsonify({"status": "failed", "message": "invalid event"}), 400
             
-            logger.info(
-                f"\n收到{message_type}消息:"
-                f"\n- 发送者: {sender.get('nickname')}({sender.get('user_id')})"
-                f"\n- 内容: {message}"
-            )
+        # 心跳等元事件无需处理
+        if data['post_type'] == 'meta_event':
+            return jsonify({"status": "ok"})
             
-        elif post_type == 'notice':
-            notice_type = data.get('notice_type')
-            logger.info(f"\n收到通知: {notice_type}\n- 详情: {data}")
+        accept_event(data)
+        if event_queue.enabled:
+            if not event_queue.put(data):
+                return jsonify({"status": "failed", "message": "event queue full"}), 503
+        else:
+            await dispatch_event(data)
             
-        elif post_type == 'request':
-            request_type = data.get('request_type')
-            logger.info(f"\n收到请求: {request_type}\n- 详情: {data}")
-
-        if post_type == 'message':
-            await message_handler.handle(data)
-        elif post_type == 'notice':
-            await notice_handler.handle(data)
-        elif post_type == 'request':
-            await request_handler.handle(data)
-            
-        process_time = (time.time() - start_time) * 1000
-        logger.info(f"请求处理完成，耗时: {process_time:.2f}ms\n{'-'*50}")
         return jsonify({"status": "ok"})
         
     except Exception as e:
         logger.error(f"请求处理失败: {e}")
         return jsonify({"status": "error", "message": str(e)})
 
-if __name__ == '__main__':
-    # 初始化机器人信息
-    if not asyncio.run(init_bot()):
-        logger.error("机器人初始化失败,服务启动失败")
-        exit(1)
+@app.websocket(config.qq_bot.get('ws_path', '/ws'))
+async def handle_websocket():
+    """OneBot 反向WebSocket: 同一连接接收事件并返回API响应"""
+    transport = WebSocketTransport()
+    connection = websocket._get_current_object()
+    transport.attach(connection)
+    logger.info(f"OneBot WebSocket 已连接: {websocket.headers.get('X-Self-ID')}")
     
-    # 启动调度器
-    scheduler.start()
+    # 连接建立后再获取机器人信息
+    asyncio.create_task(init_bot())
     
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive())
+            except json.JSONDecodeError as e:
+                logger.error(f"WebSocket 消息解析失败: {e}")
+                continue
+                
+            # 带echo且无post_type的是API响应
+            if 'echo' in data and 'post_type' not in data:
+                transport.feed_response(data)
+                continue
+                
+            if not is_valid_event(data) or data['post_type'] == 'meta_event':
+                continue
+                
+            accept_event(data)
+            # 不能在接收循环中等待处理, 否则处理器中的API调用无法收到响应
+            if event_queue.enabled:
+                # 反向WebSocket没有响应可以让OneBot重发, 队列满时的丢失单独统计
+                event_queue.put(data, retryable=False)
+            else:
+                asyncio.create_task(dispatch_event(data))
+    finally:
+        transport.detach(connection)
+        logger.warning("OneBot WebSocket 连接已断开")
+
+@app.route('/status', methods=['GET'])
+async def handle_status():
+    """运行状态"""
+    return jsonify({
+        "ingress": event_queue.get_stats(),
+        "sessions": container.get(SessionDispatcher).get_stats(),
+        "transport": config.qq_bot.get('transport', 'http'),
+        "websocket_connected": WebSocketTransport().connected,
+        "qq": container.get(QQService).get_stats(),
+        "members": container.get(MemberIndexService).get_stats(),
+        "message_store": message_store.get_stats(),
+        "database": container.get(DBService).get_stats() if DBService in container.services else None,
+        "chat": container.get(ChatService).get_stats(),
+        "llm_scheduler": container.get(LLMScheduler).get_stats()
+    })
+
+if __name__ == '__main__':
     # 启动服务器
     logger.info("正在启动 QQ Bot 服务...")
     app.run(
@@ -1,5 +1,4 @@
 from typing import Optional
-import requests
 import hashlib
 import random
 from utils.config import Config
@@ -13,6 +12,8 @@ class TranslateService:
     def translate(self, text: str, from_lang: str = 'en', to_lang: str = 'zh') -> Optional[str]:
         """百度翻译API"""
         try:
+            import requests
+            
             appid = self.config.baidu['appid']
             secret_key = self.config.baidu['secret_key']
             
@@ -30,7 +31,7 @@ class TranslateService:
                 'sign': sign
             }
             
-            response = requests.get(url, params=params)
+            response = requests.get(url, params=params, timeout=10)
             result = response.json()
             
             if 'trans_result' in result:
@@ -2,21 +2,21 @@ import re
 import os
 import json
 import time
-import requests
 from io import BytesIO
 from typing import Optional, Dict, Any
-from PIL import Image, ImageDraw, ImageFont
 import textwrap
 from datetime import datetime
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 from services.asset_service import AssetService
 
 class BilibiliService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.asset_service = AssetService()
+        container = Container()
+        self.asset_service = container.get(AssetService)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
@@ -43,18 +43,20 @@ class BilibiliService:
     def fetch_video_details(self, url: str) -> Optional[Dict[str, Any]]:
         """获取视频详情"""
         try:
+            import requests
+            
             video_id = self.extract_video_id(url)
             if not video_id:
                 return None
                 
             # 处理b23.tv短链接
             if 'b23.tv' in url:
-                response = requests.get(url, headers=self.headers, allow_redirects=True)
+                response = requests.get(url, headers=self.headers, allow_redirects=True, timeout=10)
                 url = response.url
                 video_id = self.extract_video_id(url)
                 
             api_url = f"https://api.bilibili.com/x/web-interface/view?bvid={video_id}"
-            response = requests.get(api_url, headers=self.headers)
+            response = requests.get(api_url, headers=self.headers, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -93,6 +95,9 @@ class BilibiliService:
     def create_video_card(self, video_details: Dict[str, Any]) -> Optional[str]:
         """生成视频信息卡片图片"""
         try:
+            import requests
+            from PIL import Image, ImageDraw, ImageFont
+            
             # 获取字体路径
             font_path = self.asset_service.get_font_path('msyh.ttc')
             if not font_path:
@@ -109,7 +114,7 @@ class BilibiliService:
             text_font = ImageFont.truetype(str(font_path), 18)
             
             # 下载并添加封面图
-            cover_response = requests.get(video_details['cover_url'])
+            cover_response = requests.get(video_details['cover_url'], timeout=10)
             cover_img = Image.open(BytesIO(cover_response.content))
             cover_img = cover_img.resize((300, 200))
             img.paste(cover_img, (20, 20))
@@ -1,34 +1,204 @@
-from typing import List, Dict, Any, Optional
-import json, tiktoken
-import requests
-from bs4 import BeautifulSoup
-from openai import AsyncOpenAI
+from typing import List, Dict, Any, Optional, AsyncIterator
+import asyncio
+import hashlib
+import json
+import time
 from utils.config import Config
 from utils.logger import Logger
-import urllib.parse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import concurrent.futures
+from utils.container import Container
+from utils.cache import TTLCache, SingleFlight
+from utils.token_counter import TokenCounter
+from services.endpoint_router import EndpointRouter
+from services.conversation_service import ConversationService
+from services.tool_service import ToolService
+from services.model_router import ModelRouter
 
 class ChatService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.client = AsyncOpenAI(
-            api_key=self.config.openai['endpoints'][0]['api_key'],
-            base_url=self.config.openai['endpoints'][0]['url']
+        container = Container()
+        self.router = container.get(EndpointRouter)
+        self.conversation_service = container.get(ConversationService)
+        self.tool_service = container.get(ToolService)
+        self.model_router = container.get(ModelRouter)
+        self.token_counter = container.get(TokenCounter)
+        # 相同请求并发时只调用一次上游; 无上下文的请求可以缓存结果
+        cache_settings = self.config.chatgpt.get('cache', {})
+        self.cache_enabled = cache_settings.get('enabled', False)
+        self.cache = TTLCache(
+            max_entries=int(cache_settings.get('max_entries', 500)),
+            ttl=float(cache_settings.get('ttl', 300))
         )
+        self.flight = SingleFlight()
         
-    async def chat(self, session_id: str, message: str) -> str:
+    def warm_up(self):
+        """后台预热: 提前创建各端点的客户端"""
+        self.router.warm_up()
+        
+    def _request_key(self, model: str, messages: List[Dict[str, Any]]) -> str:
+        """模型和完整消息列表相同的请求视为同一请求"""
+        payload = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _cacheable(self, messages: List[Dict[str, Any]]) -> bool:
+        """只缓存没有对话历史的请求(系统提示词 + 当前消息)"""
+        return self.cache_enabled and len(messages) == 2
+
+    def _tool_options(self, round_index: int) -> Dict[str, Any]:
+        """启用工具时的请求参数, 达到最大轮数后不再允许调用工具, 确保得到回答"""
+        if not self.tool_service.enabled:
+            return {}
+        options = {'tools': self.tool_service.schemas()}
+        if round_index >= self.tool_service.max_rounds:
+            options['tool_choice'] = 'none'
+        return options
+
+    def _tool_call_message(self, content: Optional[str], tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """模型请求调用工具的assistant消息"""
+        return {"role": "assistant", "content": content or None, "tool_calls": tool_calls}
+
+    def _record_usage(self, model: str, started: float, messages: List[Dict[str, Any]], completion: str,
+                      usage: Any = None, first_token_at: Optional[float] = None):
+        """记录一次模型调用的耗时和token用量, 上游未返回用量时按文本估算"""
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            prompt_tokens = self.token_counter.count_messages(messages)
+            completion_tokens = self.token_counter.count(completion)
+        self.model_router.record(
+            model,
+            time.monotonic() - started,
+            prompt_tokens,
+            completion_tokens,
+            first_token_at - started if first_token_at is not None else None
+        )
+
+    async def _complete(self, key: str, model: str, messages: List[Dict[str, Any]]) -> str:
+        """调用上游获取完整回复, 模型请求工具时执行工具并继续对话"""
+        messages = list(messages)
+        used_tools = False
+        round_index = 0
+        while True:
+            options = self._tool_options(round_index)
+            started = time.monotonic()
+            try:
+                # 由路由器选择最健康的端点, 失败时自动切换
+                response = await self.router.call(
+                    lambda client: client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        **options
+                    )
+                )
+            except Exception:
+                self.model_router.record_failure(model)
+                raise
+            reply = response.choices[0].message
+            self._record_usage(model, started, messages, reply.content or "", getattr(response, 'usage', None))
+            if not options or not reply.tool_calls:
+                break
+            tool_calls = [
+                {
+                    'id': call.id,
+                    'type': 'function',
+                    'function': {'name': call.function.name, 'arguments': call.function.arguments}
+                }
+                for call in reply.tool_calls
+            ]
+            messages.append(self._tool_call_message(reply.content, tool_calls))
+            messages.extend(await self.tool_service.execute(tool_calls))
+            used_tools = True
+            round_index += 1
+
+        content = reply.content or ""
+        # 使用了工具的回答依赖实时数据, 不缓存
+        if self._cacheable(messages) and not used_tools:
+            self.cache.set(key, content)
+        return content
+
+    def _merge_tool_call_delta(self, tool_calls: Dict[int, Dict[str, Any]], delta: Any):
+        """流式响应中工具调用分多段返回, 按index拼接"""
+        call = tool_calls.setdefault(delta.index, {
+            'id': '',
+            'type': 'function',
+            'function': {'name': '', 'arguments': ''}
+        })
+        if delta.id:
+            call['id'] = delta.id
+        if delta.function:
+            if delta.function.name:
+                call['function']['name'] += delta.function.name
+            if delta.function.arguments:
+                call['function']['arguments'] += delta.function.arguments
+
+    async def _stream_completion(self, key: str, model: str, messages: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """调用上游流式获取回复, 结束后把完整回复交给合并等待的请求"""
+        messages = list(messages)
+        parts = []
+        used_tools = False
+        round_index = 0
         try:
-            # 使用异步API调用
-            response = await self.client.chat.completions.create(
-                model=self.config.chatgpt['model'],
-                messages=[{
-                    "role": "user",
-                    "content": message
-                }]
-            )
-            return response.choices[0].message.content
+            while True:
+                options = self._tool_options(round_index)
+                started = time.monotonic()
+                first_token_at = None
+                usage = None
+                round_parts = []
+                tool_calls: Dict[int, Dict[str, Any]] = {}
+                try:
+                    # 端点在返回响应头后才算成功, 开始输出前的失败仍可切换端点
+                    stream = await self.router.call(
+                        lambda client: client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            stream=True,
+                            **options
+                        )
+                    )
+                    async for chunk in stream:
+                        # 部分服务会在最后一个数据块中返回用量
+                        usage = getattr(chunk, 'usage', None) or usage
+                        if not chunk.choices:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.monotonic()
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            round_parts.append(delta.content)
+                            parts.append(delta.content)
+                            yield delta.content
+                        for call in delta.tool_calls or []:
+                            self._merge_tool_call_delta(tool_calls, call)
+                except Exception:
+                    self.model_router.record_failure(model)
+                    raise
+                self._record_usage(model, started, messages, "".join(round_parts), usage, first_token_at)
+                if not options or not tool_calls:
+                    break
+                calls = [tool_calls[index] for index in sorted(tool_calls)]
+                messages.append(self._tool_call_message("".join(round_parts), calls))
+                messages.extend(await self.tool_service.execute(calls))
+                used_tools = True
+                round_index += 1
+        except BaseException as e:
+            self.flight.resolve(key, error=e)
+            raise
+        content = "".join(parts)
+        if self._cacheable(messages) and not used_tools:
+            self.cache.set(key, content)
+        self.flight.resolve(key, content)
+
+    async def chat(self, session_id: str, message: str, model: Optional[str] = None) -> str:
+        try:
+            model = model or self.config.chatgpt['model']
+            messages = self.conversation_service.build_messages(session_id, message)
+            key = self._request_key(model, messages)
+            content = self.cache.get(key) if self._cacheable(messages) else None
+            if content is None:
+                content = await self.flight.do(key, lambda: self._complete(key, model, messages))
+            self.conversation_service.append(session_id, message, content)
+            return content
             
         except Exception as e:
             error_msg = self._handle_api_error(e)
@@ -36,6 +206,58 @@ class ChatService:
                 return error_msg
             return f"对话失败: {str(e)}"
 
+    async def chat_stream(self, session_id: str, message: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """流式对话, 逐段返回增量文本"""
+        parts = []
+        try:
+            model = model or self.config.chatgpt['model']
+            messages = self.conversation_service.build_messages(session_id, message)
+            key = self._request_key(model, messages)
+            content = self.cache.get(key) if self._cacheable(messages) else None
+            if content is None:
+                future, leader = self.flight.join(key)
+                if leader:
+                    try:
+                        async for delta in self._stream_completion(key, model, messages):
+                            parts.append(delta)
+                            yield delta
+                    finally:
+                        # 输出被中途关闭时也要通知等待同一请求的调用方, 正常结束时此处无操作
+                        self.flight.resolve(key, error=RuntimeError("调用已取消"))
+                    content = "".join(parts)
+                else:
+                    # 相同请求正在进行, 等待其完整回复后一次性输出
+                    content = await asyncio.shield(future)
+            if not parts:
+                parts.append(content)
+                yield content
+            # 完整输出后才记入历史, 中断的回复不进入上下文
+            self.conversation_service.append(session_id, message, content)
+                    
+        except Exception as e:
+            error_msg = self._handle_api_error(e) or f"对话失败: {str(e)}"
+            # 已输出部分内容时另起一段说明中断
+            yield f"\n\n{error_msg}" if parts else error_msg
+
+    def get_stats(self) -> Dict[str, Any]:
+        """对话缓存、请求合并、会话和模型统计"""
+        return {
+            'cache': self.cache.get_stats(),
+            'coalesced': self.flight.shared,
+            'in_flight': len(self.flight.calls),
+            'conversations': self.conversation_service.get_stats(),
+            'models': self.model_router.get_stats()
+        }
+
+    async def list_available_models(self) -> List[str]:
+        """获取端点支持的模型列表"""
+        try:
+            page = await self.router.call(lambda client: client.models.list())
+            return sorted(model.id for model in page.data)
+        except Exception as e:
+            self.logger.error(f"获取模型列表失败: {e}")
+            return []
+
     def _handle_api_error(self, e: Exception) -> Optional[str]:
         """处理API错误"""
         try:
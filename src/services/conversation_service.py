@@ -0,0 +1,240 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Set
+from utils.config import Config
+from utils.logger import Logger
+from utils.container import Container, lazy_service
+from utils.token_counter import TokenCounter, MESSAGE_OVERHEAD
+from services.personality_service import PersonalityService
+from services.endpoint_router import EndpointRouter
+
+SUMMARY_PROMPT = (
+    "你负责压缩对话记录。请把已有摘要和新的对话内容整合成一份简洁的摘要, "
+    "保留关键事实、用户的偏好和要求、尚未解决的问题, 省略寒暄和重复内容, "
+    "用第三人称叙述, 不超过{limit}字。"
+)
+
+class Exchange:
+    """一轮对话: 用户消息和回复, 缓存token数"""
+    __slots__ = ('user', 'assistant', 'tokens')
+
+    def __init__(self, user: str, assistant: str, tokens: int):
+        self.user = user
+        self.assistant = assistant
+        self.tokens = tokens
+
+class Session:
+    """单个会话的历史记录: 较早内容的摘要 + 最近几轮原文"""
+    __slots__ = ('exchanges', 'tokens', 'summary', 'summary_tokens', 'compacting', 'last_active')
+
+    def __init__(self):
+        self.exchanges = deque()
+        # tokens只统计原文, 摘要单独计数
+        self.tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.compacting = False
+        self.last_active = time.monotonic()
+
+class ConversationService:
+    """按session_id保存对话历史, 按token预算裁剪, 过长时在后台压缩为摘要, 空闲会话按LRU淘汰"""
+    router = lazy_service(EndpointRouter)
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        container = Container()
+        self.token_counter = container.get(TokenCounter)
+        self.personality_service = container.get(PersonalityService)
+
+        settings = self.config.chatgpt.get('memory', {})
+        self.max_tokens = int(self.config.chatgpt.get('max_tokens', 4000))
+        self.reply_tokens = int(settings.get('reply_tokens', 1000))
+        self.max_turns = int(settings.get('max_turns', 20))
+        self.max_sessions = int(settings.get('max_sessions', 1000))
+        self.max_total_tokens = int(settings.get('max_total_tokens', 2000000))
+        self.idle_seconds = float(settings.get('idle_seconds', 3600))
+        # 原文超过阈值时把较早的对话压缩为摘要, 只保留最近几轮原文
+        self.summary_enabled = settings.get('summary_enabled', True)
+        self.summary_threshold = int(settings.get('summary_threshold', self.history_budget // 2))
+        self.summary_keep_turns = int(settings.get('summary_keep_turns', 4))
+        self.summary_max_tokens = int(settings.get('summary_max_tokens', 400))
+        self.summary_model = settings.get('summary_model') or None
+
+        # 按最近活跃时间排序: {session_id: Session}
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.total_tokens = 0
+        self.evicted = 0
+        self.compactions = 0
+        self.compaction_failures = 0
+        self.tasks: Set[asyncio.Task] = set()
+
+    @property
+    def history_budget(self) -> int:
+        """历史记录可用的token数(总预算减去回复预留)"""
+        return self.max_tokens - self.reply_tokens
+
+    def system_prompt(self, session_id: str) -> str:
+        """会话的系统提示词: 已设置的人格或预设"""
+        return self.personality_service.get_personality(session_id)
+
+    def context_tokens(self, session_id: str) -> int:
+        """会话当前保存的历史(含摘要)的token数"""
+        session = self.sessions.get(session_id)
+        return session.tokens + session.summary_tokens if session is not None else 0
+
+    def build_messages(self, session_id: str, message: str) -> List[Dict[str, Any]]:
+        """构造请求消息: 系统提示词(含历史摘要) + 预算内最近的历史 + 当前消息"""
+        system = self.system_prompt(session_id)
+        session = self.sessions.get(session_id)
+        if session is not None and session.summary:
+            system = f"{system}\n\n之前对话的摘要:\n{session.summary}"
+        budget = (
+            self.history_budget
+            - self.token_counter.count(system) - MESSAGE_OVERHEAD
+            - self.token_counter.count(message) - MESSAGE_OVERHEAD
+        )
+
+        history = []
+        if session is not None:
+            for exchange in reversed(session.exchanges):
+                if exchange.tokens > budget:
+                    break
+                budget -= exchange.tokens
+                history.append(exchange)
+            history.reverse()
+
+        messages = [{"role": "system", "content": system}]
+        for exchange in history:
+            messages.append({"role": "user", "content": exchange.user})
+            messages.append({"role": "assistant", "content": exchange.assistant})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def append(self, session_id: str, message: str, response: str):
+        """记录一轮对话"""
+        tokens = (
+            self.token_counter.count(message)
+            + self.token_counter.count(response)
+            + 2 * MESSAGE_OVERHEAD
+        )
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session()
+        self.sessions.move_to_end(session_id)
+        session.last_active = time.monotonic()
+
+        session.exchanges.append(Exchange(message, response, tokens))
+        session.tokens += tokens
+        self.total_tokens += tokens
+
+        # 单个会话只保留预算内的最近记录
+        while session.exchanges and (
+            session.tokens + session.summary_tokens > self.history_budget
+            or len(session.exchanges) > self.max_turns
+        ):
+            self._pop_oldest(session)
+
+        self._evict()
+        if self._needs_compaction(session_id, session):
+            self._schedule_compaction(session_id, session)
+
+    def clear(self, session_id: str):
+        """清除会话历史"""
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.total_tokens -= session.tokens + session.summary_tokens
+
+    def _pop_oldest(self, session: Session):
+        exchange = session.exchanges.popleft()
+        session.tokens -= exchange.tokens
+        self.total_tokens -= exchange.tokens
+
+    def _evict(self):
+        """淘汰空闲会话, 并在超出数量或总token上限时淘汰最久未活跃的会话"""
+        now = time.monotonic()
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            idle = now - session.last_active > self.idle_seconds
+            over_limit = (
+                len(self.sessions) > self.max_sessions
+                or self.total_tokens > self.max_total_tokens
+            )
+            if not (idle or over_limit):
+                break
+            self.clear(session_id)
+            self.evicted += 1
+
+    def _needs_compaction(self, session_id: str, session: Session) -> bool:
+        return (
+            self.summary_enabled
+            and not session.compacting
+            and session_id in self.sessions
+            and session.tokens > self.summary_threshold
+            and len(session.exchanges) > self.summary_keep_turns
+        )
+
+    def _schedule_compaction(self, session_id: str, session: Session):
+        """在后台压缩, 不阻塞当前回复"""
+        session.compacting = True
+        task = asyncio.create_task(self._compact(session_id, session))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _compact(self, session_id: str, session: Session):
+        """把除最近几轮外的对话与已有摘要合并为新摘要"""
+        try:
+            older = list(session.exchanges)[:-self.summary_keep_turns]
+            transcript = "\n".join(
+                f"用户: {exchange.user}\n助手: {exchange.assistant}" for exchange in older
+            )
+            content = f"已有摘要:\n{session.summary or '无'}\n\n新的对话:\n{transcript}"
+            model = self.summary_model or self.config.chatgpt['model']
+            response = await self.router.call(
+                lambda client: client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT.format(limit=self.summary_max_tokens)},
+                        {"role": "user", "content": content}
+                    ],
+                    max_tokens=self.summary_max_tokens
+                )
+            )
+            summary = (response.choices[0].message.content or "").strip()
+            if not summary or self.sessions.get(session_id) is not session:
+                return
+
+            # 压缩期间可能有新对话加入或旧对话被裁剪, 只移除仍在会话中的已摘要部分
+            summarized = {id(exchange) for exchange in older}
+            while session.exchanges and id(session.exchanges[0]) in summarized:
+                self._pop_oldest(session)
+            summary_tokens = self.token_counter.count(summary)
+            self.total_tokens += summary_tokens - session.summary_tokens
+            session.summary = summary
+            session.summary_tokens = summary_tokens
+            self.compactions += 1
+            self.logger.info(f"会话 {session_id} 已压缩 {len(older)} 轮对话, 摘要 {summary_tokens} tokens")
+
+        except Exception as e:
+            self.compaction_failures += 1
+            self.logger.error(f"压缩会话 {session_id} 失败: {e}")
+        finally:
+            session.compacting = False
+
+    async def stop(self):
+        """取消未完成的压缩任务"""
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """会话统计"""
+        return {
+            'sessions': len(self.sessions),
+            'total_tokens': self.total_tokens,
+            'evicted': self.evicted,
+            'compactions': self.compactions,
+            'compaction_failures': self.compaction_failures,
+            'compacting': len(self.tasks)
+        }
@@ -1,21 +1,93 @@
+import asyncio
+import atexit
+import queue
 import sqlite3
-from typing import Optional, List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Callable
+from utils.config import Config
 from utils.logger import Logger
 
+# 写入线程退出标记
+_STOP = object()
+
+# SQLite单条语句的参数个数上限较低, IN查询按此分批
+IN_CHUNK = 500
+
+# 一条语句及其参数行: (sql, [参数, ...])
+Statement = Tuple[str, List[tuple]]
+
+class _Write:
+    """一个调用方的写入: 其中的语句在同一个事务中提交, 提交后回调是否成功"""
+    __slots__ = ('statements', 'rows', 'callback')
+
+    def __init__(self, statements: List[Statement], callback: Optional[Callable[[bool], None]] = None):
+        self.statements = statements
+        self.rows = sum(len(rows) for _, rows in statements)
+        self.callback = callback
+
+class _Barrier:
+    """写入队列中的同步点: 立即提交之前的写入后回调"""
+    __slots__ = ('callback',)
+
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+
 class DBService:
-    def __init__(self, db_path: str = "data/bot.db"):
-        self.db_path = db_path
+    """SQLite数据库: 查询在专用线程执行, 写入由后台线程批量提交, 不阻塞事件循环"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.config = Config()
         self.logger = Logger()
+        settings = self.config.database
+        self.db_path = db_path or settings.get('path', 'data/bot.db')
+        self.batch_size = int(settings.get('batch_size', 100))
+        self.flush_interval = float(settings.get('flush_interval', 200)) / 1000
+        self.busy_timeout = int(settings.get('busy_timeout', 5000))
+        self.cache_size = int(settings.get('cache_size', 8000))
+        self.statement_cache = int(settings.get('statement_cache', 128))
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # 读连接只在专用的查询线程中使用; WAL模式下读不会被写入阻塞
+        self.read_conn = self._connect()
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-reader")
         self._init_db()
-        
+
+        # 待写入的_Write或flush请求_Barrier
+        self.writes: "queue.Queue" = queue.Queue()
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self.writer.start()
+
+        # 进程退出时写完队列中的数据
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建连接并设置WAL和性能相关参数"""
+        # cached_statements: 每个连接缓存的预编译语句数
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False,
+            timeout=self.busy_timeout / 1000, cached_statements=self.statement_cache
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL模式下NORMAL只在检查点时fsync, 断电最多丢失最近的事务, 不会损坏数据库
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
     def _init_db(self):
         """初始化数据库"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
+            with self.read_conn as conn:
                 # 创建用户表
-                cursor.execute("""
+                conn.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     uid INTEGER PRIMARY KEY,
                     nickname TEXT,
@@ -23,18 +95,18 @@ class DBService:
                     chat_count INTEGER DEFAULT 0
                 )
                 """)
-                
+
                 # 创建群组表
-                cursor.execute("""
+                conn.execute("""
                 CREATE TABLE IF NOT EXISTS groups (
                     gid INTEGER PRIMARY KEY,
                     name TEXT,
                     join_time DATETIME
                 )
                 """)
-                
+
                 # 创建会话历史表
-                cursor.execute("""
+                conn.execute("""
                 CREATE TABLE IF NOT EXISTS chat_history (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     uid INTEGER,
@@ -44,33 +116,227 @@ class DBService:
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
                 """)
-                
-                conn.commit()
-                
+
         except Exception as e:
             self.logger.error(f"Error initializing database: {e}")
-            
-    def add_chat_history(self, uid: int, gid: Optional[int], message: str, response: str):
-        """添加聊天历史"""
+
+    def _write_loop(self):
+        """后台写入线程: 攒够batch_size行或等待flush_interval后在一个事务中提交"""
+        conn = self._connect()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO chat_history (uid, gid, message, response) VALUES (?, ?, ?, ?)",
-                    (uid, gid, message, response)
-                )
-                conn.commit()
+            while True:
+                item = self.writes.get()
+                if item is _STOP:
+                    return
+                batch: List[_Write] = []
+                waiters: List[_Barrier] = []
+                rows = 0
+                stop = False
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if isinstance(item, _Barrier):
+                        # 同步点: 立即提交已收集的数据
+                        waiters.append(item)
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                    rows += item.rows
+                    if rows >= self.batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self.writes.get(timeout=remaining) if remaining > 0 else self.writes.get_nowait()
+                    except queue.Empty:
+                        break
+                self._commit(conn, batch)
+                for waiter in waiters:
+                    waiter.callback()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Write]):
+        """在一个事务中执行一批写入, 相邻的相同语句合并为executemany; 失败时逐个调用方重试, 只丢弃出错的写入"""
+        if not batch:
+            return
+        # 合并相邻的相同语句
+        merged: List[Statement] = []
+        for write in batch:
+            for sql, rows in write.statements:
+                if merged and merged[-1][0] == sql:
+                    merged[-1][1].extend(rows)
+                else:
+                    merged.append((sql, list(rows)))
+        try:
+            with conn:
+                for sql, rows in merged:
+                    conn.executemany(sql, rows)
         except Exception as e:
-            self.logger.error(f"Error adding chat history: {e}")
-            
-    def get_user_chat_count(self, uid: int) -> int:
+            if len(batch) == 1:
+                self.failed += batch[0].rows
+                self.logger.error(f"写入数据库失败: {e}, 语句: {batch[0].statements[0][0]}")
+                self._done(batch[0], False)
+                return
+            self.logger.warning(f"批量写入数据库失败({len(batch)}个写入), 逐个重试: {e}")
+            # 整批已回滚, 每个调用方的写入单独提交, 一个失败不影响其他调用方
+            for write in batch:
+                self._commit(conn, [write])
+            return
+        self.written += sum(write.rows for write in batch)
+        self.batches += 1
+        for write in batch:
+            self._done(write, True)
+
+    def _done(self, write: _Write, ok: bool):
+        if write.callback is not None:
+            try:
+                write.callback(ok)
+            except Exception as e:
+                self.logger.error(f"写入回调执行失败: {e}")
+
+    def _enqueue(self, statements: List[Statement], callback: Optional[Callable[[bool], None]] = None) -> bool:
+        if not self.writer.is_alive():
+            self.logger.error("数据库写入线程已停止, 丢弃写入")
+            return False
+        self.writes.put(_Write(statements, callback))
+        return True
+
+    def execute_later(self, sql: str, params: tuple = ()) -> bool:
+        """加入写入队列后立即返回, 由后台线程批量提交"""
+        return self._enqueue([(sql, [params])])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中已有的写入提交完成"""
+        if not self.writer.is_alive():
+            return self.writes.empty()
+        done = threading.Event()
+        self.writes.put(_Barrier(done.set))
+        return done.wait(timeout)
+
+    async def _write(self, statements: List[Statement]) -> bool:
+        """提交一组语句(同一个事务)并等待结果, 返回是否全部写入成功"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(ok: bool):
+            if not future.done():
+                future.set_result(ok)
+
+        if not self._enqueue(statements, lambda ok: loop.call_soon_threadsafe(resolve, ok)):
+            return False
+        return await future
+
+    async def execute(self, sql: str, params: tuple = ()) -> bool:
+        """写入并等待提交完成"""
+        return await self._write([(sql, [params])])
+
+    async def executemany(self, sql: str, rows: Iterable[tuple]) -> bool:
+        """批量写入并等待提交完成, 所有行在同一个事务中提交, 任一行失败时全部不写入"""
+        rows = list(rows)
+        if not rows:
+            return True
+        return await self._write([(sql, rows)])
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """在查询线程中执行查询"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.reader, self._fetchall, sql, params)
+
+    async def fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    def _fetchall(self, sql: str, params: tuple) -> List[tuple]:
+        return self.read_conn.execute(sql, params).fetchall()
+
+    def _fetch_in(self, sql: str, values: List[Any]) -> List[tuple]:
+        """sql中的{marks}替换为IN参数, 按IN_CHUNK分批查询"""
+        rows = []
+        for start in range(0, len(values), IN_CHUNK):
+            chunk = values[start:start + IN_CHUNK]
+            rows.extend(self.read_conn.execute(sql.format(marks=",".join("?" * len(chunk))), chunk).fetchall())
+        return rows
+
+    def _chat_history_statements(self, records: List[Tuple[int, Optional[int], str, str]]) -> List[Statement]:
+        """聊天历史和用户聊天次数的写入语句: 每条记录插入chat_history,
+        并创建或更新users中该用户的行(last_active设为当前时间, chat_count加1)"""
+        return [
+            ("INSERT INTO chat_history (uid, gid, message, response) VALUES (?, ?, ?, ?)", list(records)),
+            ("INSERT INTO users (uid, last_active, chat_count) VALUES (?, CURRENT_TIMESTAMP, 1) "
+             "ON CONFLICT(uid) DO UPDATE SET last_active = CURRENT_TIMESTAMP, chat_count = chat_count + 1",
+             [(record[0],) for record in records])
+        ]
+
+    def add_chat_history(self, uid: int, gid: Optional[int], message: str, response: str):
+        """添加聊天历史; 同一个事务中用户的chat_count加1并更新last_active, 用户不存在时创建,
+        因此chat_count是已记录的聊天历史条数, 关闭chat_history后不再增加"""
+        self._enqueue(self._chat_history_statements([(uid, gid, message, response)]))
+
+    async def add_chat_histories(self, records: List[Tuple[int, Optional[int], str, str]]) -> bool:
+        """批量添加聊天历史(uid, gid, message, response), 与add_chat_history一样累计chat_count,
+        在同一个事务中提交并等待结果"""
+        if not records:
+            return True
+        return await self._write(self._chat_history_statements(records))
+
+    async def get_user_chat_count(self, uid: int) -> int:
         """获取用户聊天次数"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT chat_count FROM users WHERE uid = ?", (uid,))
-                result = cursor.fetchone()
-                return result[0] if result else 0
+            result = await self.fetchone("SELECT chat_count FROM users WHERE uid = ?", (uid,))
+            return result[0] if result else 0
         except Exception as e:
             self.logger.error(f"Error getting user chat count: {e}")
-            return 0
\ No newline at end of file
+            return 0
+
+    async def get_users(self, uids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """按QQ号批量查询用户, 不存在的用户不在结果中"""
+        uids = list(dict.fromkeys(int(uid) for uid in uids))
+        if not uids:
+            return {}
+        try:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(
+                self.reader, self._fetch_in,
+                "SELECT uid, nickname, last_active, chat_count FROM users WHERE uid IN ({marks})", uids
+            )
+        except Exception as e:
+            self.logger.error(f"Error getting users: {e}")
+            return {}
+        return {
+            row[0]: {'uid': row[0], 'nickname': row[1], 'last_active': row[2], 'chat_count': row[3]}
+            for row in rows
+        }
+
+    async def get_user_chat_counts(self, uids: Iterable[int]) -> Dict[int, int]:
+        """按QQ号批量查询聊天次数, 没有记录的用户为0"""
+        uids = list(uids)
+        users = await self.get_users(uids)
+        return {int(uid): users[int(uid)]['chat_count'] if int(uid) in users else 0 for uid in uids}
+
+    def close(self):
+        """写完队列中的数据后关闭连接"""
+        if self.writer.is_alive():
+            self.writes.put(_STOP)
+            self.writer.join()
+            self.logger.info(f"数据库已关闭, 共写入 {self.written} 条")
+        self.reader.shutdown(wait=True)
+        try:
+            self.read_conn.close()
+        except Exception as e:
+            self.logger.error(f"Error closing database: {e}")
+
+    async def stop(self):
+        """服务停止时在线程中等待写入完成, 不阻塞事件循环"""
+        await asyncio.to_thread(self.close)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """写入队列统计"""
+        return {
+            'pending': self.writes.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'failed': self.failed
+        }
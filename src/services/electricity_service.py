@@ -1,4 +1,3 @@
-import requests
 from typing import Optional, Dict, Any
 from utils.config import Config
 from utils.logger import Logger
@@ -12,11 +11,13 @@ class ElectricityService:
     def query_electricity(self, room_id: str) -> Optional[Dict[str, Any]]:
         """查询电费"""
         try:
+            import requests
+            
             params = {
                 'room_id': room_id,
                 'api_key': self.config.electricity['api_key']
             }
-            response = requests.get(self.api_url, params=params)
+            response = requests.get(self.api_url, params=params, timeout=10)
             response.raise_for_status()
             result = response.json()
             
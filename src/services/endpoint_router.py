@@ -0,0 +1,219 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable, TypeVar, TYPE_CHECKING
+from utils.config import Config
+from utils.logger import Logger
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+T = TypeVar('T')
+
+# 请求本身有误, 换端点也无法成功, 不做故障转移
+CLIENT_ERROR_STATUS = (400, 413, 422)
+
+class EndpointState:
+    """单个OpenAI端点的客户端和健康统计"""
+
+    def __init__(self, endpoint: Dict[str, Any], window: int):
+        self.url = endpoint['url']
+        self.api_key = endpoint['api_key']
+        self.priority = endpoint['priority']
+        self.client = None
+        # 最近N次成功请求的耗时和最近N次请求的结果
+        self.latencies = deque(maxlen=window)
+        self.results = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.last_error = ""
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    @property
+    def avg_latency(self) -> float:
+        if not self.latencies:
+            return 0.0
+        return sum(self.latencies) / len(self.latencies)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.results:
+            return 0.0
+        return self.results.count(False) / len(self.results)
+
+    def score(self) -> float:
+        """越小越好: 平均耗时按错误率加权, 没有数据的端点优先尝试"""
+        if not self.results:
+            return 0.0
+        if not self.latencies:
+            return float('inf')
+        return self.avg_latency * (1 + 4 * self.error_rate)
+
+class EndpointRouter:
+    """在多个OpenAI端点间按健康状况选择, 失败时在同一请求内切换端点"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        settings = self.config.openai.get('router', {})
+        self.eject_failures = int(settings.get('eject_failures', 3))
+        self.eject_seconds = float(settings.get('eject_seconds', 60))
+        self.probe_interval = float(settings.get('probe_interval', 30))
+        self.timeout = float(settings.get('timeout', 60))
+        window = int(settings.get('window', 50))
+
+        self.states = [
+            EndpointState(endpoint, window)
+            for endpoint in sorted(self.config.openai['endpoints'], key=lambda x: x['priority'])
+        ]
+        self.probe_task: Optional[asyncio.Task] = None
+        # 探测任务下一次检查的时间
+        self.next_probe = 0.0
+
+    def client_for(self, state: EndpointState) -> "AsyncOpenAI":
+        """首次使用时创建端点的客户端"""
+        if state.client is None:
+            from openai import AsyncOpenAI
+            # 重试由路由器负责, 客户端不再自行重试
+            state.client = AsyncOpenAI(
+                api_key=state.api_key,
+                base_url=state.url,
+                timeout=self.timeout,
+                max_retries=0
+            )
+        return state.client
+
+    def warm_up(self):
+        """后台预热: 提前创建所有端点的客户端"""
+        for state in self.states:
+            self.client_for(state)
+
+    def ranked(self) -> List[EndpointState]:
+        """按健康程度排序的可用端点, 全部被摘除时按恢复时间尝试全部端点"""
+        available = [state for state in self.states if not state.ejected]
+        if not available:
+            return sorted(self.states, key=lambda state: state.ejected_until)
+        return sorted(available, key=lambda state: (state.score(), state.priority))
+
+    async def call(self, request: Callable[["AsyncOpenAI"], Awaitable[T]]) -> T:
+        """依次在最健康的端点上执行请求, 直到成功"""
+        states = self.ranked()
+        if not states:
+            raise RuntimeError("没有可用的端点")
+        last_error: Optional[Exception] = None
+        for state in states:
+            start = time.monotonic()
+            try:
+                result = await request(self.client_for(state))
+                self.record_success(state, time.monotonic() - start)
+                return result
+            except Exception as e:
+                if getattr(e, 'status_code', None) in CLIENT_ERROR_STATUS:
+                    raise
+                self.record_failure(state, e)
+                last_error = e
+                self.logger.warning(f"端点 {state.url} 请求失败, 尝试下一个端点: {e}")
+        raise last_error
+
+    def record_success(self, state: EndpointState, latency: float):
+        """记录成功请求"""
+        state.requests += 1
+        state.latencies.append(latency)
+        state.results.append(True)
+        state.consecutive_failures = 0
+        state.ejected_until = 0.0
+
+    def record_failure(self, state: EndpointState, error: Exception):
+        """记录失败请求, 限流或连续失败时摘除端点"""
+        state.requests += 1
+        state.failures += 1
+        state.results.append(False)
+        state.consecutive_failures += 1
+        state.last_error = str(error)[:200]
+
+        if getattr(error, 'status_code', None) == 429:
+            state.rate_limited += 1
+            self._eject(state, self._retry_after(error) or self.eject_seconds)
+        elif state.consecutive_failures >= self.eject_failures:
+            self._eject(state, self.eject_seconds)
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        """读取限流响应的Retry-After"""
+        try:
+            return float(error.response.headers.get('retry-after'))
+        except Exception:
+            return None
+
+    def _eject(self, state: EndpointState, seconds: float):
+        """暂时摘除端点, 并确保探测任务在运行"""
+        state.ejected_until = time.monotonic() + seconds
+        self.logger.warning(f"端点 {state.url} 已被暂时摘除 {seconds:.0f}秒: {state.last_error}")
+        if self.probe_task is None or self.probe_task.done():
+            self.probe_task = asyncio.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        """定期探测到期的被摘除端点, 恢复后重新启用"""
+        while any(state.ejected_until for state in self.states):
+            self.next_probe = time.monotonic() + self.probe_interval
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            for state in self.states:
+                if state.ejected_until and state.ejected_until <= now:
+                    await self._probe(state)
+
+    async def _probe(self, state: EndpointState):
+        """用模型列表接口探测端点"""
+        try:
+            await asyncio.wait_for(self.client_for(state).models.list(), self.timeout)
+            state.ejected_until = 0.0
+            state.consecutive_failures = 0
+            self.logger.info(f"端点 {state.url} 探测成功, 已恢复")
+        except Exception as e:
+            state.last_error = str(e)[:200]
+            state.ejected_until = time.monotonic() + self.eject_seconds
+            self.logger.warning(f"端点 {state.url} 探测失败: {e}")
+
+    async def stop(self):
+        """停止探测任务"""
+        if self.probe_task is not None:
+            self.probe_task.cancel()
+            await asyncio.gather(self.probe_task, return_exceptions=True)
+            self.probe_task = None
+
+    def _probe_in(self, state: EndpointState, now: float) -> float:
+        """距离该端点下一次被探测的秒数: 摘除到期后的第一次探测检查"""
+        if not state.ejected_until:
+            return 0.0
+        # 探测任务刚启动或正在探测时, 下一次检查在一个间隔之后
+        next_probe = self.next_probe if self.next_probe > now else now + self.probe_interval
+        if state.ejected_until <= next_probe:
+            return next_probe - now
+        ticks = math.ceil((state.ejected_until - next_probe) / self.probe_interval)
+        return next_probe + ticks * self.probe_interval - now
+
+    def get_health(self) -> List[Dict[str, Any]]:
+        """各端点的当前健康状况"""
+        now = time.monotonic()
+        return [
+            {
+                'url': state.url,
+                'priority': state.priority,
+                'ejected': state.ejected,
+                'ejected_remaining': max(0.0, state.ejected_until - now),
+                'probe_in': self._probe_in(state, now),
+                'avg_latency_ms': round(state.avg_latency * 1000, 1),
+                'error_rate': round(state.error_rate, 3),
+                'requests': state.requests,
+                'failures': state.failures,
+                'rate_limited': state.rate_limited,
+                'last_error': state.last_error
+            }
+            for state in self.states
+        ]
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, List
+from utils.config import Config
+from utils.logger import Logger
+
+class EventQueueService:
+    """上报事件队列: 入队后立即响应, 由后台协程池处理"""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[None]]):
+        self.config = Config()
+        self.logger = Logger()
+        self.handler = handler
+
+        settings = self.config.ingress
+        self.mode = settings.get('mode', 'queue')
+        self.queue_size = int(settings.get('queue_size', 1000))
+        self.worker_count = max(1, int(settings.get('workers', 4)))
+
+        # 启动前收到的事件先入队, 启动后再处理
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers: List[asyncio.Task] = []
+
+        # 统计信息
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        # 被丢弃且发送方无法重发的事件(反向WebSocket)
+        self.lost = 0
+        self.wait_times = deque(maxlen=1000)
+
+    @property
+    def enabled(self) -> bool:
+        """是否使用队列模式"""
+        return self.mode == 'queue'
+
+    async def start(self):
+        """启动处理协程"""
+        if not self.enabled or self.workers:
+            return
+        self.workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.worker_count)
+        ]
+        self.logger.info(
+            f"事件队列已启动: 队列长度 {self.queue_size}, 处理协程 {self.worker_count}"
+        )
+
+    def put(self, data: Dict[str, Any], retryable: bool = True) -> bool:
+        """事件入队, 队列已满时返回False; retryable为False表示发送方不会重发, 丢弃即丢失"""
+        self.received += 1
+        try:
+            self.queue.put_nowait((time.monotonic(), data))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if retryable:
+                self.logger.warning(f"事件队列已满, 丢弃事件: {data.get('post_type')}")
+            else:
+                self.lost += 1
+                self.logger.error(f"事件队列已满, 事件已丢失(无法重发): {data.get('post_type')}")
+            return False
+
+    async def _worker(self, index: int):
+        """从队列取出事件并处理"""
+        while True:
+            enqueued_at, data = await self.queue.get()
+            self.wait_times.append(time.monotonic() - enqueued_at)
+            try:
+                await self.handler(data)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"事件处理协程{index}异常: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def stop(self, timeout: float = 10):
+        """等待队列处理完毕后停止"""
+        if not self.workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"事件队列停止超时, 剩余 {self.queue.qsize()} 个事件未处理")
+
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.logger.info("事件队列已停止")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        waits = sorted(self.wait_times)
+        stats = {
+            'mode': self.mode,
+            'depth': self.queue.qsize(),
+            'queue_size': self.queue_size,
+            'workers': len(self.workers),
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'lost': self.lost,
+            'wait_ms': {
+                'avg': 0.0,
+                'p95': 0.0,
+                'max': 0.0
+            }
+        }
+        if waits:
+            stats['wait_ms'] = {
+                'avg': round(sum(waits) / len(waits) * 1000, 2),
+                'p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2),
+                'max': round(waits[-1] * 1000, 2)
+            }
+        return stats
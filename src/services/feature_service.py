@@ -1,7 +1,5 @@
 from typing import Optional, List, Dict, Any
 import random
-import requests
-from bs4 import BeautifulSoup
 from utils.config import Config
 from utils.logger import Logger
 
@@ -31,8 +29,10 @@ class FeatureService:
     def get_news(self) -> List[str]:
         """获取新闻"""
         try:
+            import requests
+            
             url = "https://api.example.com/news"
-            response = requests.get(url)
+            response = requests.get(url, timeout=10)
             response.raise_for_status()
             return response.json()["data"]
         except Exception as e:
@@ -42,13 +42,15 @@ class FeatureService:
     def translate(self, text: str, from_lang: str, to_lang: str) -> Optional[str]:
         """翻译服务"""
         try:
+            import requests
+            
             url = "https://api.example.com/translate"
             data = {
                 "text": text,
                 "from": from_lang,
                 "to": to_lang
             }
-            response = requests.post(url, json=data)
+            response = requests.post(url, json=data, timeout=10)
             response.raise_for_status()
             return response.json()["translation"]
         except Exception as e:
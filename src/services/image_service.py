@@ -1,31 +1,25 @@
 from typing import Optional, List
 import random
-from openai import OpenAI
-import requests
-from bs4 import BeautifulSoup
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
+from services.endpoint_router import EndpointRouter
 
 class ImageService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.endpoint = sorted(
-            self.config.openai['endpoints'],
-            key=lambda x: x['priority']
-        )[0]
-        self.client = OpenAI(
-            api_key=self.endpoint['api_key'],
-            base_url=self.endpoint['url']
-        )
+        self.router = Container().get(EndpointRouter)
         
-    def generate_openai_image(self, prompt: str) -> Optional[str]:
+    async def generate_openai_image(self, prompt: str) -> Optional[str]:
         """使用OpenAI生成图片"""
         try:
-            response = self.client.images.generate(
-                prompt=prompt,
-                n=1,
-                size=self.config.openai['img_size']
+            response = await self.router.call(
+                lambda client: client.images.generate(
+                    prompt=prompt,
+                    n=1,
+                    size=self.config.openai['img_size']
+                )
             )
             return response.data[0].url
         except Exception as e:
@@ -35,10 +29,13 @@ class ImageService:
     def get_random_images(self, keyword: str, count: int = 1) -> List[str]:
         """获取随机图片"""
         try:
+            import requests
+            from bs4 import BeautifulSoup
+            
             page = random.randint(1, 100)
             url = f"https://www.duitang.com/search/?kw={keyword}&type=feed&start={page*24}"
             
-            response = requests.get(url)
+            response = requests.get(url, timeout=10)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, "html.parser")
@@ -1,29 +1,28 @@
 import random
-import time
+import asyncio
 from typing import Optional, List
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 from services.qq_service import QQService
 
 class LikeService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
+        container = Container()
+        self.qq_service = container.get(QQService)
         
-    def send_like(self, uid: int, times: int = 10) -> bool:
+    async def send_like(self, uid: int, times: int = 10) -> bool:
         """发送点赞"""
         try:
-            url = f"{self.config.qq_bot['cqhttp_url']}/send_like"
             data = {
                 "user_id": uid,
                 "times": times
             }
-            response = self.qq_service.session.post(url, json=data)
-            response.raise_for_status()
-            result = response.json()
+            result = await self.qq_service.call_api("send_like", data)
             
-            if result['status'] == 'ok':
+            if result and result['status'] == 'ok':
                 self.logger.info(f"Successfully sent {times} likes to {uid}")
                 return True
             return False
@@ -32,27 +31,23 @@ class LikeService:
             self.logger.error(f"Error sending likes: {e}")
             return False
             
-    def batch_send_likes(self, uids: List[int], times: int = 10) -> dict:
+    async def batch_send_likes(self, uids: List[int], times: int = 10) -> dict:
         """批量发送点赞"""
         results = {}
         for uid in uids:
-            success = self.send_like(uid, times)
+            success = await self.send_like(uid, times)
             results[uid] = success
             if success:
                 # 随机延迟1-3秒,避免频率过快
-                time.sleep(random.uniform(1, 3))
+                await asyncio.sleep(random.uniform(1, 3))
         return results
         
-    def get_like_limit(self, uid: int) -> Optional[int]:
+    async def get_like_limit(self, uid: int) -> Optional[int]:
         """获取剩余点赞次数"""
         try:
-            url = f"{self.config.qq_bot['cqhttp_url']}/get_like_limit"
-            params = {"user_id": uid}
-            response = self.qq_service.session.get(url, params=params)
-            response.raise_for_status()
-            result = response.json()
+            result = await self.qq_service.call_api("get_like_limit", {"user_id": uid})
             
-            if result['status'] == 'ok':
+            if result and result['status'] == 'ok':
                 return result['data']['limit']
             return None
             
@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from typing import Dict, Any, Optional, List
+from utils.config import Config
+from utils.logger import Logger
+from utils.rate_limit import TokenBucket
+
+# 调度优先级: 管理员 > 私聊 > 群聊
+LANE_ADMIN = 'admin'
+LANE_PRIVATE = 'private'
+LANE_GROUP = 'group'
+
+# 令牌桶数量超过该值时清理已满(长时间未使用)的桶
+MAX_BUCKETS = 10000
+
+# 被丢弃请求的原因
+SHED_RATE_LIMITED = 'rate_limited'
+SHED_OVERLOADED = 'overloaded'
+SHED_STALE = 'stale'
+SHED_SUPERSEDED = 'superseded'
+SHED_DEADLINE = 'deadline'
+SHED_FALLBACK = 'fallback'
+
+class Ticket:
+    """一次对话请求的调度凭证: wait() 等待名额, 用完后 release()"""
+
+    def __init__(self, scheduler: "LLMScheduler", lane: str, gid: Optional[int], uid: int,
+                 session_id: Optional[str] = None):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.gid = gid
+        self.uid = uid
+        self.session_id = session_id
+        self.accepted = True
+        # 被拒绝或丢弃的原因
+        self.reason: Optional[str] = None
+        self.retry_after = 0.0
+        # 负载较高时改用的模型, None表示使用默认模型
+        self.model: Optional[str] = None
+        # 进入排队时前面等待的请求数
+        self.position = 0
+        self.granted = False
+        self.released = False
+        self.cancelled = False
+        self.future: Optional[asyncio.Future] = None
+
+    async def wait(self) -> bool:
+        """等待名额, 排队超时或被新请求取代时返回False"""
+        return await self.scheduler._acquire(self)
+
+    def release(self):
+        self.scheduler._release(self)
+
+class LLMScheduler:
+    """对话请求调度: 按用户/群令牌桶限流, 管理员和私聊优先, 群之间按权重公平排队, 积压时降级"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        settings = self.config.chatgpt.get('scheduler', {})
+        self.concurrency = int(settings.get('concurrency', 4))
+        # 配置为每分钟请求数, 令牌桶按每秒计算
+        self.user_rate = float(settings.get('user_rate', 6)) / 60
+        self.user_burst = float(settings.get('user_burst', 3))
+        self.group_rate = float(settings.get('group_rate', 30)) / 60
+        self.group_burst = float(settings.get('group_burst', 10))
+        self.admin_rate = float(settings.get('admin_rate', 60)) / 60
+        self.admin_burst = float(settings.get('admin_burst', 10))
+        self.group_weights = {
+            str(gid): float(weight) for gid, weight in (settings.get('group_weights') or {}).items()
+        }
+        # 积压控制: 排队上限、排队超时、单次请求期限, 排队较多时改用备用模型
+        self.max_queue = int(settings.get('max_queue', 20))
+        self.queue_timeout = float(settings.get('queue_timeout', 30))
+        self.request_timeout = float(settings.get('request_timeout', 120))
+        self.fallback_model = settings.get('fallback_model') or None
+        self.fallback_queue = int(settings.get('fallback_queue', 5))
+
+        self.running = 0
+        self.lanes: Dict[str, deque] = {LANE_ADMIN: deque(), LANE_PRIVATE: deque()}
+        # 群请求按加权公平排队: (虚拟完成时间, 序号, 凭证)
+        self.group_heap: List[tuple] = []
+        # 已被丢弃但还留在堆中的群请求数, 出堆时跳过, 过多时重建堆
+        self.group_cancelled = 0
+        self.group_finish: Dict[int, float] = {}
+        self.virtual_time = 0.0
+        self.seq = itertools.count()
+        self.pending = 0
+        # 每个会话正在排队的请求, 同一会话的新请求会取代旧请求
+        self.pending_sessions: Dict[str, Ticket] = {}
+
+        self.user_buckets: Dict[int, TokenBucket] = {}
+        self.admin_bucket = TokenBucket(self.admin_rate, self.admin_burst)
+        self.group_buckets: Dict[int, TokenBucket] = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.queued = 0
+        self.shed: Dict[str, int] = {
+            reason: 0 for reason in (
+                SHED_RATE_LIMITED, SHED_OVERLOADED, SHED_STALE,
+                SHED_SUPERSEDED, SHED_DEADLINE, SHED_FALLBACK
+            )
+        }
+
+    def _is_admin(self, uid: int) -> bool:
+        return str(uid) == str(self.config.qq_bot.get('admin_qq'))
+
+    def _bucket(self, buckets: Dict[int, TokenBucket], key: int, rate: float, burst: float) -> TokenBucket:
+        """获取令牌桶, 数量过多时清理已满的桶"""
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_BUCKETS:
+                for stale in [k for k, b in buckets.items() if b.full]:
+                    del buckets[stale]
+            bucket = buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def admit(self, gid: Optional[int], uid: int, session_id: Optional[str] = None) -> Ticket:
+        """准入检查: 超出配额或排队已满时拒绝, 否则立即获得名额或进入排队"""
+        if self._is_admin(uid):
+            lane = LANE_ADMIN
+        elif gid:
+            lane = LANE_GROUP
+        else:
+            lane = LANE_PRIVATE
+        ticket = Ticket(self, lane, gid, uid, session_id)
+
+        # 管理员不受用户和群的配额限制, 但有单独的配额, 同样受排队上限约束
+        if lane == LANE_ADMIN:
+            buckets = [self.admin_bucket]
+        else:
+            buckets = [self._bucket(self.user_buckets, uid, self.user_rate, self.user_burst)]
+            if gid:
+                buckets.append(self._bucket(self.group_buckets, gid, self.group_rate, self.group_burst))
+        # 所有桶都有令牌时才扣除, 被拒绝的请求不消耗配额
+        if not all(bucket.available() for bucket in buckets):
+            ticket.retry_after = max(bucket.retry_after() for bucket in buckets)
+            return self._reject(ticket, SHED_RATE_LIMITED)
+        if self.running >= self.concurrency and self.pending >= self.max_queue:
+            return self._reject(ticket, SHED_OVERLOADED)
+        for bucket in buckets:
+            bucket.try_acquire()
+
+        # 同一会话还在排队的旧请求已无意义, 由新请求取代
+        if session_id:
+            self.supersede(session_id)
+
+        self.admitted += 1
+        if self.running < self.concurrency and not self.pending:
+            self._grant(ticket)
+        else:
+            self._enqueue(ticket)
+            self._dispatch()
+        return ticket
+
+    def supersede(self, session_id: str) -> bool:
+        """丢弃该会话还在排队的请求, 返回是否有请求被丢弃"""
+        previous = self.pending_sessions.get(session_id)
+        if previous is None:
+            return False
+        self._drop(previous, SHED_SUPERSEDED)
+        return True
+
+    def _reject(self, ticket: Ticket, reason: str) -> Ticket:
+        ticket.accepted = False
+        ticket.reason = reason
+        self.rejected += 1
+        self.shed[reason] += 1
+        return ticket
+
+    def record_shed(self, reason: str):
+        """记录在调度器之外被放弃的请求(如超过请求期限)"""
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    def _enqueue(self, ticket: Ticket):
+        """加入对应的等待队列"""
+        ticket.future = asyncio.get_running_loop().create_future()
+        self.queued += 1
+        if ticket.session_id:
+            self.pending_sessions[ticket.session_id] = ticket
+        if ticket.lane == LANE_GROUP:
+            ticket.position = self.pending
+            weight = self.group_weights.get(str(ticket.gid), 1.0)
+            start = max(self.virtual_time, self.group_finish.get(ticket.gid, 0.0))
+            finish = start + 1 / weight
+            self.group_finish[ticket.gid] = finish
+            heapq.heappush(self.group_heap, (finish, next(self.seq), ticket))
+        else:
+            ticket.position = len(self.lanes[LANE_ADMIN])
+            if ticket.lane == LANE_PRIVATE:
+                ticket.position += len(self.lanes[LANE_PRIVATE])
+            self.lanes[ticket.lane].append(ticket)
+        self.pending += 1
+
+    def _unqueue(self, ticket: Ticket):
+        """离开等待状态(获得名额或被丢弃)"""
+        if ticket.future is None:
+            return
+        self.pending -= 1
+        if ticket.session_id and self.pending_sessions.get(ticket.session_id) is ticket:
+            del self.pending_sessions[ticket.session_id]
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        self.running += 1
+        self._unqueue(ticket)
+        # 仍有较多请求在排队时, 改用更快更便宜的备用模型
+        if self.fallback_model and ticket.lane != LANE_ADMIN and self.pending >= self.fallback_queue:
+            ticket.model = self.fallback_model
+            self.shed[SHED_FALLBACK] += 1
+        if ticket.future is not None and not ticket.future.done():
+            ticket.future.set_result(None)
+
+    def _next(self) -> Optional[Ticket]:
+        """按优先级取出下一个等待的请求"""
+        for lane in (LANE_ADMIN, LANE_PRIVATE):
+            queue = self.lanes[lane]
+            while queue:
+                ticket = queue.popleft()
+                if not ticket.cancelled:
+                    return ticket
+        while self.group_heap:
+            finish, _, ticket = heapq.heappop(self.group_heap)
+            if ticket.cancelled:
+                self.group_cancelled -= 1
+                continue
+            self.virtual_time = finish
+            # 完成时间已落后于虚拟时间的群不再需要记录
+            if len(self.group_finish) > MAX_BUCKETS:
+                self.group_finish = {
+                    gid: f for gid, f in self.group_finish.items() if f > self.virtual_time
+                }
+            return ticket
+        return None
+
+    def _dispatch(self):
+        """有空闲名额时唤醒等待的请求"""
+        while self.running < self.concurrency:
+            ticket = self._next()
+            if ticket is None:
+                break
+            self._grant(ticket)
+
+    def _drop(self, ticket: Ticket, reason: Optional[str] = None):
+        """从等待队列中移除请求并唤醒其等待方"""
+        if ticket.granted or ticket.cancelled:
+            return
+        ticket.cancelled = True
+        ticket.reason = reason
+        self._unqueue(ticket)
+        if ticket.lane != LANE_GROUP:
+            self.lanes[ticket.lane].remove(ticket)
+        else:
+            self.group_cancelled += 1
+            self._compact()
+        if reason:
+            self.shed[reason] += 1
+        if not ticket.future.done():
+            ticket.future.set_result(None)
+
+    def _compact(self):
+        """堆中一半以上是已丢弃的请求时重建堆, 避免堆无限增长"""
+        if self.group_cancelled * 2 <= len(self.group_heap):
+            return
+        self.group_heap = [entry for entry in self.group_heap if not entry[2].cancelled]
+        heapq.heapify(self.group_heap)
+        self.group_cancelled = 0
+
+    async def _acquire(self, ticket: Ticket) -> bool:
+        """等待获得名额, 排队超过queue_timeout的请求视为过期丢弃"""
+        if ticket.granted or not ticket.accepted or ticket.cancelled:
+            return ticket.granted
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._drop(ticket, SHED_STALE)
+        except asyncio.CancelledError:
+            if ticket.granted:
+                self._release(ticket)
+            else:
+                self._drop(ticket)
+            raise
+        return ticket.granted
+
+    def _release(self, ticket: Ticket):
+        """释放名额并调度下一个请求"""
+        if not ticket.granted or ticket.released:
+            return
+        ticket.released = True
+        self.running -= 1
+        self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """调度统计"""
+        return {
+            'running': self.running,
+            'concurrency': self.concurrency,
+            'pending': self.pending,
+            'max_queue': self.max_queue,
+            'waiting': {
+                LANE_ADMIN: len(self.lanes[LANE_ADMIN]),
+                LANE_PRIVATE: len(self.lanes[LANE_PRIVATE]),
+                LANE_GROUP: len(self.group_heap) - self.group_cancelled
+            },
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'shed': dict(self.shed)
+        }
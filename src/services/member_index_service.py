@@ -0,0 +1,177 @@
+import random
+import time
+from typing import Dict, Any, List, Optional, Iterable
+from utils.config import Config
+from utils.logger import Logger
+from utils.container import Container
+from utils.cache import SingleFlight
+from services.qq_service import QQService
+
+class GroupMembers:
+    """单个群的成员表: 按QQ号查询、随机抽取、增删均为O(1)"""
+    __slots__ = ('uids', 'positions', 'members', 'loaded_at')
+
+    def __init__(self, members: List[Dict[str, Any]]):
+        # uids和positions配合实现O(1)删除: 删除时把末尾元素移到被删除的位置
+        self.uids: List[int] = []
+        self.positions: Dict[int, int] = {}
+        self.members: Dict[int, Dict[str, Any]] = {}
+        self.loaded_at = time.monotonic()
+        for member in members:
+            self.add(int(member['user_id']), member)
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self.members
+
+    def get(self, uid: int) -> Optional[Dict[str, Any]]:
+        return self.members.get(uid)
+
+    def add(self, uid: int, info: Dict[str, Any]):
+        """添加或更新成员"""
+        if uid not in self.members:
+            self.positions[uid] = len(self.uids)
+            self.uids.append(uid)
+        self.members[uid] = {
+            'user_id': uid,
+            'nickname': info.get('nickname', ''),
+            'card': info.get('card', ''),
+            'role': info.get('role', 'member')
+        }
+
+    def remove(self, uid: int):
+        """删除成员"""
+        index = self.positions.pop(uid, None)
+        if index is None:
+            return
+        last = self.uids.pop()
+        if last != uid:
+            self.uids[index] = last
+            self.positions[last] = index
+        del self.members[uid]
+
+    def random(self, exclude: Iterable[int] = ()) -> Optional[int]:
+        """随机抽取一名成员, 跳过exclude中的成员"""
+        exclude = set(exclude)
+        if len(self.uids) <= len(exclude):
+            candidates = [uid for uid in self.uids if uid not in exclude]
+            return random.choice(candidates) if candidates else None
+        while True:
+            uid = random.choice(self.uids)
+            if uid not in exclude:
+                return uid
+
+class MemberIndexService:
+    """群成员索引: 首次使用时加载成员列表, 之后根据群通知增量更新, 定时与服务端校准"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        self.qq_service = Container().get(QQService)
+        settings = self.config.qq_bot.get('member_index', {})
+        self.reconcile_interval = int(settings.get('reconcile_interval', 3600))
+        self.groups: Dict[int, GroupMembers] = {}
+        self.flight = SingleFlight()
+        self.loads = 0
+        self.updates = 0
+
+    async def _group(self, gid: int) -> Optional[GroupMembers]:
+        """获取群成员表, 未加载时从服务端加载, 同一个群的并发加载只请求一次"""
+        gid = int(gid)
+        group = self.groups.get(gid)
+        if group is not None:
+            return group
+        try:
+            return await self.flight.do(gid, lambda: self._load(gid))
+        except Exception as e:
+            self.logger.error(f"加载群{gid}成员列表失败: {e}")
+            return None
+
+    async def _load(self, gid: int) -> Optional[GroupMembers]:
+        members = await self.qq_service.get_group_member_list(gid)
+        if members is None:
+            return None
+        group = self.groups[gid] = GroupMembers(members)
+        self.loads += 1
+        self.logger.info(f"已加载群{gid}成员 {len(group)} 人")
+        return group
+
+    async def random_member(self, gid: int, exclude: Iterable[int] = ()) -> Optional[int]:
+        """随机抽取一名群成员"""
+        group = await self._group(gid)
+        return group.random(int(uid) for uid in exclude) if group else None
+
+    async def get_member(self, gid: int, uid: int) -> Optional[Dict[str, Any]]:
+        """查询群成员信息, 不在群内时返回None"""
+        group = await self._group(gid)
+        return group.get(int(uid)) if group else None
+
+    async def display_name(self, gid: int, uid: int) -> str:
+        """群名片, 没有时使用昵称"""
+        member = await self.get_member(gid, uid)
+        if member and (member['card'] or member['nickname']):
+            return member['card'] or member['nickname']
+        return await self.qq_service.get_nickname(uid)
+
+    async def is_admin(self, gid: int, uid: int) -> bool:
+        """是否为群主或管理员"""
+        member = await self.get_member(gid, uid)
+        return bool(member) and member['role'] in ('owner', 'admin')
+
+    def _loaded(self, gid: Any) -> Optional[GroupMembers]:
+        """通知只更新已加载的群, 未加载的群在首次使用时会拉取完整列表"""
+        self.updates += 1
+        return self.groups.get(int(gid)) if gid else None
+
+    def on_increase(self, gid: int, uid: int):
+        """成员入群"""
+        group = self._loaded(gid)
+        if group is not None:
+            group.add(int(uid), {})
+
+    def on_decrease(self, gid: int, uid: int):
+        """成员退群或被踢出, 机器人自己离开时移除整个群"""
+        group = self._loaded(gid)
+        if group is None:
+            return
+        if str(uid) == str(self.config.qq_bot['bot_uid']):
+            self.groups.pop(int(gid), None)
+        else:
+            group.remove(int(uid))
+
+    def on_card(self, gid: int, uid: int, card: str):
+        """群名片变更"""
+        group = self._loaded(gid)
+        member = group.get(int(uid)) if group is not None else None
+        if member is not None:
+            member['card'] = card
+
+    def on_admin(self, gid: int, uid: int, is_admin: bool):
+        """管理员设置或取消"""
+        group = self._loaded(gid)
+        member = group.get(int(uid)) if group is not None else None
+        if member is not None and member['role'] != 'owner':
+            member['role'] = 'admin' if is_admin else 'member'
+
+    async def reconcile(self):
+        """重新拉取已加载群的成员列表, 校准遗漏的通知"""
+        for gid in list(self.groups):
+            members = await self.qq_service.get_group_member_list(gid)
+            if members is None or gid not in self.groups:
+                continue
+            group = GroupMembers(members)
+            drift = len(set(group.uids) ^ set(self.groups[gid].uids))
+            self.groups[gid] = group
+            if drift:
+                self.logger.info(f"群{gid}成员列表已校准, 修正 {drift} 人")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """成员索引统计"""
+        return {
+            'groups': len(self.groups),
+            'members': sum(len(group) for group in self.groups.values()),
+            'loads': self.loads,
+            'updates': self.updates
+        }
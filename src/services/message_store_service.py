@@ -0,0 +1,115 @@
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional
+from utils.config import Config
+from utils.logger import Logger
+
+# 非文本消息段在存储中显示的占位文字
+SEGMENT_PLACEHOLDERS = {
+    'image': '[图片]',
+    'face': '[表情]',
+    'record': '[语音]',
+    'video': '[视频]',
+    'file': '[文件]',
+    'music': '[音乐]',
+    'forward': '[合并转发]',
+    'json': '[卡片]',
+    'xml': '[卡片]'
+}
+
+def render_message(message: List[Dict[str, Any]]) -> str:
+    """把消息段压缩为一行可读文本"""
+    parts = []
+    for segment in message:
+        segment_type = segment.get('type')
+        data = segment.get('data', {})
+        if segment_type == 'text':
+            parts.append(data.get('text', ''))
+        elif segment_type == 'at':
+            parts.append(f"@{data.get('qq')} ")
+        elif segment_type != 'reply':
+            parts.append(SEGMENT_PLACEHOLDERS.get(segment_type, f"[{segment_type}]"))
+    return "".join(parts).strip()
+
+class StoredMessage:
+    """一条收到的消息, 只保留撤回和回复处理需要的字段"""
+    __slots__ = ('message_id', 'group_id', 'user_id', 'nickname', 'time', 'content')
+
+    def __init__(self, message_id: int, group_id: Optional[int], user_id: int, nickname: str, time: int, content: str):
+        self.message_id = message_id
+        self.group_id = group_id
+        self.user_id = user_id
+        self.nickname = nickname
+        self.time = time
+        self.content = content
+
+class MessageStoreService:
+    """最近消息存储: 按群/私聊分别保留最近的消息, 按message_id查询"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        settings = self.config.qq_bot.get('message_store', {})
+        self.group_limit = int(settings.get('group_limit', 200))
+        self.private_limit = int(settings.get('private_limit', 50))
+        self.max_chats = int(settings.get('max_chats', 500))
+        # {message_id: StoredMessage}
+        self.messages: Dict[int, StoredMessage] = {}
+        # {("group", 群号) 或 ("private", QQ号): 按时间排列的message_id}, 按最近活跃排序
+        self.chats: "OrderedDict[tuple, deque]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, data: Dict[str, Any]):
+        """保存一条消息事件"""
+        message_id = data.get('message_id')
+        if message_id is None:
+            return
+        message_id = int(message_id)
+        if message_id in self.messages:
+            return
+        gid = data.get('group_id')
+        uid = data.get('user_id')
+        sender = data.get('sender', {})
+        message = data.get('message')
+        content = render_message(message) if isinstance(message, list) else str(data.get('raw_message', message or ''))
+
+        chat = ("group", gid) if gid else ("private", uid)
+        limit = self.group_limit if gid else self.private_limit
+        ids = self.chats.get(chat)
+        if ids is None:
+            ids = self.chats[chat] = deque()
+            if len(self.chats) > self.max_chats:
+                _, stale = self.chats.popitem(last=False)
+                for stale_id in stale:
+                    self.messages.pop(stale_id, None)
+        else:
+            self.chats.move_to_end(chat)
+        if len(ids) >= limit:
+            self.messages.pop(ids.popleft(), None)
+        ids.append(message_id)
+        self.messages[message_id] = StoredMessage(
+            message_id, gid, uid,
+            sender.get('card') or sender.get('nickname', ''),
+            data.get('time', 0), content
+        )
+
+    def get(self, message_id: Any) -> Optional[StoredMessage]:
+        """按message_id查询消息, 不在存储中时返回None"""
+        try:
+            stored = self.messages.get(int(message_id))
+        except (TypeError, ValueError):
+            stored = None
+        if stored is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return stored
+
+    def get_stats(self) -> Dict[str, Any]:
+        """消息存储统计"""
+        return {
+            'messages': len(self.messages),
+            'chats': len(self.chats),
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,117 @@
+from collections import deque
+from typing import Dict, Any, List, Optional
+from utils.config import Config
+from utils.logger import Logger
+
+class ModelStats:
+    """单个模型的耗时和token统计"""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.first_token_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @staticmethod
+    def _percentile(values, ratio: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        succeeded = self.requests - self.failures
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'avg_latency_ms': round(sum(self.latencies) / len(self.latencies) * 1000, 1) if self.latencies else 0.0,
+            'p95_latency_ms': round(self._percentile(self.latencies, 0.95) * 1000, 1),
+            'avg_first_token_ms': round(
+                sum(self.first_token_latencies) / len(self.first_token_latencies) * 1000, 1
+            ) if self.first_token_latencies else 0.0,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'avg_prompt_tokens': round(self.prompt_tokens / succeeded) if succeeded else 0,
+            'avg_completion_tokens': round(self.completion_tokens / succeeded) if succeeded else 0
+        }
+
+class ModelRouter:
+    """按规则为每次请求选择模型, 并记录各模型的耗时和token用量"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        settings = self.config.chatgpt.get('routing', {})
+        self.enabled = settings.get('enabled', False)
+        self.rules: List[Dict[str, Any]] = settings.get('rules') or []
+        self.window = int(settings.get('window', 100))
+        self.stats: Dict[str, ModelStats] = {}
+        self.routed: Dict[str, int] = {}
+
+    @property
+    def default_model(self) -> str:
+        return self.config.chatgpt['model']
+
+    def choose(self, message: str, gid: Optional[int] = None, uid: Optional[int] = None,
+               context_tokens: int = 0) -> str:
+        """按顺序匹配规则, 第一条命中的规则决定模型, 都不命中时使用当前默认模型"""
+        model = self.default_model
+        if self.enabled:
+            for rule in self.rules:
+                if rule.get('model') and self._matches(rule, message, gid, uid, context_tokens):
+                    model = rule['model']
+                    break
+        self.routed[model] = self.routed.get(model, 0) + 1
+        return model
+
+    def _matches(self, rule: Dict[str, Any], message: str, gid: Optional[int], uid: Optional[int],
+                 context_tokens: int) -> bool:
+        """规则中的所有条件都满足时命中"""
+        length = len(message)
+        if 'min_chars' in rule and length < rule['min_chars']:
+            return False
+        if 'max_chars' in rule and length > rule['max_chars']:
+            return False
+        if 'min_context_tokens' in rule and context_tokens < rule['min_context_tokens']:
+            return False
+        if 'private' in rule and bool(rule['private']) != (not gid):
+            return False
+        if 'groups' in rule and str(gid) not in {str(group) for group in rule['groups']}:
+            return False
+        if 'users' in rule and str(uid) not in {str(user) for user in rule['users']}:
+            return False
+        if 'keywords' in rule and not any(keyword in message for keyword in rule['keywords']):
+            return False
+        return True
+
+    def _stats(self, model: str) -> ModelStats:
+        stats = self.stats.get(model)
+        if stats is None:
+            stats = self.stats[model] = ModelStats(self.window)
+        return stats
+
+    def record(self, model: str, latency: float, prompt_tokens: int, completion_tokens: int,
+               first_token_latency: Optional[float] = None):
+        """记录一次成功的模型调用"""
+        stats = self._stats(model)
+        stats.requests += 1
+        stats.latencies.append(latency)
+        if first_token_latency is not None:
+            stats.first_token_latencies.append(first_token_latency)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+
+    def record_failure(self, model: str):
+        """记录一次失败的模型调用"""
+        stats = self._stats(model)
+        stats.requests += 1
+        stats.failures += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各模型的路由次数、耗时和token统计"""
+        return {
+            model: dict(stats.to_dict(), routed=self.routed.get(model, 0))
+            for model, stats in self.stats.items()
+        }
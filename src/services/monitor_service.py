@@ -1,4 +1,3 @@
-import psutil
 import time
 from typing import Dict, Any
 from utils.config import Config
@@ -12,6 +11,8 @@ class MonitorService:
     def get_system_info(self) -> Dict[str, Any]:
         """获取系统信息"""
         try:
+            import psutil
+            
             cpu_percent = psutil.cpu_percent(interval=1)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
@@ -42,6 +43,8 @@ class MonitorService:
     def _get_network_info(self) -> Dict[str, float]:
         """获取网络信息"""
         try:
+            import psutil
+            
             net_io = psutil.net_io_counters()
             return {
                 'bytes_sent': net_io.bytes_sent,
@@ -1,4 +1,3 @@
-import requests
 from typing import Optional, Dict, Any
 from utils.config import Config
 from utils.logger import Logger
@@ -12,13 +11,15 @@ class MusicService:
     def search_song(self, keyword: str) -> Optional[Dict[str, Any]]:
         """搜索歌曲"""
         try:
+            import requests
+            
             params = {
                 's': keyword,
                 'offset': 0,
                 'limit': 1,
                 'type': 1,
             }
-            response = requests.get(self.api_url, params=params)
+            response = requests.get(self.api_url, params=params, timeout=10)
             response.raise_for_status()
             result = response.json()
             
@@ -1,30 +1,34 @@
 from typing import Optional, List
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
-import time
+import asyncio
 from services.qq_service import QQService
 from services.baidu_translate_service import TranslateService
+from services.outbound_dispatcher import PRIORITY_BROADCAST
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 
 class NewsService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
-        self.translate = TranslateService()
+        container = Container()
+        self.qq_service = container.get(QQService)
+        self.translate = container.get(TranslateService)
         
-    def get_cs2_news(self):
+    async def get_cs2_news(self):
         """获取CS2更新新闻"""
         try:
+            import requests
+            from bs4 import BeautifulSoup
+            
             # 参考原代码:
             # startLine: 50
             
             # endLine: 70
             
             url = "https://blog.counter-strike.net/index.php/category/updates/feed/"
-            response = requests.get(url)
+            response = await asyncio.to_thread(requests.get, url, timeout=10)
             soup = BeautifulSoup(response.text, "xml")
             item = soup.find("item")
             
@@ -37,16 +41,18 @@ class NewsService:
             date = item.pubDate.text
             
             # 翻译内容
-            title_cn = self.translate.translate(title)
-            desc_cn = self.translate.translate(description)
+            title_cn = await asyncio.to_thread(self.translate.translate, title)
+            desc_cn = await asyncio.to_thread(self.translate.translate, description)
             
             text = f"{title_cn}:\n{desc_cn}\n{link}"
             
             # 发送到配置的群
             groups = self.config.news["gid"]["cs2"].split(",")
-            for gid in groups:
-                self.qq_service.send_message(gid, text)
-                time.sleep(3)
+            # 由发送队列按群限速, 回复消息优先于推送
+            await asyncio.gather(*(
+                self.qq_service.send_message(gid.strip(), text, priority=PRIORITY_BROADCAST)
+                for gid in groups
+            ))
                 
             return text
             
@@ -54,15 +60,18 @@ class NewsService:
             self.logger.error(f"Error getting CS2 news: {e}")
             return None
             
-    def get_gpt_news(self):
+    async def get_gpt_news(self):
         """获取GPT更新新闻"""
         try:
+            import requests
+            from bs4 import BeautifulSoup
+            
             # 参考原代码:
             # startLine: 73
             # endLine: 96
             
             url = "https://help.openai.com/en/articles/6825453-chatgpt-release-notes"
-            response = requests.get(url)
+            response = await asyncio.to_thread(requests.get, url, timeout=10)
             soup = BeautifulSoup(response.text, "html.parser")
             
             # 获取最新更新内容
@@ -71,15 +80,17 @@ class NewsService:
                 return
                 
             content = latest_update.text.strip()
-            content_cn = self.translate.translate(content)
+            content_cn = await asyncio.to_thread(self.translate.translate, content)
             
             text = f"ChatGPT更新:\n{content_cn}\n{url}"
             
             # 发送到配置的群
             groups = self.config.news["gid"]["gpt"].split(",")
-            for gid in groups:
-                self.qq_service.send_message(gid, text)
-                time.sleep(3)
+            # 由发送队列按群限速, 回复消息优先于推送
+            await asyncio.gather(*(
+                self.qq_service.send_message(gid.strip(), text, priority=PRIORITY_BROADCAST)
+                for gid in groups
+            ))
                 
             return text
             
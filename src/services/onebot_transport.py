@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import json
+from typing import Dict, Any, Optional
+from utils.config import Config
+from utils.logger import Logger
+
+class HttpTransport:
+    """通过HTTP调用OneBot API, 使用保持连接的异步连接池"""
+
+    def __init__(self, base_url: str):
+        self.config = Config()
+        self.base_url = base_url
+        self.client = None
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    def _create_client(self):
+        """创建连接池"""
+        import httpx
+        
+        settings = self.config.qq_bot
+        limits = httpx.Limits(
+            max_connections=int(settings.get('http_max_connections', 100)),
+            max_keepalive_connections=int(settings.get('http_max_keepalive', 20)),
+            keepalive_expiry=float(settings.get('http_keepalive_expiry', 30))
+        )
+        timeout = httpx.Timeout(
+            float(settings.get('api_timeout', 30)),
+            connect=float(settings.get('connect_timeout', 5))
+        )
+        return httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=timeout)
+
+    async def call(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """调用API并返回原始响应"""
+        if self.client is None:
+            self.client = self._create_client()
+        response = await self.client.post(f"/{action}", json=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        """关闭连接池"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+class WebSocketTransport:
+    """反向WebSocket: 事件上报与API调用共用一条长连接, 通过echo匹配响应"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'pending'):
+            self.config = Config()
+            self.logger = Logger()
+            self.timeout = float(self.config.qq_bot.get('api_timeout', 30))
+            self.websocket = None
+            # 等待响应的请求: {echo: Future}
+            self.pending: Dict[str, asyncio.Future] = {}
+            self.echo_seq = itertools.count(1)
+
+    @property
+    def connected(self) -> bool:
+        return self.websocket is not None
+
+    def attach(self, websocket):
+        """绑定新连接"""
+        if self.websocket is not None:
+            self.logger.warning("OneBot WebSocket 重复连接, 使用新连接替换旧连接")
+        self.websocket = websocket
+
+    def detach(self, websocket):
+        """连接断开, 所有等待中的请求立即失败"""
+        if self.websocket is not websocket:
+            return
+        self.websocket = None
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("OneBot WebSocket 连接已断开"))
+        self.pending.clear()
+
+    async def call(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """发送API请求并等待对应echo的响应"""
+        if self.websocket is None:
+            raise ConnectionError("OneBot WebSocket 未连接")
+
+        echo = str(next(self.echo_seq))
+        future = asyncio.get_running_loop().create_future()
+        self.pending[echo] = future
+        try:
+            await self.websocket.send(json.dumps(
+                {"action": action, "params": params, "echo": echo},
+                ensure_ascii=False
+            ))
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(echo, None)
+
+    async def close(self):
+        """连接由OneBot端维护, 无需关闭"""
+        return None
+
+    def feed_response(self, payload: Dict[str, Any]) -> bool:
+        """处理API响应, 返回是否匹配到请求"""
+        future: Optional[asyncio.Future] = self.pending.get(str(payload.get('echo')))
+        if future is None or future.done():
+            return False
+        future.set_result(payload)
+        return True
@@ -0,0 +1,217 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from utils.config import Config
+from utils.logger import Logger
+from utils.rate_limit import TokenBucket
+
+# 发送优先级, 数值越小越先发送
+PRIORITY_REPLY = 0
+PRIORITY_NOTICE = 1
+PRIORITY_BROADCAST = 2
+
+# 只包含这些消息段的消息可以合并, 音乐卡片、合并转发、回复等需要单独发送
+MERGEABLE_SEGMENTS = {'text', 'at', 'face', 'image'}
+
+# 发送目标: ("group", 群号) 或 ("private", QQ号)
+Target = Tuple[str, str]
+
+class OutboundBatch:
+    """一条待发送的消息, 可能由同一目标的多条消息合并而成"""
+    __slots__ = ('target', 'priority', 'seq', 'segments', 'futures', 'ready_at', 'length')
+
+    def __init__(self, target: Target, priority: int, seq: int, segments: List[Dict[str, Any]], ready_at: float):
+        self.target = target
+        self.priority = priority
+        self.seq = seq
+        self.segments = segments
+        self.futures: List[asyncio.Future] = []
+        self.ready_at = ready_at
+        self.length = text_length(segments)
+
+    @property
+    def mergeable(self) -> bool:
+        return all(segment.get('type') in MERGEABLE_SEGMENTS for segment in self.segments)
+
+def text_length(segments: List[Dict[str, Any]]) -> int:
+    """消息中文字部分的长度"""
+    return sum(len(segment.get('data', {}).get('text', '')) for segment in segments if segment.get('type') == 'text')
+
+class OutboundDispatcher:
+    """消息发送队列: 按群/私聊和全局限速, 发往同一目标的积压消息合并发送, 回复优先于广播;
+    不同目标并发投递, 同一目标按顺序投递"""
+
+    def __init__(self, deliver: Callable[[Target, List[Dict[str, Any]]], Awaitable[bool]]):
+        self.config = Config()
+        self.logger = Logger()
+        self.deliver = deliver
+        settings = self.config.qq_bot.get('outbound', {})
+        self.coalesce_window = float(settings.get('coalesce_window', 0.2))
+        self.max_concurrency = int(settings.get('max_concurrency', 8))
+        self.max_length = int(self.config.qq_bot.get('max_length', 4500))
+        self.target_rate = float(settings.get('target_rate', 1))
+        self.target_burst = float(settings.get('target_burst', 5))
+        self.global_bucket = TokenBucket(
+            float(settings.get('global_rate', 5)),
+            float(settings.get('global_burst', 10))
+        )
+        self.target_buckets: Dict[Target, TokenBucket] = {}
+        # {目标: [待发送消息]}
+        self.pending: Dict[Target, List[OutboundBatch]] = {}
+        # 正在投递的目标, 同一目标同时只投递一条, 保证顺序
+        self.in_flight: Dict[Target, asyncio.Task] = {}
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+
+    def _bucket(self, target: Target) -> TokenBucket:
+        bucket = self.target_buckets.get(target)
+        if bucket is None:
+            # 清理已满(长时间未发送)的目标
+            if len(self.target_buckets) > 1000:
+                for stale in [t for t, b in self.target_buckets.items() if b.full and t not in self.pending]:
+                    del self.target_buckets[stale]
+            bucket = self.target_buckets[target] = TokenBucket(self.target_rate, self.target_burst)
+        return bucket
+
+    def submit(self, target: Target, segments: List[Dict[str, Any]], priority: int = PRIORITY_REPLY) -> asyncio.Future:
+        """加入发送队列, 返回发送结果(bool)的future"""
+        future = asyncio.get_running_loop().create_future()
+        batches = self.pending.setdefault(target, [])
+        now = time.monotonic()
+        # 目标空闲且没有积压时立即发送; 否则等待合并窗口, 收集随后的消息一起发送
+        idle = not batches and target not in self.in_flight
+        candidate = OutboundBatch(target, priority, next(self.seq), list(segments), now if idle else now + self.coalesce_window)
+
+        # 合并到同一目标、同一优先级且尚未投递的上一条消息
+        last = batches[-1] if batches else None
+        if (
+            last is not None
+            and last.priority == priority
+            and last.mergeable
+            and candidate.mergeable
+            and last.length + candidate.length < self.max_length
+        ):
+            self._merge(last, candidate.segments)
+            last.futures.append(future)
+            self.merged += 1
+        else:
+            candidate.futures.append(future)
+            batches.append(candidate)
+
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+        self.wakeup.set()
+        return future
+
+    def _merge(self, batch: OutboundBatch, segments: List[Dict[str, Any]]):
+        """追加消息段, 换行分隔, 已@过的用户不再重复@"""
+        mentioned = {segment['data'].get('qq') for segment in batch.segments if segment.get('type') == 'at'}
+        segments = [
+            segment for segment in segments
+            if not (segment.get('type') == 'at' and segment['data'].get('qq') in mentioned)
+        ]
+        if segments:
+            batch.segments.append({'type': 'text', 'data': {'text': '\n'}})
+            batch.segments.extend(segments)
+            batch.length = text_length(batch.segments)
+
+    def _next_ready(self) -> Tuple[Optional[OutboundBatch], Optional[float]]:
+        """选出现在可以发送的优先级最高的消息, 没有时返回需要等待的秒数"""
+        now = time.monotonic()
+        best = None
+        wait = None
+        if len(self.in_flight) >= self.max_concurrency:
+            return None, None
+        for target, batches in self.pending.items():
+            if target in self.in_flight:
+                continue
+            bucket = self._bucket(target)
+            bucket_wait = bucket.retry_after()
+            for batch in batches:
+                ready_in = max(batch.ready_at - now, bucket_wait)
+                if ready_in <= 0:
+                    if best is None or (batch.priority, batch.seq) < (best.priority, best.seq):
+                        best = batch
+                elif wait is None or ready_in < wait:
+                    wait = ready_in
+        if best is not None:
+            global_wait = self.global_bucket.retry_after()
+            if global_wait > 0:
+                return None, global_wait
+        return best, wait
+
+    async def _run(self):
+        """调度协程: 依次取出可发送的消息, 每个目标在独立的任务中投递"""
+        while True:
+            batch, wait = self._next_ready()
+            if batch is None:
+                # 等到有消息可发送、有投递完成或有新消息加入
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batches = self.pending[batch.target]
+            batches.remove(batch)
+            if not batches:
+                del self.pending[batch.target]
+            self._bucket(batch.target).try_acquire()
+            self.global_bucket.try_acquire()
+            self.in_flight[batch.target] = asyncio.create_task(self._deliver(batch))
+
+    async def _deliver(self, batch: OutboundBatch):
+        """投递一条消息并通知所有等待方"""
+        result = False
+        try:
+            result = await self.deliver(batch.target, batch.segments)
+        except Exception as e:
+            self.logger.error(f"发送消息异常: {e}")
+        finally:
+            self.in_flight.pop(batch.target, None)
+            self.wakeup.set()
+            if result:
+                self.sent += 1
+            else:
+                self.failed += 1
+            for future in batch.futures:
+                if not future.done():
+                    future.set_result(result)
+
+    async def stop(self, timeout: float = 10):
+        """等待队列中的消息发送完成, 超时后放弃剩余消息"""
+        deadline = time.monotonic() + timeout
+        while (self.pending or self.in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        tasks = list(self.in_flight.values())
+        if self.worker is not None:
+            tasks.append(self.worker)
+            self.worker = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.in_flight.clear()
+        for batches in self.pending.values():
+            for batch in batches:
+                for future in batch.futures:
+                    if not future.done():
+                        future.set_result(False)
+        self.pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """发送队列统计"""
+        return {
+            'pending': sum(len(batches) for batches in self.pending.values()),
+            'targets': len(self.pending),
+            'in_flight': len(self.in_flight),
+            'sent': self.sent,
+            'failed': self.failed,
+            'merged': self.merged
+        }
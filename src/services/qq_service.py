@@ -2,18 +2,50 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-import requests
-from typing import Optional, Dict, Any, List, Union
+import asyncio
+from typing import Optional, Dict, Any, List, Union, Tuple
 from utils.config import Config
 from utils.logger import Logger
+from services.onebot_transport import HttpTransport, WebSocketTransport
+from services.outbound_dispatcher import OutboundDispatcher, PRIORITY_REPLY, text_length
+from utils.text_utils import split_text
+from utils.cache import TTLCache, SingleFlight
+from utils.rate_limit import TokenBucket
+from services.sent_message_index import SentMessageIndex
 import json
 
+# 缓存未命中标记, 与缓存的查询失败结果(None)区分
+_MISSING = object()
+
 class QQService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
         self.base_url = self.config.qq_bot['cqhttp_url']
-        self.session = requests.Session()
+        if self.config.qq_bot.get('transport', 'http') == 'ws':
+            self.transport = WebSocketTransport()
+        else:
+            self.transport = HttpTransport(self.base_url)
+        self.outbound = OutboundDispatcher(self._deliver)
+        # 用户信息缓存, 查询失败的结果也短暂缓存, 避免反复请求
+        settings = self.config.qq_bot.get('user_cache', {})
+        self.user_ttl = float(settings.get('ttl', 3600))
+        self.user_negative_ttl = float(settings.get('negative_ttl', 60))
+        self.user_cache = TTLCache(max_entries=int(settings.get('max_entries', 2000)), ttl=self.user_ttl)
+        self.user_flight = SingleFlight()
+        # 已发送消息索引和批量撤回限速
+        self.sent_index = SentMessageIndex()
+        recall = self.config.qq_bot.get('recall', {})
+        self.recall_concurrency = int(recall.get('concurrency', 3))
+        self.recall_bucket = TokenBucket(float(recall.get('rate', 5)), float(recall.get('burst', 5)))
+    
+    async def call_api(self, action: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """通过当前传输方式调用OneBot API, 返回原始响应"""
+        try:
+            return await self.transport.call(action, params or {})
+        except Exception as e:
+            self.logger.error(f"调用API {action} 失败: {e}")
+            return None
     
     def at(self, qq: Union[int, str]) -> Dict[str, Any]:
         """生成at消息"""
@@ -61,71 +93,176 @@ class QQService:
             }
         }
 
-    def send_message(
+    def queue_message(
         self,
         gid: Optional[int] = None,
         message: Optional[Union[str, List[Dict[str, Any]]]] = None,
         uid: Optional[int] = None,
-        at: bool = True
-    ) -> bool:
-        try:
-            if message is None:
-                raise ValueError("Message cannot be None")
+        at: bool = True,
+        priority: int = PRIORITY_REPLY
+    ) -> asyncio.Future:
+        """加入发送队列, 返回发送结果(bool)的future; 目标正在发送时, 随后发往该目标的消息会合并发送"""
+        if message is None:
+            raise ValueError("Message cannot be None")
 
-            # 如果message是字符串,转换为text消息元素
-            if isinstance(message, str):
-                message = [self.text(message)]
-                
-            # 如果需要at且在群聊中
-            if gid is not None and at and uid:
-                message.insert(0, self.at(uid))
-                
-            # 详细的发送日志
-            target = f"群{gid}" if gid else f"用户{uid}"
-            self.logger.info(
-                f"\n发送消息到{target}:"
-                f"\n- 内容: {message}"
-            )
+        # 如果message是字符串,转换为text消息元素
+        if isinstance(message, str):
+            message = [self.text(message)]
+        else:
+            message = list(message)
             
-            if gid is not None:
-                url = f"{self.base_url}/send_group_msg"
-                data = {"group_id": gid, "message": message, "auto_escape": False}
-            else:
-                url = f"{self.base_url}/send_private_msg"
-                data = {"user_id": uid, "message": message, "auto_escape": False}
-                
-            response = self.session.post(url, json=data)
-            response.raise_for_status()
-            result = response.json()
+        # 如果需要at且在群聊中
+        if gid is not None and at and uid:
+            message.insert(0, self.at(uid))
             
-            if result['status'] == 'ok':
-                self.logger.info("消息发送成功")
-                return True
+        # 详细的发送日志
+        target_name = f"群{gid}" if gid else f"用户{uid}"
+        self.logger.info(
+            f"\n发送消息到{target_name}:"
+            f"\n- 内容: {message}"
+        )
+        target = ("group", str(gid)) if gid is not None else ("private", str(uid))
+        
+        # 超长消息按句子/代码块切分; 分段较多时合并为一条转发消息
+        max_length = int(self.config.qq_bot.get('max_length', 4500))
+        if text_length(message) <= max_length:
+            return self.outbound.submit(target, message, priority)
+        chunks = self._split_segments(message, max_length)
+        if len(chunks) > int(self.config.qq_bot.get('forward_threshold', 3)):
+            return self.outbound.submit(target, self._forward_nodes(chunks), priority)
+        futures = [self.outbound.submit(target, chunk, priority) for chunk in chunks]
+        return asyncio.ensure_future(self._all_sent(futures))
+
+    async def _all_sent(self, futures: List[asyncio.Future]) -> bool:
+        return all(await asyncio.gather(*futures))
+
+    def _split_segments(self, message: List[Dict[str, Any]], max_length: int) -> List[List[Dict[str, Any]]]:
+        """把消息段切分为多条消息, 每条的文字不超过max_length"""
+        segments = []
+        for segment in message:
+            if segment.get("type") == "text" and len(segment["data"]["text"]) > max_length:
+                segments.extend(self.text(piece) for piece in split_text(segment["data"]["text"], max_length))
             else:
-                self.logger.error(f"消息发送失败: {result.get('wording', 'Unknown error')}")
-                return False
+                segments.append(segment)
                 
+        chunks = [[]]
+        length = 0
+        for segment in segments:
+            segment_length = len(segment.get("data", {}).get("text", "")) if segment.get("type") == "text" else 0
+            if chunks[-1] and length + segment_length > max_length:
+                chunks.append([])
+                length = 0
+            chunks[-1].append(segment)
+            length += segment_length
+        return chunks
+
+    def _forward_nodes(self, chunks: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """以机器人身份把多段消息打包为合并转发节点, 转发消息中不能@, 去掉@消息段"""
+        return [
+            self.node(
+                self.config.qq_bot.get('bot_name', 'yumi'),
+                self.config.qq_bot['bot_uid'],
+                [segment for segment in chunk if segment.get("type") != "at"]
+            )
+            for chunk in chunks
+        ]
+
+    async def send_message(
+        self,
+        gid: Optional[int] = None,
+        message: Optional[Union[str, List[Dict[str, Any]]]] = None,
+        uid: Optional[int] = None,
+        at: bool = True,
+        priority: int = PRIORITY_REPLY
+    ) -> bool:
+        """发送消息并等待发送结果"""
+        try:
+            return await self.queue_message(gid, message, uid, at, priority)
         except Exception as e:
             self.logger.error(f"发送消息异常: {e}")
             return False
+
+    async def _deliver(self, target: Tuple[str, str], message: List[Dict[str, Any]]) -> bool:
+        """由发送队列调用, 实际调用OneBot发送消息"""
+        target_type, target_id = target
+        if message and all(segment.get("type") == "node" for segment in message):
+            # 合并转发消息
+            if target_type == "group":
+                action = "send_group_forward_msg"
+                data = {"group_id": int(target_id), "messages": message}
+            else:
+                action = "send_private_forward_msg"
+                data = {"user_id": int(target_id), "messages": message}
+        elif target_type == "group":
+            action = "send_group_msg"
+            data = {"group_id": int(target_id), "message": message, "auto_escape": False}
+        else:
+            action = "send_private_msg"
+            data = {"user_id": int(target_id), "message": message, "auto_escape": False}
             
-    def get_user_info(self, uid: int) -> Optional[Dict[str, Any]]:
-        """获取用户信息"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/get_stranger_info",
-                params={"user_id": uid, "no_cache": False}
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            if result['status'] == 'ok':
-                return result['data']
-            return None
+        result = await self.call_api(action, data)
+        if result is None:
+            return False
+        
+        if result['status'] == 'ok':
+            self.logger.info("消息发送成功")
+            message_id = (result.get('data') or {}).get('message_id')
+            if message_id is not None:
+                self.sent_index.record(target, message_id, message)
+            return True
+        else:
+            self.logger.error(f"消息发送失败: {result.get('wording', 'Unknown error')}")
+            return False
             
+    async def get_user_info(self, uid: int) -> Optional[Dict[str, Any]]:
+        """获取用户信息, 优先读取缓存, 同一用户的并发查询只请求一次"""
+        uid = int(uid)
+        cached = self.user_cache.get(uid, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        try:
+            return await self.user_flight.do(uid, lambda: self._fetch_user_info(uid))
         except Exception as e:
             self.logger.error(f"Error getting user info: {e}")
             return None
+
+    async def _fetch_user_info(self, uid: int) -> Optional[Dict[str, Any]]:
+        result = await self.call_api(
+            "get_stranger_info",
+            {"user_id": uid, "no_cache": False}
+        )
+        info = result['data'] if result and result['status'] == 'ok' else None
+        self.user_cache.set(uid, info, None if info else self.user_negative_ttl)
+        return info
+
+    async def get_nickname(self, uid: int) -> str:
+        """获取用户昵称, 查询失败时返回QQ号"""
+        info = await self.get_user_info(uid)
+        return (info or {}).get('nickname') or str(uid)
+
+    def remember_user(self, uid: int, sender: Dict[str, Any]):
+        """用消息事件中的发送者信息刷新缓存, 最近发言的用户无需再查询"""
+        if sender.get('nickname'):
+            uid = int(uid)
+            self.user_cache.set(uid, {
+                'user_id': uid,
+                'nickname': sender['nickname'],
+                'sex': sender.get('sex', 'unknown'),
+                'age': sender.get('age', 0)
+            })
+
+    def invalidate_user(self, uid: int):
+        """用户资料变动时清除缓存"""
+        self.user_cache.pop(int(uid))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """发送队列和用户信息缓存统计"""
+        return {
+            'outbound': self.outbound.get_stats(),
+            'sent_index': self.sent_index.get_stats(),
+            'user_cache': self.user_cache.get_stats(),
+            'user_coalesced': self.user_flight.shared
+        }
         
     def face(self, face_id: int) -> Dict[str, Any]:
         """生成QQ表情消息"""
@@ -189,29 +326,66 @@ class QQService:
             }
         }
 
-    def delete_msg(self, message_id: int) -> bool:
+    def node(self, name: str, uin: Union[int, str], content: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """生成合并转发的自定义节点"""
+        return {
+            "type": "node",
+            "data": {
+                "name": name,
+                "uin": str(uin),
+                "content": content
+            }
+        }
+
+    async def delete_msg(self, message_id: int) -> bool:
         """撤回消息"""
-        try:
-            url = f"{self.base_url}/delete_msg"
-            data = {"message_id": message_id}
-            response = self.session.post(url, json=data)
-            response.raise_for_status()
-            return response.json()["status"] == "ok"
-        except Exception as e:
-            self.logger.error(f"Error deleting message: {e}")
-            return False
+        result = await self.call_api("delete_msg", {"message_id": message_id})
+        return bool(result) and result["status"] == "ok"
 
-    def get_login_info(self) -> Optional[Dict[str, Any]]:
+    async def recall_sent(self, gid: Optional[int] = None, uid: Optional[int] = None,
+                          count: Optional[int] = None, pattern: Optional[str] = None) -> Tuple[int, int]:
+        """批量撤回机器人最近发出的count条消息或文字匹配pattern的消息, 返回(成功数, 失败数)"""
+        target = ("group", str(gid)) if gid is not None else ("private", str(uid))
+        entries = self.sent_index.recent(target, count, pattern)
+        if not entries:
+            return 0, 0
+        semaphore = asyncio.Semaphore(self.recall_concurrency)
+
+        async def recall(message_id: int) -> bool:
+            async with semaphore:
+                await self.recall_bucket.acquire()
+                return await self.delete_msg(message_id)
+
+        results = await asyncio.gather(*(recall(entry.message_id) for entry in entries))
+        recalled = [entry.message_id for entry, ok in zip(entries, results) if ok]
+        self.sent_index.discard(target, recalled)
+        self.logger.info(f"批量撤回{target[0]} {target[1]} 的消息: 成功 {len(recalled)} 条, 失败 {len(entries) - len(recalled)} 条")
+        return len(recalled), len(entries) - len(recalled)
+
+    async def get_login_info(self) -> Optional[Dict[str, Any]]:
         """获取登录号信息"""
-        try:
-            response = self.session.get(f"{self.base_url}/get_login_info")
-            response.raise_for_status()
-            result = response.json()
-            
-            if result['status'] == 'ok':
-                return result['data']
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"获取登录信息失败: {e}")
-            return None
\ No newline at end of file
+        result = await self.call_api("get_login_info")
+        if result and result['status'] == 'ok':
+            return result['data']
+        return None
+
+    async def get_group_member_list(self, gid: int) -> Optional[List[Dict[str, Any]]]:
+        """获取群成员列表"""
+        result = await self.call_api("get_group_member_list", {"group_id": int(gid)})
+        if result and result['status'] == 'ok':
+            return result['data']
+        return None
+
+    async def set_group_kick(self, gid: int, uid: int, reason: str = "", reject_add_request: bool = False) -> bool:
+        """群组踢人"""
+        self.logger.info(f"将用户{uid}移出群{gid}: {reason}")
+        result = await self.call_api(
+            "set_group_kick",
+            {"group_id": gid, "user_id": uid, "reject_add_request": reject_add_request}
+        )
+        return bool(result) and result["status"] == "ok"
+
+    async def stop(self):
+        """发送完队列中的消息后关闭连接池"""
+        await self.outbound.stop()
+        await self.transport.close()
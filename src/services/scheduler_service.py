@@ -1,10 +1,12 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+import asyncio
 from services.news_service import NewsService
 from services.monitor_service import MonitorService
 from services.verification_service import VerificationService
+from services.qq_service import QQService
+from services.member_index_service import MemberIndexService
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 import atexit
 
 class SchedulerService:
@@ -19,16 +21,14 @@ class SchedulerService:
         if not hasattr(self, 'initialized'):
             self.config = Config()
             self.logger = Logger()
-            self.news_service = NewsService()
-            self.monitor_service = MonitorService()
-            self.verification_service = VerificationService()
-            self.scheduler = BackgroundScheduler(
-                timezone='Asia/Shanghai',  # 设置时区
-                job_defaults={
-                    'coalesce': True,  # 错过的任务只运行一次
-                    'max_instances': 1  # 同一个任务同时只能有一个实例
-                }
-            )
+            container = Container()
+            self.news_service = container.get(NewsService)
+            self.monitor_service = container.get(MonitorService)
+            self.verification_service = container.get(VerificationService)
+            self.qq_service = container.get(QQService)
+            self.member_index = container.get(MemberIndexService)
+            # 在start中创建, 避免启动时导入apscheduler
+            self.scheduler = None
             self.initialized = True
             
             # 注册退出时的清理函数
@@ -37,10 +37,22 @@ class SchedulerService:
     def start(self):
         """启动所有定时任务"""
         try:
-            if self.scheduler.running:
+            if self.scheduler is not None and self.scheduler.running:
                 self.logger.warning("Scheduler is already running")
                 return
                 
+            from apscheduler.schedulers.asyncio import AsyncIOScheduler
+            from apscheduler.triggers.cron import CronTrigger
+            
+            # 任务在事件循环中执行, 需在事件循环启动后调用start
+            self.scheduler = AsyncIOScheduler(
+                timezone='Asia/Shanghai',  # 设置时区
+                job_defaults={
+                    'coalesce': True,  # 错过的任务只运行一次
+                    'max_instances': 1  # 同一个任务同时只能有一个实例
+                }
+            )
+                
             # 每小时检查新闻
             self.scheduler.add_job(
                 self.news_service.get_cs2_news,
@@ -71,6 +83,15 @@ class SchedulerService:
                 seconds=60
             )
             
+            # 定时校准群成员索引
+            self.scheduler.add_job(
+                self.member_index.reconcile,
+                'interval',
+                seconds=self.member_index.reconcile_interval,
+                id='member_reconcile',
+                replace_existing=True
+            )
+            
             self.scheduler.start()
             self.logger.info("Scheduler started successfully")
             
@@ -81,16 +102,17 @@ class SchedulerService:
     def stop(self):
         """停止所有定时任务"""
         try:
-            if self.scheduler.running:
+            if self.scheduler is not None and self.scheduler.running:
                 self.scheduler.shutdown()
                 self.logger.info("Scheduler stopped successfully")
         except Exception as e:
             self.logger.error(f"Error stopping scheduler: {e}")
             
-    def _monitor_system(self):
+    async def _monitor_system(self):
         """系统监控包装函数"""
         try:
-            info = self.monitor_service.get_system_info()
+            # cpu_percent会阻塞1秒, 放到线程中执行
+            info = await asyncio.to_thread(self.monitor_service.get_system_info)
             if info:
                 # 可以添加阈值检查
                 if info['cpu']['percent'] > 80:
@@ -100,12 +122,12 @@ class SchedulerService:
         except Exception as e:
             self.logger.error(f"Error in system monitoring: {e}")
             
-    def _check_verification_timeout(self):
+    async def _check_verification_timeout(self):
         """检查验证超时"""
         timeout_users = self.verification_service.check_timeout()
         for group_id, user_id in timeout_users:
-            self.qq_service.set_group_kick(group_id, user_id, "验证超时")
+            await self.qq_service.set_group_kick(group_id, user_id, "验证超时")
             message = [
                 self.qq_service.text(f"用户 {user_id} 验证超时,已被移出群聊")
             ]
-            self.qq_service.send_message(group_id, message)
\ No newline at end of file
+            await self.qq_service.send_message(group_id, message)
\ No newline at end of file
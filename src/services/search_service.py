@@ -0,0 +1,222 @@
+import asyncio
+import ipaddress
+import re
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from typing import Dict, Any, List, Optional
+from utils.config import Config
+from utils.logger import Logger
+from utils.container import Container
+from utils.cache import TTLCache, SingleFlight
+from utils.token_counter import TokenCounter
+
+# 抓取网页时最多跟随的重定向次数
+MAX_REDIRECTS = 5
+
+# 抓取网页时去掉的非正文标签
+NOISE_TAGS = ['script', 'style', 'nav', 'header', 'footer', 'aside', 'noscript', 'form', 'iframe', 'svg']
+
+def normalize_query(query: str) -> str:
+    """规范化搜索词作为缓存key: 忽略大小写、多余空白和首尾标点"""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return query.strip(' ?？!！。.,，')
+
+def is_public_address(address: str) -> bool:
+    """是否为公网地址: 拒绝回环、内网、链路本地、组播和保留地址"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (
+        ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_multicast
+        or ip.is_reserved or ip.is_unspecified
+    )
+
+def extract_text(html: str) -> str:
+    """用BeautifulSoup提取网页正文文本"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    root = soup.find('article') or soup.find('main') or soup.body or soup
+    lines = (line.strip() for line in root.get_text('\n').splitlines())
+    return "\n".join(line for line in lines if line)
+
+class SearchService:
+    """网页搜索(Serper, 未配置时使用Google自定义搜索)和网页正文抓取, 结果按TTL缓存"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        self.token_counter = Container().get(TokenCounter)
+        settings = self.config.google.get('search', {})
+        self.results = int(settings.get('results', 5))
+        self.fetch_pages = int(settings.get('fetch_pages', 3))
+        self.fetch_concurrency = int(settings.get('fetch_concurrency', 5))
+        self.fetch_timeout = float(settings.get('fetch_timeout', 8))
+        self.page_tokens = int(settings.get('page_tokens', 800))
+        self.max_page_bytes = int(settings.get('max_page_bytes', 2 * 1024 * 1024))
+        cache_ttl = float(settings.get('cache_ttl', 600))
+        cache_size = int(settings.get('cache_size', 200))
+
+        self.client = None
+        # 并发抓取的网页数上限
+        self.fetch_semaphore = asyncio.Semaphore(self.fetch_concurrency)
+        self.search_cache = TTLCache(max_entries=cache_size, ttl=cache_ttl)
+        self.page_cache = TTLCache(max_entries=cache_size * self.fetch_pages, ttl=cache_ttl)
+        self.search_flight = SingleFlight()
+        self.page_flight = SingleFlight()
+
+    def _get_client(self):
+        """首次使用时创建HTTP客户端"""
+        if self.client is None:
+            import httpx
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.fetch_timeout, connect=5),
+                limits=httpx.Limits(max_connections=self.fetch_concurrency * 2),
+                # 重定向由_fetch_page逐跳检查后再跟随
+                follow_redirects=False,
+                headers={'User-Agent': 'Mozilla/5.0 (compatible; YuMiBot/1.0)'}
+            )
+        return self.client
+
+    async def search(self, query: str, num: Optional[int] = None) -> List[Dict[str, str]]:
+        """搜索网页, 返回标题、链接和摘要; 相同搜索词在有效期内只搜索一次"""
+        num = num or self.results
+        key = (normalize_query(query), num)
+        cached = self.search_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            results = await self.search_flight.do(key, lambda: self._search(query, num))
+            self.search_cache.set(key, results)
+            return results
+        except Exception as e:
+            self.logger.error(f"搜索失败: {e}")
+            return []
+
+    async def _search(self, query: str, num: int) -> List[Dict[str, str]]:
+        if self.config.google.get('serper_api_key'):
+            return await self._search_serper(query, num)
+        return await self._search_google(query, num)
+
+    async def _search_serper(self, query: str, num: int) -> List[Dict[str, str]]:
+        response = await self._get_client().post(
+            'https://google.serper.dev/search',
+            headers={'X-API-KEY': self.config.google['serper_api_key']},
+            json={'q': query, 'num': num, 'hl': 'zh-cn'}
+        )
+        response.raise_for_status()
+        return [
+            {'title': item.get('title', ''), 'link': item.get('link', ''), 'snippet': item.get('snippet', '')}
+            for item in response.json().get('organic', [])[:num]
+        ]
+
+    async def _search_google(self, query: str, num: int) -> List[Dict[str, str]]:
+        response = await self._get_client().get(
+            'https://www.googleapis.com/customsearch/v1',
+            params={
+                'key': self.config.google['api_key'],
+                'cx': self.config.google['cx_id'],
+                'q': query,
+                'num': min(num, 10)
+            }
+        )
+        response.raise_for_status()
+        return [
+            {'title': item.get('title', ''), 'link': item.get('link', ''), 'snippet': item.get('snippet', '')}
+            for item in response.json().get('items', [])[:num]
+        ]
+
+    async def search_with_pages(self, query: str) -> List[Dict[str, str]]:
+        """搜索并并发抓取前几个结果的正文"""
+        results = await self.search(query)
+        pages = await asyncio.gather(
+            *(self.fetch_page(result['link']) for result in results[:self.fetch_pages])
+        )
+        combined = []
+        for index, result in enumerate(results):
+            item = dict(result)
+            if index < len(pages) and pages[index]:
+                item['content'] = pages[index]
+            combined.append(item)
+        return combined
+
+    async def fetch_page(self, url: str) -> Optional[str]:
+        """抓取网页并提取正文, 截断到page_tokens以内; 结果按TTL缓存"""
+        if not url:
+            return None
+        cached = self.page_cache.get(url)
+        if cached is not None:
+            return cached or None
+        try:
+            text = await self.page_flight.do(url, lambda: self._fetch_page(url))
+        except Exception as e:
+            self.logger.error(f"抓取网页失败 {url}: {e}")
+            text = ""
+        # 抓取失败也缓存一段时间, 避免反复请求同一个失败的网页
+        self.page_cache.set(url, text)
+        return text or None
+
+    async def _resolve(self, url: str) -> str:
+        """只允许抓取http/https的公网地址, 防止模型或用户让机器人访问本机和内网服务; 返回校验过的IP"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"不支持的网址: {url}")
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
+        if not infos or not all(is_public_address(info[4][0]) for info in infos):
+            raise ValueError(f"禁止访问内网地址: {parts.hostname}")
+        return infos[0][4][0]
+
+    def _pinned_request(self, url: str, address: str) -> Dict[str, Any]:
+        """直接连接校验过的IP, 防止连接时重新解析域名得到内网地址(DNS重绑定);
+        Host头和TLS的SNI/证书校验仍使用原域名"""
+        parts = urlsplit(url)
+        host = f"[{address}]" if ':' in address else address
+        netloc = f"{host}:{parts.port}" if parts.port else host
+        request = {
+            'url': urlunsplit((parts.scheme, netloc, parts.path or '/', parts.query, '')),
+            'headers': {'Host': parts.netloc.rsplit('@', 1)[-1]}
+        }
+        if parts.scheme == 'https':
+            request['extensions'] = {'sni_hostname': parts.hostname}
+        return request
+
+    async def _fetch_page(self, url: str) -> str:
+        async with self.fetch_semaphore:
+            client = self._get_client()
+            for _ in range(MAX_REDIRECTS + 1):
+                address = await self._resolve(url)
+                async with client.stream('GET', **self._pinned_request(url, address)) as response:
+                    if response.is_redirect:
+                        url = urljoin(url, response.headers.get('location', ''))
+                        continue
+                    response.raise_for_status()
+                    if 'html' not in response.headers.get('content-type', 'text/html'):
+                        return ""
+                    # 流式读取, 超过max_page_bytes的部分丢弃
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk[:self.max_page_bytes - len(body)])
+                        if len(body) >= self.max_page_bytes:
+                            break
+                    html = bytes(body).decode(response.encoding or 'utf-8', errors='replace')
+                    break
+            else:
+                raise ValueError(f"重定向次数过多: {url}")
+        # 解析HTML较耗CPU, 放到线程中执行
+        text = await asyncio.to_thread(extract_text, html)
+        return self.token_counter.truncate(text, self.page_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """搜索和网页缓存统计"""
+        return {
+            'search_cache': self.search_cache.get_stats(),
+            'page_cache': self.page_cache.get_stats(),
+            'coalesced': self.search_flight.shared + self.page_flight.shared
+        }
+
+    async def stop(self):
+        """关闭HTTP客户端"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
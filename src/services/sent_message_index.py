@@ -0,0 +1,91 @@
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+from utils.config import Config
+
+# 发送目标: ("group", 群号) 或 ("private", QQ号)
+Target = Tuple[str, str]
+
+def message_text(message: List[Dict[str, Any]]) -> str:
+    """消息中的文字内容, 合并转发消息取各节点的文字"""
+    parts = []
+    for segment in message:
+        data = segment.get('data', {})
+        if segment.get('type') == 'text':
+            parts.append(data.get('text', ''))
+        elif segment.get('type') == 'node':
+            parts.append(message_text(data.get('content', [])))
+    return "".join(parts)
+
+class SentMessage:
+    """机器人发出的一条消息"""
+    __slots__ = ('message_id', 'time', 'preview')
+
+    def __init__(self, message_id: int, time: float, preview: str):
+        self.message_id = message_id
+        self.time = time
+        # 消息开头最多preview_chars个字, 撤回匹配只在这部分文字中查找
+        self.preview = preview
+
+class SentMessageIndex:
+    """机器人已发送消息的索引: 按群/私聊保留最近的消息ID, 用于批量撤回"""
+
+    def __init__(self):
+        self.config = Config()
+        settings = self.config.qq_bot.get('sent_index', {})
+        self.target_limit = int(settings.get('target_limit', 200))
+        self.max_targets = int(settings.get('max_targets', 500))
+        self.preview_chars = int(settings.get('preview_chars', 200))
+        # {目标: 按发送时间排列的消息}, 按最近发送排序
+        self.targets: "OrderedDict[Target, deque]" = OrderedDict()
+        self.recorded = 0
+
+    def record(self, target: Target, message_id: Any, message: List[Dict[str, Any]]):
+        """记录一条发送成功的消息"""
+        text = message_text(message)
+        entries = self.targets.get(target)
+        if entries is None:
+            entries = self.targets[target] = deque(maxlen=self.target_limit)
+            if len(self.targets) > self.max_targets:
+                self.targets.popitem(last=False)
+        else:
+            self.targets.move_to_end(target)
+        # 只保留开头的文字, 控制长消息占用的内存
+        entries.append(SentMessage(int(message_id), time.time(), text[:self.preview_chars]))
+        self.recorded += 1
+
+    def recent(self, target: Target, count: Optional[int] = None,
+               pattern: Optional[str] = None) -> List[SentMessage]:
+        """从新到旧返回最近的count条消息, 或开头文字匹配pattern(正则)的所有消息;
+        只匹配每条消息的前preview_chars个字, 只出现在消息后面的文字匹配不到"""
+        entries = self.targets.get(target)
+        if not entries:
+            return []
+        matcher = re.compile(pattern) if pattern else None
+        selected = []
+        for entry in reversed(entries):
+            if matcher is not None and not matcher.search(entry.preview):
+                continue
+            selected.append(entry)
+            if count is not None and len(selected) >= count:
+                break
+        return selected
+
+    def discard(self, target: Target, message_ids: List[int]):
+        """移除已撤回的消息"""
+        entries = self.targets.get(target)
+        if not entries:
+            return
+        removed = set(message_ids)
+        kept = [entry for entry in entries if entry.message_id not in removed]
+        entries.clear()
+        entries.extend(kept)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """已发送消息索引统计"""
+        return {
+            'targets': len(self.targets),
+            'messages': sum(len(entries) for entries in self.targets.values()),
+            'recorded': self.recorded
+        }
@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Optional
+from utils.config import Config
+from utils.logger import Logger
+
+class SessionActor:
+    """单个会话的待处理任务队列和执行协程"""
+    __slots__ = ('jobs', 'task', 'current', 'latest')
+
+    def __init__(self):
+        # (序号, 任务, 完成future)
+        self.jobs = deque()
+        self.task: Optional[asyncio.Task] = None
+        # 正在执行的任务序号, 最近一条会取代旧请求的任务序号
+        self.current = 0
+        self.latest = 0
+
+class SessionDispatcher:
+    """按会话串行执行任务: 同一会话的消息严格按顺序处理, 不同会话之间完全并行"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        settings = self.config.ingress
+        self.queue_size = int(settings.get('session_queue_size', 10))
+        # 同时存在的会话数上限, 也是同时处理的消息数上限
+        self.max_sessions = int(settings.get('max_sessions', 64))
+        # {session_id: SessionActor}, 队列处理完后立即移除, 空闲会话不占用协程和内存
+        self.actors: Dict[str, SessionActor] = {}
+        self.seq = itertools.count(1)
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def busy(self, session_id: str) -> bool:
+        """会话是否有正在处理或排队的任务"""
+        return session_id in self.actors
+
+    def superseded(self, session_id: str) -> bool:
+        """在任务中调用: 当前任务之后是否已有同一会话的新消息(会取代旧请求)在排队"""
+        actor = self.actors.get(session_id)
+        return actor is not None and actor.latest > actor.current
+
+    def submit(self, session_id: str, job: Callable[[], Awaitable[Any]],
+               supersedes: bool = False) -> Optional[asyncio.Future]:
+        """把任务加入会话队列, 返回任务完成时结束的future; 队列或会话数已满时丢弃并返回None
+        supersedes为True时, 该会话中排在前面的任务可通过superseded得知已被取代"""
+        actor = self.actors.get(session_id)
+        if actor is None:
+            if len(self.actors) >= self.max_sessions:
+                self.dropped += 1
+                self.logger.warning(f"同时处理的会话过多, 已丢弃会话 {session_id} 的消息")
+                return None
+            actor = self.actors[session_id] = SessionActor()
+        if len(actor.jobs) >= self.queue_size:
+            self.dropped += 1
+            self.logger.warning(f"会话 {session_id} 待处理消息过多, 已丢弃新消息")
+            return None
+        seq = next(self.seq)
+        if supersedes:
+            actor.latest = seq
+        future = asyncio.get_running_loop().create_future()
+        actor.jobs.append((seq, job, future))
+        if actor.task is None:
+            actor.task = asyncio.create_task(self._run(session_id, actor))
+        return future
+
+    async def _run(self, session_id: str, actor: SessionActor):
+        """依次执行会话队列中的任务, 队列清空后退出并移除会话"""
+        try:
+            while actor.jobs:
+                actor.current, job, future = actor.jobs.popleft()
+                try:
+                    await job()
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    self.logger.error(f"处理会话 {session_id} 的消息失败: {e}")
+                finally:
+                    if not future.done():
+                        future.set_result(None)
+        finally:
+            actor.task = None
+            # 被取消时未执行的任务也要结束, 避免等待方一直等待
+            while actor.jobs:
+                _, _, future = actor.jobs.popleft()
+                if not future.done():
+                    future.set_result(None)
+            if self.actors.get(session_id) is actor:
+                del self.actors[session_id]
+
+    async def stop(self, timeout: float = 10):
+        """等待进行中的会话处理完成, 超时后取消"""
+        tasks = [actor.task for actor in self.actors.values() if actor.task is not None]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """会话调度统计"""
+        return {
+            'active_sessions': len(self.actors),
+            'max_sessions': self.max_sessions,
+            'pending': sum(len(actor.jobs) for actor in self.actors.values()),
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
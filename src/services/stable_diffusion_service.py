@@ -1,8 +1,8 @@
-import replicate
 from typing import Optional, List
 from utils.config import Config
 from utils.logger import Logger
 import os
+import threading
 
 class StableDiffusionService:
     def __init__(self):
@@ -13,39 +13,55 @@ class StableDiffusionService:
         os.environ["PYTHONIOENCODING"] = "utf-8"
         os.environ["REPLICATE_API_TOKEN"] = self.config.replicate.get("api_token")
         
-        try:
-            # 创建客户端时设置headers
-            import httpx
-            headers = {
-                "Authorization": f"Token {self.config.replicate.get('api_token')}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-            
-            # 使用自定义的transport
-            transport = httpx.HTTPTransport(retries=3)
-            self.client = replicate.Client(
-                transport=transport,
-                headers=headers
-            )
-            
-            # 初始化模型
+        self.client = None
+        self.model = None
+        self._lock = threading.Lock()
+        
+    def _ensure_model(self):
+        """首次使用时创建客户端并获取模型"""
+        with self._lock:
+            if self.model is not None:
+                return self.model
+                
             try:
+                # 创建客户端时设置headers
+                import httpx
+                import replicate
+                headers = {
+                    "Authorization": f"Token {self.config.replicate.get('api_token')}",
+                    "Content-Type": "application/json",
+                    "Accept": "application/json"
+                }
+                
+                # 使用自定义的transport
+                transport = httpx.HTTPTransport(retries=3)
+                self.client = replicate.Client(
+                    transport=transport,
+                    headers=headers
+                )
+                
+                # 初始化模型
                 self.model = self.client.models.get("stability-ai/stable-diffusion")
                 self.logger.info("StableDiffusion model initialized successfully")
+                    
             except Exception as e:
                 self.logger.error(f"Failed to initialize StableDiffusion model: {e}")
+                self.client = None
                 self.model = None
                 
-        except Exception as e:
-            self.logger.error(f"Failed to initialize StableDiffusion service: {e}")
-            self.client = None
-            self.model = None
+            return self.model
+            
+    def warm_up(self):
+        """后台预热: 提前获取模型"""
+        self._ensure_model()
         
     def generate_image(self, prompt: str, negative_prompt: str = "", num_outputs: int = 1) -> Optional[List[str]]:
         """生成图像"""
         try:
-            output = self.model.predict(
+            model = self._ensure_model()
+            if model is None:
+                return None
+            output = model.predict(
                 prompt=prompt,
                 negative_prompt=negative_prompt,
                 num_outputs=num_outputs,
@@ -0,0 +1,163 @@
+import asyncio
+import json
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from utils.config import Config
+from utils.logger import Logger
+from utils.container import lazy_service
+from services.search_service import SearchService
+from services.baidu_translate_service import TranslateService
+from services.music_service import MusicService
+from services.electricity_service import ElectricityService
+
+class Tool:
+    """可供模型调用的工具"""
+    __slots__ = ('name', 'description', 'parameters', 'handler', 'timeout', 'max_chars')
+
+    def __init__(self, name: str, description: str, parameters: Dict[str, Any],
+                 handler: Callable[..., Awaitable[Any]], timeout: float, max_chars: int):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.handler = handler
+        self.timeout = timeout
+        self.max_chars = max_chars
+
+    def schema(self) -> Dict[str, Any]:
+        """OpenAI tools 参数格式"""
+        return {
+            'type': 'function',
+            'function': {
+                'name': self.name,
+                'description': self.description,
+                'parameters': self.parameters
+            }
+        }
+
+def _object_schema(properties: Dict[str, Any], required: List[str]) -> Dict[str, Any]:
+    return {'type': 'object', 'properties': properties, 'required': required}
+
+class ToolService:
+    """工具注册和执行: 同一轮的多个工具调用并发执行, 每个工具有独立的超时和结果长度上限"""
+    search_service = lazy_service(SearchService)
+    translate_service = lazy_service(TranslateService)
+    music_service = lazy_service(MusicService)
+    electricity_service = lazy_service(ElectricityService)
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        settings = self.config.chatgpt.get('tools', {})
+        self.timeout = float(settings.get('timeout', 15))
+        self.max_result_chars = int(settings.get('max_result_chars', 4000))
+        self.max_rounds = int(settings.get('max_rounds', 3))
+        # 搜索结果包含多个网页正文(已按token截断), 长度上限单独设置
+        self.search_max_chars = int(settings.get('search_max_chars', 12000))
+        self.tools: Dict[str, Tool] = {}
+        self._register_builtin_tools()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.chatgpt.get('functions_enabled', False) and self.tools)
+
+    def register(self, name: str, description: str, parameters: Dict[str, Any],
+                 handler: Callable[..., Awaitable[Any]], timeout: Optional[float] = None,
+                 max_chars: Optional[int] = None):
+        """注册工具, handler为接收模型参数的协程函数"""
+        self.tools[name] = Tool(
+            name, description, parameters, handler,
+            timeout or self.timeout, max_chars or self.max_result_chars
+        )
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        return [tool.schema() for tool in self.tools.values()]
+
+    async def execute(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """并发执行模型请求的工具调用, 返回按原顺序排列的tool消息"""
+        results = await asyncio.gather(*(self._run(call) for call in tool_calls))
+        return [
+            {'role': 'tool', 'tool_call_id': call['id'], 'content': result}
+            for call, result in zip(tool_calls, results)
+        ]
+
+    async def _run(self, call: Dict[str, Any]) -> str:
+        """执行单个工具调用, 失败和超时都以文本形式交给模型"""
+        name = call['function']['name']
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"未知工具: {name}"
+        try:
+            arguments = json.loads(call['function'].get('arguments') or '{}')
+            result = await asyncio.wait_for(tool.handler(**arguments), tool.timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"工具 {name} 执行超时({tool.timeout:.0f}秒)")
+            return f"工具执行超时({tool.timeout:.0f}秒)"
+        except Exception as e:
+            self.logger.error(f"工具 {name} 执行失败: {e}")
+            return f"工具执行失败: {e}"
+
+        if not isinstance(result, str):
+            result = json.dumps(result, ensure_ascii=False)
+        if len(result) > tool.max_chars:
+            result = result[:tool.max_chars] + "\n...(内容过长已截断)"
+        self.logger.info(f"工具 {name} 执行完成, 结果 {len(result)} 字")
+        return result
+
+    def _register_builtin_tools(self):
+        """注册内置工具"""
+        self.register(
+            'web_search',
+            '搜索互联网, 获取最新信息、新闻或不确定的事实, 返回前几个结果的网页正文',
+            _object_schema({'query': {'type': 'string', 'description': '搜索关键词'}}, ['query']),
+            self._web_search,
+            max_chars=self.search_max_chars
+        )
+        self.register(
+            'fetch_page',
+            '抓取网页并返回正文文本',
+            _object_schema({'url': {'type': 'string', 'description': '网页地址'}}, ['url']),
+            self._fetch_page
+        )
+        self.register(
+            'translate',
+            '翻译文本',
+            _object_schema({
+                'text': {'type': 'string', 'description': '要翻译的文本'},
+                'to_lang': {'type': 'string', 'description': '目标语言代码, 如 zh、en、jp', 'default': 'zh'},
+                'from_lang': {'type': 'string', 'description': '源语言代码, 默认自动检测', 'default': 'auto'}
+            }, ['text']),
+            self._translate
+        )
+        self.register(
+            'search_music',
+            '在网易云音乐搜索歌曲, 返回歌名、歌手、专辑和播放链接',
+            _object_schema({'keyword': {'type': 'string', 'description': '歌名或歌手'}}, ['keyword']),
+            self._search_music
+        )
+        self.register(
+            'query_electricity',
+            '查询宿舍电费余额和今日用电量',
+            _object_schema({'room_id': {'type': 'string', 'description': '房间号'}}, ['room_id']),
+            self._query_electricity
+        )
+
+    async def _web_search(self, query: str) -> Any:
+        results = await self.search_service.search_with_pages(query)
+        return results or "没有找到相关结果"
+
+    async def _fetch_page(self, url: str) -> str:
+        return await self.search_service.fetch_page(url) or "网页抓取失败"
+
+    async def _translate(self, text: str, to_lang: str = 'zh', from_lang: str = 'auto') -> str:
+        result = await asyncio.to_thread(self.translate_service.translate, text, from_lang, to_lang)
+        return result or "翻译失败"
+
+    async def _search_music(self, keyword: str) -> Any:
+        song = await asyncio.to_thread(self.music_service.search_song, keyword)
+        if not song:
+            return "没有找到这首歌"
+        song['url'] = self.music_service.get_song_url(song['music_id'])
+        return song
+
+    async def _query_electricity(self, room_id: str) -> Any:
+        result = await asyncio.to_thread(self.electricity_service.query_electricity, room_id)
+        return result or "电费查询失败"
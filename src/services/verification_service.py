@@ -3,13 +3,15 @@ import random
 import time
 from utils.config import Config
 from utils.logger import Logger
+from utils.container import Container
 from services.qq_service import QQService
 
 class VerificationService:
     def __init__(self):
         self.config = Config()
         self.logger = Logger()
-        self.qq_service = QQService()
+        container = Container()
+        self.qq_service = container.get(QQService)
         # 存储群验证状态: {group_id: bool}
         self.verification_status = {}
         # 存储待验证用户: {group_id: {user_id: (answer, timestamp)}}
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Hashable, Callable, Awaitable, Tuple
+
+class TTLCache:
+    """带过期时间的LRU缓存, 统计命中率"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # {key: (过期时间, 值)}, 按最近使用排序
+        self.entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取未过期的缓存"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存, 超出容量时淘汰最久未使用的条目"""
+        self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        """删除缓存"""
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+class SingleFlight:
+    """合并相同key的并发调用: 同一时间只执行一次, 其余调用方等待并共享结果"""
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    def join(self, key: Hashable) -> Tuple[asyncio.Future, bool]:
+        """加入进行中的调用, 没有时发起新调用; 返回(future, 是否由调用方负责执行并resolve)"""
+        future = self.calls.get(key)
+        if future is not None:
+            self.shared += 1
+            return future, False
+        future = asyncio.get_running_loop().create_future()
+        # 没有其他调用方时也要取走异常, 避免未处理异常的警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.calls[key] = future
+        return future, True
+
+    def resolve(self, key: Hashable, result: Any = None, error: Optional[BaseException] = None):
+        """结束调用并把结果或异常交给等待者"""
+        future = self.calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None and not isinstance(error, Exception):
+            # 执行方被取消或中断时, 等待者收到普通异常而不是被一并取消
+            future.set_exception(RuntimeError("调用已取消"))
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行调用, 相同key的并发调用共享同一个结果"""
+        future, leader = self.join(key)
+        if not leader:
+            # 等待者被取消时不影响正在执行的调用
+            return await asyncio.shield(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.resolve(key, error=e)
+            raise
+        self.resolve(key, result)
+        return result
@@ -2,7 +2,6 @@ import yaml
 import os
 from typing import Dict, Any
 from pathlib import Path
-from ruamel.yaml import YAML
 
 class Config:
     _instance = None
@@ -65,6 +64,10 @@ class Config:
     @property
     def google(self) -> Dict[str, Any]:
         return self.config_data['google']
+        
+    @property
+    def ingress(self) -> Dict[str, Any]:
+        return self.config_data.get('ingress', {})
     
     def validate_config(self):
         """验证配置文件的完整性"""
@@ -125,6 +128,7 @@ class Config:
                 content = f.read()
                 
             # 使用ruamel.yaml替代pyyaml以保留注释
+            from ruamel.yaml import YAML
             yaml = YAML()
             yaml.preserve_quotes = True
             yaml.indent(mapping=2, sequence=4, offset=2)
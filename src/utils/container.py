@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+import time
+from typing import Dict, Any, Type, TypeVar, Set, List, Optional
+from utils.logger import Logger
+
+T = TypeVar('T')
+
+class Container:
+    """服务容器: 每个服务只创建一次, 并统一管理启动和停止"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'services'):
+            self.logger = Logger()
+            # 按创建顺序保存: {服务类: 实例}
+            self.services: Dict[type, Any] = {}
+            self.building: Set[type] = set()
+            # 启动耗时统计: {阶段或服务名: 秒}
+            self.timings: Dict[str, float] = {}
+            # 正在创建的服务所依赖服务的耗时, 用于计算服务自身的创建耗时
+            self.child_times: List[float] = []
+            # start()之后创建的服务在创建后立即启动
+            self.loop: Optional[asyncio.AbstractEventLoop] = None
+            self.starting: Set[asyncio.Task] = set()
+
+    def get(self, service_cls: Type[T]) -> T:
+        """获取共享的服务实例, 首次获取时创建"""
+        service = self.services.get(service_cls)
+        if service is not None:
+            return service
+
+        if service_cls in self.building:
+            raise RuntimeError(f"服务存在循环依赖: {service_cls.__name__}")
+
+        self.building.add(service_cls)
+        self.child_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            service = service_cls()
+        finally:
+            elapsed = time.perf_counter() - start
+            child_time = self.child_times.pop()
+            if self.child_times:
+                self.child_times[-1] += elapsed
+            self.building.discard(service_cls)
+
+        self.timings[f"创建 {service_cls.__name__}"] = elapsed - child_time
+        self.services[service_cls] = service
+        if self.loop is not None and hasattr(service, 'start'):
+            self._start_later(service)
+        return service
+
+    def _start_later(self, service: Any):
+        """容器启动后才创建的服务(延迟注入、后台预热): 在事件循环中调用其start"""
+        def schedule():
+            task = self.loop.create_task(self._call_hook(service, 'start'))
+            self.starting.add(task)
+            task.add_done_callback(self.starting.discard)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            schedule()
+        else:
+            # 在线程中创建(如同步预热)时交给事件循环调度
+            self.loop.call_soon_threadsafe(schedule)
+
+    def record(self, name: str, seconds: float):
+        """记录启动阶段耗时"""
+        self.timings[name] = seconds
+
+    def report(self, title: str = "启动耗时") -> str:
+        """按耗时从高到低生成启动耗时报告"""
+        lines = [f"{title}:"]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"- {name}: {seconds * 1000:.1f}ms")
+        return "\n".join(lines)
+
+    def warm_up(self, *service_classes: type) -> asyncio.Task:
+        """在后台创建服务并执行其warm_up方法, 不阻塞启动"""
+        return asyncio.create_task(self._warm_up(service_classes))
+
+    async def _warm_up(self, service_classes):
+        await asyncio.gather(*(self._warm_up_service(cls) for cls in service_classes))
+        self.logger.info(self.report("预热完成, 启动耗时"))
+
+    async def _warm_up_service(self, service_cls: type):
+        start = time.perf_counter()
+        service = self.get(service_cls)
+        hook = getattr(service, 'warm_up', None)
+        try:
+            if inspect.iscoroutinefunction(hook):
+                await hook()
+            elif hook is not None:
+                # 同步的预热通常包含网络请求, 放到线程中执行
+                await asyncio.to_thread(hook)
+        except Exception as e:
+            self.logger.error(f"{service_cls.__name__} 预热失败: {e}")
+        self.timings[f"预热 {service_cls.__name__}"] = time.perf_counter() - start
+
+    async def start(self):
+        """按创建顺序启动已创建的服务, 之后创建的服务在创建时启动"""
+        self.loop = asyncio.get_running_loop()
+        for service in list(self.services.values()):
+            await self._call_hook(service, 'start')
+
+    async def stop(self):
+        """按创建的逆序停止服务"""
+        self.loop = None
+        if self.starting:
+            await asyncio.gather(*self.starting, return_exceptions=True)
+        for service in reversed(list(self.services.values())):
+            await self._call_hook(service, 'stop')
+
+    async def _call_hook(self, service: Any, name: str):
+        """调用服务的生命周期方法, 同步和异步方法均可"""
+        hook = getattr(service, name, None)
+        if hook is None:
+            return
+        try:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            self.logger.error(f"{type(service).__name__}.{name} 执行失败: {e}")
+
+
+class lazy_service:
+    """延迟注入: 首次访问属性时才从容器获取服务"""
+
+    def __init__(self, service_cls: type):
+        self.service_cls = service_cls
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        service = Container().get(self.service_cls)
+        # 缓存到实例上, 之后的访问不再经过描述器
+        instance.__dict__[self.name] = service
+        return service
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """令牌桶: 按固定速率补充令牌, 最多积攒capacity个; rate不大于0时不限流"""
+
+    def __init__(self, rate: float, capacity: float):
+        # rate: 每秒补充的令牌数
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def available(self, amount: float = 1) -> bool:
+        """当前是否有足够的令牌(不消耗)"""
+        if self.unlimited:
+            return True
+        self._refill()
+        return self.tokens >= amount
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """尝试消耗令牌"""
+        if self.unlimited:
+            return True
+        self._refill()
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def retry_after(self, amount: float = 1) -> float:
+        """距离攒够令牌还需等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        """令牌已满, 与新建的桶没有区别"""
+        if self.unlimited:
+            return True
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self, amount: float = 1):
+        """等待直到令牌足够并消耗"""
+        while not self.try_acquire(amount):
+            await asyncio.sleep(self.retry_after(amount))
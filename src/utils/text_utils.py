@@ -0,0 +1,146 @@
+import re
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+# 句末标点(可带右引号/括号)、英文句点后的空白、换行
+SENTENCE_END = re.compile(r'[。！？!?…]+["”’）)]*|\.(?=\s)|\n')
+CODE_FENCE = "```"
+CODE_CLOSE = "\n" + CODE_FENCE
+# 代码块标记后的语言标签, 重新打开代码块时只保留语言标签
+FENCE_TAG = re.compile(r'[^\s`]{0,20}')
+
+def code_block_spans(text: str) -> List[Tuple[int, int]]:
+    """代码块所在区间, 未闭合的代码块延伸到文本末尾之后"""
+    spans = []
+    start = text.find(CODE_FENCE)
+    while start != -1:
+        end = text.find(CODE_FENCE, start + len(CODE_FENCE))
+        if end == -1:
+            spans.append((start, len(text) + 1))
+            break
+        end += len(CODE_FENCE)
+        spans.append((start, end))
+        start = text.find(CODE_FENCE, end)
+    return spans
+
+def _enclosing(spans: List[Tuple[int, int]], starts: List[int], position: int) -> Optional[Tuple[int, int]]:
+    """position所在的代码块区间(不含两端), 不在代码块中时返回None"""
+    index = bisect_right(starts, position - 1) - 1
+    if index >= 0 and position < spans[index][1]:
+        return spans[index]
+    return None
+
+def sentence_boundaries(text: str) -> List[int]:
+    """代码块之外的句子边界位置(切分点)"""
+    spans = code_block_spans(text)
+    starts = [start for start, _ in spans]
+    boundaries = [
+        match.end() for match in SENTENCE_END.finditer(text)
+        if _enclosing(spans, starts, match.end()) is None
+    ]
+    # 代码块结束处也是合适的切分点
+    boundaries.extend(end for _, end in spans if end < len(text))
+    return sorted(set(boundaries))
+
+def _find_cut(text: str, boundaries: List[int], low: int, high: int) -> int:
+    """(low, high]以内的切分点: 优先句子/代码块边界, 其次换行, 都没有时硬切"""
+    index = bisect_right(boundaries, high) - 1
+    if index >= 0 and boundaries[index] > low:
+        return boundaries[index]
+    newline = text.rfind("\n", low, high)
+    return newline + 1 if newline != -1 else high
+
+def find_split(text: str, max_length: int, min_cut: int = 0) -> int:
+    """(min_cut, max_length]以内的切分点: 优先句子/代码块边界, 其次换行, 都没有时硬切"""
+    return _find_cut(text, sentence_boundaries(text), min_cut, max_length)
+
+def split_prefix(text: str, max_length: int) -> Tuple[List[str], str]:
+    """从开头依次切出不超过max_length的片段, 直到剩余部分不超过max_length, 返回(片段, 剩余部分);
+    在代码块中间切分时本段补上结束标记, 剩余部分以代码块标记和语言标签重新打开"""
+    boundaries = sentence_boundaries(text)
+    spans = code_block_spans(text)
+    starts = [start for start, _ in spans]
+    fence_starts = set(starts)
+    pieces = []
+    prefix = ""
+    pos = 0
+    while len(prefix) + len(text) - pos > max_length:
+        # 预留重新打开和补全代码块标记的长度
+        budget = max(max_length - len(prefix) - len(CODE_CLOSE), 1)
+        low = pos
+        # 以代码块标记行开头时, 切分点必须在该行之后, 否则会切出空代码块
+        if pos in fence_starts:
+            low = max(text.find("\n", pos) + 1, pos)
+        cut = _find_cut(text, boundaries, low, pos + budget)
+        span = _enclosing(spans, starts, cut)
+        # 不在代码块标记行中间或刚好在其后切分, 改为在代码块之前切分
+        if span is not None and pos < span[0]:
+            line_end = text.find("\n", span[0]) + 1
+            if not 0 < line_end < cut:
+                cut, span = span[0], None
+        body = text[pos:cut]
+        if span is not None:
+            piece = prefix + body.rstrip("\n") + CODE_CLOSE
+            next_prefix = CODE_FENCE + FENCE_TAG.match(text, span[0] + len(CODE_FENCE)).group() + "\n"
+        else:
+            piece = prefix + body
+            next_prefix = ""
+        if body.strip():
+            pieces.append(piece.strip("\n"))
+        prefix, pos = next_prefix, cut
+    return pieces, prefix + text[pos:]
+
+def split_text(text: str, max_length: int) -> List[str]:
+    """把长文本切分为不超过max_length的多段, 在代码块中间切分时补全代码块标记"""
+    pieces, rest = split_prefix(text, max_length)
+    if rest.strip():
+        pieces.append(rest.strip("\n"))
+    return pieces
+
+class SentenceBuffer:
+    """流式文本缓冲: 累积增量文本, 第一段在首个完整句子处尽早发送, 之后按段落或接近长度上限时发送"""
+
+    def __init__(self, max_length: int, min_length: int = 200):
+        self.max_length = max_length
+        self.min_length = min_length
+        self.buffer = ""
+        self.emitted = 0
+
+    def feed(self, delta: str) -> List[str]:
+        """追加增量文本, 返回已完整可发送的片段"""
+        self.buffer += delta
+        if len(self.buffer) > self.max_length:
+            # 超长时与split_text相同地切分, 在代码块中间切分时补全代码块标记
+            pieces, self.buffer = split_prefix(self.buffer, self.max_length)
+        else:
+            pieces = []
+            cut = self._find_cut()
+            if cut is not None:
+                pieces.append(self.buffer[:cut])
+                self.buffer = self.buffer[cut:]
+        pieces = [piece.strip() for piece in pieces if piece.strip()]
+        self.emitted += len(pieces)
+        return pieces
+
+    def flush(self) -> List[str]:
+        """取出剩余文本"""
+        pieces = [piece.strip() for piece in split_text(self.buffer, self.max_length) if piece.strip()]
+        self.buffer = ""
+        self.emitted += len(pieces)
+        return pieces
+
+    def _find_cut(self) -> Optional[int]:
+        """寻找切分点: 第一段在最后一个句子边界处切分, 之后只在攒够min_length后的段落结束处切分"""
+        if self.emitted == 0:
+            if not SENTENCE_END.search(self.buffer):
+                return None
+            boundaries = sentence_boundaries(self.buffer)
+            return boundaries[-1] if boundaries else None
+        if len(self.buffer) < self.min_length or "\n\n" not in self.buffer:
+            return None
+        # 代码块中的空行不是段落结束, sentence_boundaries已排除代码块中的位置
+        paragraphs = [
+            b for b in sentence_boundaries(self.buffer)
+            if b >= self.min_length and self.buffer[b - 2:b] == "\n\n"
+        ]
+        return paragraphs[-1] if paragraphs else None
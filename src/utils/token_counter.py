@@ -0,0 +1,53 @@
+from typing import List, Dict, Any
+from utils.config import Config
+from utils.logger import Logger
+
+# 每条消息的格式开销(role等)
+MESSAGE_OVERHEAD = 4
+
+class TokenCounter:
+    """基于tiktoken的token计数, 编码器在首次使用时加载"""
+
+    def __init__(self):
+        self.config = Config()
+        self.logger = Logger()
+        self.encoding = None
+        self.fallback = False
+
+    def _get_encoding(self):
+        """加载当前模型的编码器, 加载失败时改用估算"""
+        if self.encoding is None and not self.fallback:
+            try:
+                import tiktoken
+                try:
+                    self.encoding = tiktoken.encoding_for_model(self.config.chatgpt['model'])
+                except KeyError:
+                    self.encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                self.logger.warning(f"加载tiktoken编码器失败, 改用估算: {e}")
+                self.fallback = True
+        return self.encoding
+
+    def count(self, text: str) -> int:
+        """计算文本的token数"""
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is None:
+            # 中文约每字1个token, 英文约每3-4个字符1个token, 按UTF-8字节数估算偏保守
+            return len(text.encode('utf-8')) // 3 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断文本到指定token数以内"""
+        if self.count(text) <= max_tokens:
+            return text
+        encoding = self._get_encoding()
+        if encoding is None:
+            # 与估算方式一致: 约3个UTF-8字节1个token
+            return text.encode('utf-8')[:max_tokens * 3].decode('utf-8', errors='ignore')
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """计算消息列表的token数"""
+        return sum(self.count(message.get('content') or '') + MESSAGE_OVERHEAD for message in messages)
@@ -0,0 +1,42 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from utils.container import Container
+
+class Recorder:
+    events = []
+
+    def start(self):
+        Recorder.events.append(('start', type(self).__name__))
+
+    async def stop(self):
+        Recorder.events.append(('stop', type(self).__name__))
+
+class Eager(Recorder):
+    pass
+
+class Lazy(Recorder):
+    pass
+
+class Threaded(Recorder):
+    pass
+
+def test_services_created_after_start_are_started():
+    async def run():
+        container = Container()
+        container.services.clear()
+        Recorder.events.clear()
+        container.get(Eager)
+        await container.start()
+        container.get(Lazy)
+        await asyncio.to_thread(container.get, Threaded)
+        await asyncio.sleep(0.01)
+        await container.stop()
+        container.services.clear()
+        return list(Recorder.events)
+    assert asyncio.run(run()) == [
+        ('start', 'Eager'), ('start', 'Lazy'), ('start', 'Threaded'),
+        ('stop', 'Threaded'), ('stop', 'Lazy'), ('stop', 'Eager')
+    ]
@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from services.db_service import DBService
+
+@pytest.fixture
+def db(tmp_path):
+    service = DBService(str(tmp_path / "bot.db"))
+    yield service
+    service.close()
+
+def test_chat_history_counts_chats(db):
+    async def run():
+        db.add_chat_history(1, 10, "hi", "hello")
+        db.add_chat_history(1, None, "again", "hello")
+        assert await db.add_chat_histories([(2, 10, "a", "b")])
+        await asyncio.to_thread(db.flush)
+        history = await db.fetchone("SELECT COUNT(*) FROM chat_history")
+        return history[0], await db.get_user_chat_counts([1, 2, 3])
+    assert asyncio.run(run()) == (3, {1: 2, 2: 1, 3: 0})
+
+def test_writes_are_batched_into_one_transaction(db):
+    db.flush_interval = 0.2
+    db.batch_size = 1000
+    for uid in range(50):
+        db.execute_later("INSERT INTO users (uid, nickname) VALUES (?, ?)", (uid, f"user{uid}"))
+    assert db.flush(5)
+    stats = db.get_stats()
+    assert stats['written'] == 50 and stats['batches'] == 1 and stats['failed'] == 0
+
+def test_failed_write_does_not_discard_others(db):
+    db.flush_interval = 0.2
+    db.batch_size = 1000
+
+    async def run():
+        return await asyncio.gather(
+            db.execute("INSERT INTO users (uid) VALUES (?)", (1,)),
+            db.execute("INSERT INTO missing_table (uid) VALUES (?)", (2,)),
+            db.execute("INSERT INTO users (uid) VALUES (?)", (3,)),
+            db.executemany("INSERT INTO users (uid) VALUES (?)", [(4,), (1,)])
+        ), await db.fetchall("SELECT uid FROM users ORDER BY uid")
+    results, rows = asyncio.run(run())
+    # 每个调用方单独重试: 出错的调用方整体不写入, 其他调用方不受影响
+    assert results == [True, False, True, False]
+    assert rows == [(1,), (3,)]
+    assert db.get_stats()['failed'] == 3
+
+def test_queries_run_on_reader_thread(db):
+    threads = []
+    original = db._fetchall
+
+    def fetchall(sql, params):
+        threads.append(threading.current_thread().name)
+        return original(sql, params)
+
+    db._fetchall = fetchall
+    assert asyncio.run(db.fetchone("SELECT 1")) == (1,)
+    assert threads[0].startswith("db-reader")
@@ -0,0 +1,61 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.endpoint_router import EndpointRouter, EndpointState
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+def make_router(count=2):
+    router = EndpointRouter()
+    router.states = [
+        EndpointState({'url': f"https://api{i}.example", 'api_key': "", 'priority': i}, 10)
+        for i in range(count)
+    ]
+    for state in router.states:
+        state.client = state.url
+    return router
+
+def test_not_found_fails_over_to_next_endpoint():
+    async def run():
+        router = make_router()
+
+        async def request(client):
+            if client == "https://api0.example":
+                raise StatusError(404)
+            return client
+
+        return await router.call(request), router.states[0].failures
+    assert asyncio.run(run()) == ("https://api1.example", 1)
+
+def test_bad_request_is_not_retried():
+    async def run():
+        router = make_router()
+        tried = []
+
+        async def request(client):
+            tried.append(client)
+            raise StatusError(400)
+
+        try:
+            await router.call(request)
+        except StatusError:
+            return tried
+    assert asyncio.run(run()) == ["https://api0.example"]
+
+def test_probe_time_follows_probe_interval():
+    router = make_router(1)
+    router.probe_interval = 30
+    now = time.monotonic()
+    router.next_probe = now + 10
+    state = router.states[0]
+    state.ejected_until = now + 5
+    assert abs(router._probe_in(state, now) - 10) < 1e-6
+    # 摘除在本次检查之后到期, 要等到之后的第一次检查
+    state.ejected_until = now + 45
+    assert abs(router._probe_in(state, now) - 70) < 1e-6
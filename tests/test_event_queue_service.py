@@ -0,0 +1,39 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.event_queue_service import EventQueueService
+
+def test_events_put_before_start_are_processed():
+    async def run():
+        handled = []
+
+        async def handler(data):
+            handled.append(data['id'])
+
+        events = EventQueueService(handler)
+        events.mode = 'queue'
+        assert events.put({'id': 1})
+        await events.start()
+        assert events.put({'id': 2})
+        await events.stop()
+        return handled
+    assert asyncio.run(run()) == [1, 2]
+
+def test_overflow_is_counted():
+    async def run():
+        async def handler(data):
+            pass
+
+        events = EventQueueService(handler)
+        events.queue = asyncio.Queue(maxsize=1)
+        results = [
+            events.put({'post_type': 'message'}),
+            events.put({'post_type': 'message'}),
+            events.put({'post_type': 'message'}, retryable=False)
+        ]
+        return results, events.get_stats()
+    results, stats = asyncio.run(run())
+    assert results == [True, False, False]
+    assert stats['dropped'] == 2 and stats['lost'] == 1
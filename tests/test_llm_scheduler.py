@@ -0,0 +1,77 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.llm_scheduler import LLMScheduler, SHED_RATE_LIMITED, SHED_SUPERSEDED
+
+def scheduler(concurrency=1):
+    instance = LLMScheduler()
+    instance.concurrency = concurrency
+    instance.max_queue = 100
+    instance.group_weights = {}
+    return instance
+
+def test_groups_share_by_weight():
+    async def run():
+        llm = scheduler()
+        llm.group_weights = {'1': 2.0}
+        running = llm.admit(None, 999)
+        tickets = {}
+        uid = 0
+        for gid, count in ((1, 4), (2, 2)):
+            for i in range(count):
+                uid += 1
+                tickets[f"{gid}-{i}"] = llm.admit(gid, uid)
+        order = []
+        current = running
+        for _ in range(len(tickets)):
+            current.release()
+            current = next(t for name, t in tickets.items() if t.granted and name not in order)
+            order.append(next(name for name, t in tickets.items() if t is current))
+        return order
+    # 权重为2的群每个请求的虚拟完成时间增加0.5, 权重为1的群增加1
+    assert asyncio.run(run()) == ["1-0", "1-1", "2-0", "1-2", "1-3", "2-1"]
+
+def test_private_lane_before_groups():
+    async def run():
+        llm = scheduler()
+        running = llm.admit(None, 999)
+        group = llm.admit(1, 1)
+        private = llm.admit(None, 2)
+        running.release()
+        return private.granted, group.granted
+    assert asyncio.run(run()) == (True, False)
+
+def test_dropped_group_tickets_are_compacted():
+    async def run():
+        llm = scheduler()
+        running = llm.admit(None, 999)
+        tickets = [llm.admit(i % 3 + 1, i + 1, f"group_{i}") for i in range(10)]
+        for i in range(6):
+            assert llm.supersede(f"group_{i}")
+        stats = llm.get_stats()
+        heap_size = len(llm.group_heap)
+        granted = []
+        running.release()
+        for _ in range(4):
+            ticket = next(t for t in tickets if t.granted and t not in granted)
+            granted.append(ticket)
+            ticket.release()
+        return stats, heap_size, [tickets.index(t) for t in granted], llm.group_cancelled, llm.pending
+    stats, heap_size, granted, cancelled, pending = asyncio.run(run())
+    assert stats['waiting']['group'] == 4 and stats['shed'][SHED_SUPERSEDED] == 6
+    assert heap_size < 10
+    assert sorted(granted) == [6, 7, 8, 9]
+    assert cancelled == 0 and pending == 0
+
+def test_admin_has_own_quota(monkeypatch):
+    async def run():
+        llm = scheduler(concurrency=10)
+        monkeypatch.setitem(llm.config.qq_bot, 'admin_qq', "10001")
+        llm.admin_bucket.rate = 0.001
+        llm.admin_bucket.capacity = llm.admin_bucket.tokens = 2
+        return [llm.admit(None, 10001) for _ in range(3)]
+    tickets = asyncio.run(run())
+    assert [ticket.accepted for ticket in tickets] == [True, True, False]
+    assert tickets[2].reason == SHED_RATE_LIMITED and tickets[2].retry_after > 0
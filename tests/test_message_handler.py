@@ -0,0 +1,102 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.session_dispatcher import SessionDispatcher
+from services.llm_scheduler import LLMScheduler
+from services.message_store_service import MessageStoreService
+from handlers.message_handler import MessageHandler
+
+class FakeQQService:
+    def __init__(self):
+        self.sent = []
+
+        self.deleted = []
+
+    def remember_user(self, uid, sender):
+        pass
+
+    def text(self, value):
+        return {'type': 'text', 'data': {'text': value}}
+
+    async def delete_msg(self, message_id):
+        self.deleted.append(message_id)
+        return True
+
+    async def send_message(self, gid=None, message=None, uid=None, at=True, priority=0):
+        self.sent.append((gid, message, uid))
+        return True
+
+class FakeVerification:
+    def is_pending_verification(self, gid, uid):
+        return False
+
+def make_handler(dispatcher):
+    handler = MessageHandler.__new__(MessageHandler)
+    handler.config = dispatcher.config
+    handler.logger = dispatcher.logger
+    handler.qq_service = FakeQQService()
+    handler.verification_service = FakeVerification()
+    handler.llm_scheduler = LLMScheduler()
+    handler.session_dispatcher = dispatcher
+    handler.message_store = MessageStoreService()
+    return handler
+
+def test_handler_replies_busy_when_sessions_full():
+    async def run():
+        dispatcher = SessionDispatcher()
+        dispatcher.max_sessions = 0
+        handler = make_handler(dispatcher)
+        await handler.handle({'message_type': 'private', 'user_id': 1, 'message': [
+            {'type': 'text', 'data': {'text': 'hi'}}
+        ]})
+        return handler.qq_service.sent
+    sent = asyncio.run(run())
+    assert sent == [(None, "当前消息太多了, 请稍后再试", 1)]
+
+def test_handler_ignores_group_chatter():
+    async def run():
+        dispatcher = SessionDispatcher()
+        handler = make_handler(dispatcher)
+        await handler.handle({'message_type': 'group', 'group_id': 10, 'user_id': 1, 'message': [
+            {'type': 'text', 'data': {'text': 'hi'}}
+        ]})
+        return dispatcher.actors, handler.qq_service.sent
+    actors, sent = asyncio.run(run())
+    # 未@机器人的群消息不创建会话
+    assert actors == {} and sent == []
+
+def test_admin_reply_recalls_message(monkeypatch):
+    async def run():
+        dispatcher = SessionDispatcher()
+        handler = make_handler(dispatcher)
+        monkeypatch.setitem(handler.config.qq_bot, 'admin_qq', "10001")
+        admin = 10001
+        handler.message_store.add({
+            'message_id': 42, 'group_id': 10, 'user_id': 7, 'time': 0,
+            'sender': {'nickname': '小明'}, 'message': [{'type': 'text', 'data': {'text': '广告'}}]
+        })
+        # 回复消息时客户端会自动@被回复的人, 不@机器人
+        await handler.handle({'message_type': 'group', 'group_id': 10, 'user_id': admin, 'message': [
+            {'type': 'reply', 'data': {'id': '42'}},
+            {'type': 'at', 'data': {'qq': '7'}},
+            {'type': 'text', 'data': {'text': ' 撤回'}}
+        ]})
+        await asyncio.sleep(0.05)
+        return handler.qq_service.deleted, handler.qq_service.sent
+    deleted, sent = asyncio.run(run())
+    assert deleted == [42]
+    assert sent[0][1] == [{'type': 'text', 'data': {'text': '已撤回小明的消息'}}]
+
+def test_reply_from_non_admin_is_ignored():
+    async def run():
+        dispatcher = SessionDispatcher()
+        handler = make_handler(dispatcher)
+        await handler.handle({'message_type': 'group', 'group_id': 10, 'user_id': 123456, 'message': [
+            {'type': 'reply', 'data': {'id': '42'}},
+            {'type': 'text', 'data': {'text': '撤回'}}
+        ]})
+        return dispatcher.actors, handler.qq_service.deleted
+    actors, deleted = asyncio.run(run())
+    assert actors == {} and deleted == []
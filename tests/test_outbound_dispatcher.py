@@ -0,0 +1,104 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.outbound_dispatcher import OutboundDispatcher, PRIORITY_REPLY, PRIORITY_BROADCAST
+
+def text(value):
+    return {'type': 'text', 'data': {'text': value}}
+
+class Recorder:
+    """记录投递顺序的假发送函数, slow中的目标每次投递耗时delay秒"""
+
+    def __init__(self, slow=(), delay=0.0):
+        self.slow = set(slow)
+        self.delay = delay
+        self.delivered = []
+
+    async def __call__(self, target, segments):
+        if target in self.slow:
+            await asyncio.sleep(self.delay)
+        self.delivered.append((target, [s['data']['text'] for s in segments if s['type'] == 'text']))
+        return True
+
+def dispatcher(deliver, **overrides):
+    outbound = OutboundDispatcher(deliver)
+    outbound.coalesce_window = 0.05
+    outbound.target_rate = 100
+    outbound.target_burst = 100
+    outbound.global_bucket.rate = 100
+    outbound.global_bucket.capacity = outbound.global_bucket.tokens = 100
+    for name, value in overrides.items():
+        setattr(outbound, name, value)
+    return outbound
+
+def test_idle_target_is_sent_without_waiting():
+    async def run():
+        recorder = Recorder()
+        outbound = dispatcher(recorder, coalesce_window=5)
+        assert await asyncio.wait_for(outbound.submit(("group", "1"), [text("hi")]), 1)
+        await outbound.stop()
+        return recorder.delivered
+    assert asyncio.run(run()) == [(("group", "1"), ["hi"])]
+
+def test_backlog_for_busy_target_is_coalesced():
+    async def run():
+        recorder = Recorder(slow={("group", "1")}, delay=0.1)
+        outbound = dispatcher(recorder)
+        futures = [outbound.submit(("group", "1"), [text("0")])]
+        await asyncio.sleep(0)
+        futures += [outbound.submit(("group", "1"), [text(str(i))]) for i in range(1, 4)]
+        results = await asyncio.gather(*futures)
+        await outbound.stop()
+        return results, recorder.delivered, outbound.merged
+    results, delivered, merged = asyncio.run(run())
+    assert all(results)
+    # 第一条立即发送, 其余在发送期间积压, 合并为一条
+    assert delivered == [(("group", "1"), ["0"]), (("group", "1"), ["1", "\n", "2", "\n", "3"])]
+    assert merged == 2
+
+def test_reply_is_sent_before_broadcast():
+    async def run():
+        recorder = Recorder(slow={("group", "1")}, delay=0.1)
+        outbound = dispatcher(recorder)
+        first = outbound.submit(("group", "1"), [text("first")])
+        await asyncio.sleep(0)
+        # 目标正在发送, 后面的消息按优先级排队, 不同优先级不合并
+        broadcast = outbound.submit(("group", "1"), [text("news")], PRIORITY_BROADCAST)
+        reply = outbound.submit(("group", "1"), [text("reply")], PRIORITY_REPLY)
+        await asyncio.gather(first, broadcast, reply)
+        await outbound.stop()
+        return [texts for _, texts in recorder.delivered]
+    assert asyncio.run(run()) == [["first"], ["reply"], ["news"]]
+
+def test_slow_target_does_not_block_others():
+    async def run():
+        recorder = Recorder(slow={("group", "slow")}, delay=1)
+        outbound = dispatcher(recorder)
+        slow = outbound.submit(("group", "slow"), [text("slow")])
+        await asyncio.sleep(0)
+        fast = await asyncio.wait_for(outbound.submit(("private", "2"), [text("fast")]), 0.5)
+        delivered = list(recorder.delivered)
+        await slow
+        await outbound.stop()
+        return fast, delivered
+    fast, delivered = asyncio.run(run())
+    assert fast
+    assert delivered == [(("private", "2"), ["fast"])]
+
+def test_same_target_keeps_order():
+    async def run():
+        recorder = Recorder()
+        outbound = dispatcher(recorder)
+        music = {'type': 'music', 'data': {'type': 'qq', 'id': '1'}}
+        # 音乐卡片不能合并, 三条消息分别发送但顺序不变
+        futures = [
+            outbound.submit(("group", "1"), [text("a")]),
+            outbound.submit(("group", "1"), [music]),
+            outbound.submit(("group", "1"), [text("b")])
+        ]
+        await asyncio.gather(*futures)
+        await outbound.stop()
+        return [texts for _, texts in recorder.delivered]
+    assert asyncio.run(run()) == [["a"], [], ["b"]]
@@ -0,0 +1,30 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from utils.rate_limit import TokenBucket
+
+def test_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(10, 2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.retry_after() <= 0.1
+
+def test_acquire_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(20, 1)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - start
+    assert 0.08 <= asyncio.run(run()) < 0.5
+
+def test_zero_rate_is_unlimited():
+    async def run():
+        bucket = TokenBucket(0, 1)
+        for _ in range(100):
+            await asyncio.wait_for(bucket.acquire(), 0.1)
+        return bucket.retry_after(), bucket.available()
+    assert asyncio.run(run()) == (0.0, True)
@@ -0,0 +1,42 @@
+import asyncio
+import socket
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from services.search_service import SearchService, is_public_address
+
+def resolve(service, url, addresses):
+    async def run():
+        loop = asyncio.get_running_loop()
+
+        async def getaddrinfo(host, port):
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port)) for address in addresses]
+
+        loop.getaddrinfo = getaddrinfo
+        return await service._resolve(url)
+    return asyncio.run(run())
+
+def test_private_addresses_are_rejected():
+    assert is_public_address("93.184.216.34")
+    for address in ("127.0.0.1", "10.0.0.1", "169.254.169.254", "::1", "::ffff:192.168.1.1"):
+        assert not is_public_address(address)
+
+def test_resolve_rejects_any_private_record():
+    service = SearchService()
+    assert resolve(service, "https://example.com/", ["93.184.216.34"]) == "93.184.216.34"
+    with pytest.raises(ValueError):
+        resolve(service, "https://example.com/", ["93.184.216.34", "127.0.0.1"])
+    with pytest.raises(ValueError):
+        resolve(service, "file:///etc/passwd", ["93.184.216.34"])
+
+def test_request_is_pinned_to_checked_address():
+    service = SearchService()
+    request = service._pinned_request("https://example.com/page?q=1#top", "93.184.216.34")
+    assert request['url'] == "https://93.184.216.34/page?q=1"
+    assert request['headers'] == {'Host': 'example.com'}
+    assert request['extensions'] == {'sni_hostname': 'example.com'}
+    request = service._pinned_request("http://example.com:8080", "2001:db8::1")
+    assert request['url'] == "http://[2001:db8::1]:8080/"
+    assert 'extensions' not in request
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.sent_message_index import SentMessageIndex
+
+def text(value):
+    return [{'type': 'text', 'data': {'text': value}}]
+
+def test_recent_matches_preview_only():
+    index = SentMessageIndex()
+    index.preview_chars = 10
+    target = ("group", "1")
+    index.record(target, 1, text("天气预报: 明天晴"))
+    index.record(target, 2, text("0123456789 天气"))
+    index.record(target, 3, text("其他消息"))
+    assert [entry.message_id for entry in index.recent(target, count=2)] == [3, 2]
+    # 只在开头preview_chars个字中匹配
+    assert [entry.message_id for entry in index.recent(target, pattern="天气")] == [1]
+    index.discard(target, [1])
+    assert index.recent(target, pattern="天气") == []
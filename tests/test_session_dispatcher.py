@@ -0,0 +1,78 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from services.session_dispatcher import SessionDispatcher
+from services.llm_scheduler import LLMScheduler, SHED_SUPERSEDED
+
+def test_session_jobs_run_in_order():
+    async def run():
+        dispatcher = SessionDispatcher()
+        order = []
+
+        async def job(i):
+            await asyncio.sleep(0.01 * (3 - i))
+            order.append(i)
+
+        futures = [dispatcher.submit("s", lambda i=i: job(i)) for i in range(3)]
+        await asyncio.gather(*futures)
+        return order, dispatcher.actors
+    order, actors = asyncio.run(run())
+    assert order == [0, 1, 2]
+    # 队列处理完后会话立即移除
+    assert actors == {}
+
+def test_session_cap_rejects_new_sessions_only():
+    async def run():
+        dispatcher = SessionDispatcher()
+        dispatcher.max_sessions = 2
+        gate = asyncio.Event()
+        first = dispatcher.submit("a", gate.wait)
+        dispatcher.submit("b", gate.wait)
+        rejected = dispatcher.submit("c", gate.wait)
+        # 已存在的会话仍可排队
+        queued = dispatcher.submit("a", gate.wait)
+        gate.set()
+        await asyncio.gather(first, queued)
+        # 会话结束后名额释放
+        accepted = dispatcher.submit("c", gate.wait)
+        await accepted
+        return rejected, queued, dispatcher.dropped
+    rejected, queued, dropped = asyncio.run(run())
+    assert rejected is None
+    assert queued is not None
+    assert dropped == 1
+
+def test_superseded_job_sees_newer_message():
+    async def run():
+        dispatcher = SessionDispatcher()
+        seen = []
+
+        async def job():
+            await asyncio.sleep(0)
+            seen.append(dispatcher.superseded("s"))
+
+        dispatcher.submit("s", job, supersedes=True)
+        await asyncio.sleep(0)
+        last = dispatcher.submit("s", job, supersedes=True)
+        await last
+        return seen
+    # 第一条在执行时已有更新的消息排队, 最后一条没有
+    assert asyncio.run(run()) == [True, False]
+
+def test_scheduler_supersede_drops_pending_ticket():
+    async def run():
+        scheduler = LLMScheduler()
+        scheduler.concurrency = 1
+        running = scheduler.admit(None, 1, "private_1")
+        queued = scheduler.admit(None, 2, "private_2")
+        waiter = asyncio.ensure_future(queued.wait())
+        await asyncio.sleep(0)
+        dropped = scheduler.supersede("private_2")
+        granted = await waiter
+        running.release()
+        return running.granted, dropped, granted, queued.reason, scheduler.shed[SHED_SUPERSEDED], scheduler.pending
+    running, dropped, granted, reason, shed, pending = asyncio.run(run())
+    assert running and dropped and not granted
+    assert reason == SHED_SUPERSEDED and shed == 1 and pending == 0
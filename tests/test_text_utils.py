@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from utils.text_utils import split_text, SentenceBuffer, CODE_FENCE
+
+def test_split_text_long_code_line_terminates():
+    """代码块中没有换行的超长行: 必须硬切并推进, 不能反复在重新打开的代码块标记后切分"""
+    text = CODE_FENCE + "\n" + "a" * 5000 + "\n" + CODE_FENCE
+    pieces = split_text(text, 4500)
+    assert all(len(piece) <= 4500 for piece in pieces)
+    assert all(piece.count(CODE_FENCE) % 2 == 0 for piece in pieces)
+    assert "".join(piece.replace(CODE_FENCE, "").replace("\n", "") for piece in pieces) == "a" * 5000
+
+def test_split_text_does_not_emit_empty_code_block():
+    text = "intro\n" + CODE_FENCE + "python\n" + ("x" * 100 + "\n") * 100 + CODE_FENCE
+    pieces = split_text(text, 4500)
+    assert all(piece.strip(CODE_FENCE + "python\n") for piece in pieces)
+    assert all(len(piece) <= 4500 for piece in pieces)
+
+def test_split_text_reopens_with_language_tag_only():
+    """重新打开代码块时只带语言标签, 不重复整行代码块标记, 每段都不超过上限"""
+    text = "intro. " + CODE_FENCE + "python title=example.py linenums=1\n" + "".join(f"print({i})\n" for i in range(40)) + CODE_FENCE
+    pieces = split_text(text, 80)
+    assert all(len(piece) <= 80 for piece in pieces)
+    assert all(piece.count(CODE_FENCE) % 2 == 0 for piece in pieces)
+    assert all(piece.startswith(CODE_FENCE + "python\n") for piece in pieces[2:])
+    # 每段都应接近上限, 不能因为重复的标记行切出大量碎片
+    assert len(pieces) <= len(text) // 40
+
+def test_split_text_keeps_content_and_scales():
+    text = ("第一句。第二句! Third one. " * 10 + "\n\n") * 2000
+    pieces = split_text(text, 500)
+    assert all(len(piece) <= 500 for piece in pieces)
+    assert "".join(pieces).replace("\n", "") == text.replace("\n", "")
+    assert len(pieces) < len(text) // 400
+
+def stream(buffer, text, step=3):
+    pieces = []
+    for i in range(0, len(text), step):
+        pieces.extend(buffer.feed(text[i:i + step]))
+    return pieces + buffer.flush()
+
+def test_sentence_buffer_sends_first_sentence_then_paragraphs():
+    paragraph = "这是一个用来测试的句子。" * 30 + "\n\n"
+    text = "好的。" + paragraph * 90
+    pieces = stream(SentenceBuffer(4500, 200), text)
+    assert pieces[0] == "好的。"
+    # 之后按段落发送, 不再每句一条
+    assert len(pieces) <= 92
+    assert "".join(pieces).replace("\n", "") == text.replace("\n", "")
+
+def test_sentence_buffer_waits_for_paragraph_or_limit():
+    text = "开头。" + "没有空行的长段落句子。" * 1000
+    pieces = stream(SentenceBuffer(1000, 200), text)
+    assert pieces[0] == "开头。"
+    assert all(len(piece) <= 1000 for piece in pieces)
+    assert all(len(piece) > 900 for piece in pieces[1:-1])
+
+def test_sentence_buffer_repairs_code_blocks():
+    text = "代码如下:\n\n" + CODE_FENCE + "python\n" + "".join(f"x{i} = {i}\n\n" for i in range(400)) + CODE_FENCE + "\n\n结束。"
+    pieces = stream(SentenceBuffer(500, 200), text)
+    assert all(len(piece) <= 500 for piece in pieces)
+    assert all(piece.count(CODE_FENCE) % 2 == 0 for piece in pieces)
+    # 代码块中的空行不是段落结束, 不会把代码拆成很多条
+    assert len(pieces) <= len(text) // 300